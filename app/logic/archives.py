@@ -0,0 +1,135 @@
+import io
+import os
+import gzip
+import zipfile
+
+try:
+    import zstandard
+except ImportError: # Dependência opcional: sem ela os arquivos .zst são listados, mas a leitura informa o que falta
+    zstandard = None
+
+# Fontes dentro de arquivos compactados são identificadas por um caminho virtual
+# "<arquivo compactado>::<membro>". Arquivos .gz/.zst (um único arquivo comprimido)
+# também viram caminho virtual, com o nome sem a extensão de compressão como membro:
+# "vendas.csv.gz::vendas.csv". Assim as verificações por extensão continuam valendo.
+MEMBER_SEPARATOR = "::"
+ARCHIVE_EXTENSIONS = (".zip",)
+COMPRESSED_EXTENSIONS = (".gz", ".zst")
+# Extensões aceitas como membro de um arquivo compactado
+MEMBER_EXTENSIONS = (".xlsx", ".csv", ".xls", ".txt", ".arrow", ".feather", ".ipc")
+# Tamanho do bloco lido ao descomprimir
+DECOMPRESS_BLOCK_SIZE = 1024 * 1024
+
+
+def is_container_file(file_name: str) -> bool:
+    """Indica se o arquivo é um .zip ou um .gz/.zst cujo conteúdo tem uma extensão suportada."""
+    name = file_name.lower()
+    if name.endswith(ARCHIVE_EXTENSIONS):
+        return True
+    return name.endswith(COMPRESSED_EXTENSIONS) and os.path.splitext(name)[0].endswith(MEMBER_EXTENSIONS)
+
+
+def is_virtual_source(path: str) -> bool:
+    return MEMBER_SEPARATOR in path
+
+
+def split_source_path(path: str):
+    """(caminho_real, membro) de uma fonte; membro é None para arquivos comuns."""
+    container, separator, member = path.partition(MEMBER_SEPARATOR)
+    return (container, member) if separator else (path, None)
+
+
+def container_members(container_path: str) -> list:
+    """
+    Caminhos virtuais das fontes suportadas dentro de um .zip (sem extrair nada) ou
+    do conteúdo de um .gz/.zst. Pastas ocultas e arquivos temporários são ignorados.
+    """
+    if not container_path.lower().endswith(ARCHIVE_EXTENSIONS):
+        member = os.path.splitext(os.path.basename(container_path))[0]
+        return [f"{container_path}{MEMBER_SEPARATOR}{member}"]
+    members = []
+    with zipfile.ZipFile(container_path) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or not name.lower().endswith(MEMBER_EXTENSIONS):
+                continue
+            if any(part.startswith((".", "~$", "__MACOSX")) for part in name.split("/")):
+                continue
+            members.append(f"{container_path}{MEMBER_SEPARATOR}{name}")
+    return sorted(members, key=str.lower)
+
+
+def source_display_name(path: str) -> str:
+    """Nome da fonte para logs e para a coluna de origem: "lote.zip::vendas/jan.csv", "vendas.csv.gz"."""
+    container, member = split_source_path(path)
+    if member is None or not container.lower().endswith(ARCHIVE_EXTENSIONS):
+        return os.path.basename(container)
+    return f"{os.path.basename(container)}{MEMBER_SEPARATOR}{member}"
+
+
+def source_stat(path: str) -> os.stat_result:
+    """
+    Estado (tamanho/data de modificação) usado nas impressões digitais e no monitoramento.
+    Para membros de arquivos compactados vale o do arquivo compactado inteiro.
+    """
+    return os.stat(split_source_path(path)[0])
+
+
+def open_source_binary(path: str):
+    """
+    Abre a fonte para leitura binária sequencial. Membros de .zip e arquivos .gz/.zst
+    são descomprimidos em fluxo, à medida que são lidos, sem extração para o disco.
+    """
+    container, member = split_source_path(path)
+    if member is None:
+        return open(container, "rb")
+    lower = container.lower()
+    if lower.endswith(ARCHIVE_EXTENSIONS):
+        archive = zipfile.ZipFile(container)
+        try:
+            stream = archive.open(member)
+        except Exception:
+            archive.close()
+            raise
+        return io.BufferedReader(_ClosingStream(stream, archive), DECOMPRESS_BLOCK_SIZE)
+    if lower.endswith(".gz"):
+        return gzip.open(container, "rb")
+    if zstandard is None:
+        raise RuntimeError(f"Leitura de '{os.path.basename(container)}' requer o pacote 'zstandard' (pip install zstandard).")
+    raw = open(container, "rb")
+    return io.BufferedReader(_ClosingStream(zstandard.ZstdDecompressor().stream_reader(raw, read_size=DECOMPRESS_BLOCK_SIZE), raw), DECOMPRESS_BLOCK_SIZE)
+
+
+def source_for_reader(path: str):
+    """
+    Fonte para leitores que precisam de acesso aleatório (Excel, Arrow IPC): o próprio
+    caminho para arquivos comuns ou o conteúdo descomprimido do membro em memória.
+    """
+    if not is_virtual_source(path):
+        return path
+    with open_source_binary(path) as stream:
+        return io.BytesIO(stream.read())
+
+
+class _ClosingStream(io.RawIOBase):
+    """Fluxo que fecha também o objeto de origem (arquivo .zip ou arquivo bruto) ao ser fechado."""
+    def __init__(self, stream, owner):
+        super().__init__()
+        self._stream = stream
+        self._owner = owner
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            try:
+                self._stream.close()
+            finally:
+                self._owner.close()
+        super().close()
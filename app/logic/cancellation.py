@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import threading
+
+
+# Exceção customizada para interrupção
+class InterruptedError(Exception):
+    pass
+
+
+class CancellationToken:
+    """
+    Sinalizador de cancelamento cooperativo compartilhado entre o worker e as
+    etapas de leitura, harmonização e escrita. Cada etapa consulta o token entre
+    blocos de trabalho limitados (lotes de linhas, abas, DataFrames), de modo que
+    um pedido de parada é atendido em tempo limitado.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self, message: str = "Operação cancelada."):
+        if self._event.is_set():
+            raise InterruptedError(message)
+
+    def wait(self, timeout: float) -> bool:
+        """Aguarda até `timeout` segundos, retornando antes (True) se o cancelamento for pedido."""
+        return self._event.wait(timeout)
+
+
+class AtomicOutputPath:
+    """
+    Context manager que entrega um caminho temporário na mesma pasta do destino.
+    Ao sair sem erros o arquivo temporário substitui o destino (os.replace, atômico
+    no mesmo volume); em caso de erro ou cancelamento ele é removido, e o destino
+    nunca fica com um arquivo escrito pela metade.
+    """
+    def __init__(self, final_path: str):
+        self.final_path = final_path
+        self.temp_path = None
+
+    def __enter__(self) -> str:
+        folder = os.path.dirname(os.path.abspath(self.final_path))
+        name, ext = os.path.splitext(os.path.basename(self.final_path))
+        fd, self.temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=f"{ext}.parcial", dir=folder)
+        os.close(fd)
+        return self.temp_path
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            os.replace(self.temp_path, self.final_path)
+        else:
+            self.discard()
+        return False
+
+    def discard(self):
+        try:
+            if self.temp_path and os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+        except OSError:
+            pass
+
+
+class AtomicOutputDir:
+    """
+    Equivalente ao AtomicOutputPath para saídas em pasta (datasets particionados).
+    A pasta é montada em um diretório temporário ao lado do destino e só então
+    renomeada; uma pasta de destino já existente é substituída apenas depois que a
+    nova estiver completa.
+    """
+    def __init__(self, final_dir: str):
+        self.final_dir = os.path.abspath(final_dir)
+        self.temp_dir = None
+
+    def __enter__(self) -> str:
+        parent = os.path.dirname(self.final_dir)
+        os.makedirs(parent, exist_ok=True)
+        self.temp_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(self.final_dir)}.", suffix=".parcial", dir=parent)
+        return self.temp_dir
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.discard()
+            return False
+        backup_dir = None
+        if os.path.exists(self.final_dir):
+            backup_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(self.final_dir)}.", suffix=".antigo", dir=os.path.dirname(self.final_dir))
+            os.rmdir(backup_dir)
+            os.replace(self.final_dir, backup_dir)
+        os.replace(self.temp_dir, self.final_dir)
+        if backup_dir:
+            shutil.rmtree(backup_dir, ignore_errors=True)
+        return False
+
+    def discard(self):
+        if self.temp_dir and os.path.isdir(self.temp_dir):
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
@@ -0,0 +1,53 @@
+import warnings
+
+import polars as pl
+
+# Uma coluna de texto é codificada como Categorical quando o número de valores
+# distintos não passa desta fração das linhas da fonte...
+LOW_CARDINALITY_MAX_RATIO = 0.1
+# ...nem deste número absoluto de valores distintos
+LOW_CARDINALITY_MAX_UNIQUE = 50_000
+# Abaixo desta quantidade de linhas a proporção não é significativa e apenas "Origem" é codificada
+LOW_CARDINALITY_MIN_ROWS = 1_000
+
+# Formatos em que a codificação em dicionário é mantida na saída
+ENCODED_OUTPUT_FORMATS = ("Parquet", "Parquet (Dataset)", "Arrow IPC")
+
+
+def enable_global_string_cache():
+    """
+    Ativa o cache global de strings, para que colunas Categorical de fontes
+    diferentes compartilhem o mesmo dicionário e possam ser concatenadas sem
+    recodificação. A partir do Polars 1.32 as categorias já são sempre globais e a
+    chamada é apenas compatível (emite DeprecationWarning, que é silenciado).
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        pl.enable_string_cache()
+
+
+def low_cardinality_columns(df: pl.DataFrame) -> list:
+    """Colunas String de `df` com poucos valores distintos em relação ao número de linhas."""
+    string_columns = [name for name, dtype in df.schema.items() if dtype == pl.String]
+    if not string_columns or df.height < LOW_CARDINALITY_MIN_ROWS:
+        return []
+    unique_counts = df.select(pl.col(string_columns).n_unique()).row(0)
+    max_unique = min(LOW_CARDINALITY_MAX_UNIQUE, df.height * LOW_CARDINALITY_MAX_RATIO)
+    return [name for name, n_unique in zip(string_columns, unique_counts) if n_unique <= max_unique]
+
+
+def encode_low_cardinality(df: pl.DataFrame, always_encode=("Origem",)) -> tuple:
+    """
+    Converte para Categorical as colunas de `always_encode` e as colunas de texto de
+    baixa cardinalidade detectadas. Retorna (DataFrame, lista das colunas codificadas).
+    """
+    columns = [c for c in always_encode if c in df.columns and df.schema[c] == pl.String]
+    columns += [c for c in low_cardinality_columns(df) if c not in columns]
+    if not columns:
+        return df, []
+    return df.with_columns(pl.col(columns).cast(pl.Categorical)), columns
+
+
+def decode_categoricals(frame):
+    """Volta as colunas Categorical/Enum para String (para formatos sem dicionário, como XLSX e CSV)."""
+    return frame.with_columns(pl.col(pl.Categorical, pl.Enum).cast(pl.String))
@@ -0,0 +1,190 @@
+import os
+import json
+import hashlib
+import threading
+
+import polars as pl
+
+from .cancellation import AtomicOutputPath
+from .transcode import is_valid_utf8
+
+REFERENCE_FILE_FILTER = "Tabelas de Referência (*.csv *.txt *.parquet *.xlsx *.xls);;Todos os Arquivos (*)"
+# Coluna auxiliar com a chave normalizada, usada só durante a junção
+JOIN_KEY_COLUMN = "__chave_referencia__"
+# Linhas lidas para listar as colunas de uma tabela de referência no diálogo
+REFERENCE_PREVIEW_ROWS = 50
+# Formato textual das chaves de data e data-hora (o texto de uma data-hora varia com a unidade de tempo)
+KEY_DATE_FORMAT = "%Y-%m-%d"
+KEY_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S%.6f"
+
+
+def _is_excel(path: str) -> bool:
+    return path.lower().endswith((".xlsx", ".xls"))
+
+
+def _is_parquet(path: str) -> bool:
+    return path.lower().endswith(".parquet")
+
+
+def _clean_header(name: str) -> str:
+    return str(name).lstrip("\ufeff").strip()
+
+
+def read_reference_table(path: str, sheet: str = None, delimiter: str = ";", n_rows: int = None) -> pl.DataFrame:
+    """
+    Lê uma tabela de referência CSV/TXT/XLSX/XLS com o cabeçalho na primeira linha e
+    todas as colunas como texto (CNPJs e códigos não perdem zeros à esquerda).
+    """
+    if _is_excel(path):
+        options = {"n_rows": n_rows} if n_rows is not None else None
+        if sheet:
+            df = pl.read_excel(path, sheet_name=sheet, infer_schema_length=0, read_options=options)
+        else:
+            df = pl.read_excel(path, sheet_id=1, infer_schema_length=0, read_options=options)
+    elif _is_parquet(path):
+        df = pl.read_parquet(path, n_rows=n_rows)
+    else:
+        encoding = "utf8" if is_valid_utf8(path) else "latin1"
+        df = pl.read_csv(path, separator=delimiter or ";", infer_schema=False, encoding=encoding, n_rows=n_rows, truncate_ragged_lines=True)
+    return df.rename(_clean_header)
+
+
+def reference_sheet_names(path: str) -> list:
+    """Abas de uma tabela de referência em Excel (lista vazia para os demais formatos)."""
+    if not _is_excel(path):
+        return []
+    return list(pl.read_excel(path, sheet_id=0, infer_schema_length=0, read_options={"n_rows": 0}).keys())
+
+
+def reference_columns(path: str, sheet: str = None, delimiter: str = ";") -> list:
+    """Nomes das colunas de uma tabela de referência, lidos de uma pequena amostra."""
+    if _is_parquet(path):
+        return list(pl.read_parquet_schema(path).keys())
+    return read_reference_table(path, sheet, delimiter, n_rows=REFERENCE_PREVIEW_ROWS).columns
+
+
+def enrichment_output_columns(rule: dict) -> dict:
+    """{coluna_da_referência: nome_na_saída} das colunas trazidas por uma regra de enriquecimento."""
+    prefix = rule.get("prefix") or ""
+    return {column: f"{prefix}{column}" for column in rule.get("columns", [])}
+
+
+def reference_key_expression(column: str, digits_only: bool = False, dtype: pl.DataType = None) -> pl.Expr:
+    """
+    Chave de junção como texto sem espaços nas pontas, para que "123" (texto) case com
+    123 (número). Com `digits_only`, pontuação e zeros à esquerda são ignorados:
+    "12.345.678/0001-90" casa com "12345678000190" e "5.102" com "5102".
+    Informe o `dtype` da coluna: chaves decimais inteiras (5102.0) viram "5102", e não
+    "5102.0" (ou "51020" com `digits_only`), e datas/datas-horas têm formato fixo,
+    independente da unidade de tempo da coluna.
+    """
+    key = pl.col(column)
+    if dtype == pl.Date:
+        key = key.dt.strftime(KEY_DATE_FORMAT)
+    elif dtype == pl.Datetime:
+        key = key.dt.strftime(KEY_DATETIME_FORMAT)
+    elif dtype is not None and dtype.is_float():
+        as_integer = pl.when(key == key.round(0)).then(key.cast(pl.Int64, strict=False).cast(pl.String))
+        key = pl.coalesce(as_integer, key.cast(pl.String))
+    key = key.cast(pl.String).str.strip_chars()
+    if digits_only:
+        key = key.str.replace_all(r"\D", "").str.strip_chars_start("0")
+    return key
+
+
+class ReferenceTableCache:
+    """
+    Cópias em Parquet das tabelas de referência CSV/TXT/XLSX, guardadas em `cache_dir`
+    com um índice `indice.json`. Uma cópia vale enquanto tamanho e data de modificação
+    do arquivo, aba e delimitador forem os mesmos da conversão; as próximas execuções
+    leem direto o Parquet, sem decodificar texto nem abrir a planilha.
+    Tabelas já em Parquet são usadas no lugar, sem cópia.
+    """
+    INDEX_FILE = "indice.json"
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self.entries = self._load_index()
+        self.converted = 0
+        self.reused = 0
+
+    def _load_index(self) -> dict:
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX_FILE), "r", encoding="utf-8") as f:
+                return json.load(f).get("tables", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        with AtomicOutputPath(os.path.join(self.cache_dir, self.INDEX_FILE)) as temp_path:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"tables": self.entries}, f, ensure_ascii=False, indent=2)
+
+    def parquet_path(self, path: str, sheet: str = None, delimiter: str = ";") -> str:
+        """Caminho da cópia Parquet da tabela, convertendo-a se ainda não existir ou estiver desatualizada."""
+        if _is_parquet(path):
+            return path
+        stat = os.stat(path)
+        source = os.path.abspath(path)
+        key = hashlib.sha1(f"{source}|{sheet or ''}".encode("utf-8")).hexdigest()
+        copy_path = os.path.join(self.cache_dir, f"{key}.parquet")
+        signature = {"source": source, "sheet": sheet, "delimiter": None if _is_excel(path) else delimiter,
+                     "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        with self._lock:
+            if self.entries.get(key) == signature and os.path.exists(copy_path):
+                self.reused += 1
+                return copy_path
+        os.makedirs(self.cache_dir, exist_ok=True)
+        df = read_reference_table(path, sheet, delimiter)
+        with AtomicOutputPath(copy_path) as temp_path:
+            df.write_parquet(temp_path)
+        with self._lock:
+            self.entries[key] = signature
+            self._save_index()
+            self.converted += 1
+        return copy_path
+
+
+def build_lookup(rule: dict, cache: ReferenceTableCache = None):
+    """
+    Carrega a tabela de referência da regra só com a chave normalizada e as colunas
+    escolhidas (já com os nomes de saída). Chaves vazias são descartadas e, entre chaves
+    repetidas, vale a primeira linha, para que a junção não multiplique linhas.
+    Retorna (DataFrame de consulta, quantidade de chaves repetidas ignoradas).
+    Levanta ValueError se a chave ou alguma coluna não existir na tabela.
+    """
+    path, sheet, delimiter = rule["path"], rule.get("sheet"), rule.get("delimiter") or ";"
+    if cache is not None:
+        reference_lf = pl.scan_parquet(cache.parquet_path(path, sheet, delimiter))
+    elif _is_parquet(path):
+        reference_lf = pl.scan_parquet(path)
+    else:
+        reference_lf = read_reference_table(path, sheet, delimiter).lazy()
+
+    reference_schema = reference_lf.collect_schema()
+    available = set(reference_schema.names())
+    output_columns = enrichment_output_columns(rule)
+    missing = [column for column in [rule["reference_key"], *output_columns] if column not in available]
+    if missing:
+        raise ValueError(f"coluna(s) {', '.join(repr(c) for c in missing)} não encontrada(s) na tabela de referência")
+
+    keyed = reference_lf.select(
+        reference_key_expression(rule["reference_key"], rule.get("digits_only", False), reference_schema[rule["reference_key"]]).alias(JOIN_KEY_COLUMN),
+        *[pl.col(column).alias(output_name) for column, output_name in output_columns.items()],
+    ).filter(pl.col(JOIN_KEY_COLUMN).is_not_null() & (pl.col(JOIN_KEY_COLUMN) != "")).collect()
+    lookup = keyed.unique(subset=JOIN_KEY_COLUMN, keep="first", maintain_order=True)
+    return lookup, keyed.height - lookup.height
+
+
+def join_lookup(lf: pl.LazyFrame, key_column: str, lookup: pl.DataFrame, digits_only: bool = False) -> pl.LazyFrame:
+    """
+    Acrescenta a `lf` as colunas da tabela de consulta por uma junção hash à esquerda na
+    própria consulta (sem passada extra sobre os dados). Linhas sem correspondência
+    recebem nulo nas colunas novas; a ordem das linhas é mantida.
+    """
+    return (
+        lf.with_columns(reference_key_expression(key_column, digits_only, lf.collect_schema()[key_column]).alias(JOIN_KEY_COLUMN))
+        .join(lookup.lazy(), on=JOIN_KEY_COLUMN, how="left", maintain_order="left")
+        .drop(JOIN_KEY_COLUMN)
+    )
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import hashlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from .cancellation import CancellationToken, AtomicOutputPath
+
+# Tamanho dos blocos lidos no cálculo do hash de conteúdo (o hashlib libera o GIL em blocos grandes)
+HASH_BLOCK_SIZE = 1024 * 1024
+# Quantidade máxima de arquivos lembrados no cache; os vistos há mais tempo saem primeiro
+FINGERPRINT_CACHE_MAX_ENTRIES = 20_000
+# Intervalo mínimo para regravar o cache só para atualizar a data de uso de uma entrada
+FINGERPRINT_LAST_SEEN_REFRESH_SECONDS = 24 * 60 * 60
+
+
+def _content_hash(file_path: str, cancel_token: CancellationToken = None) -> str:
+    """Hash BLAKE2b do conteúdo do arquivo, lido em blocos."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as f:
+        while True:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileFingerprintCache:
+    """
+    Cache em disco dos hashes de conteúdo, indexado pelo caminho absoluto. Uma entrada só
+    vale enquanto tamanho e data de modificação do arquivo forem os mesmos do cálculo.
+    """
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self.entries = self._load()
+        self.changed = False
+
+    def _load(self) -> dict:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("files", {})
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, file_path: str, stat: os.stat_result):
+        entry = self.entries.get(os.path.abspath(file_path))
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            # "last_seen" só decide a ordem de descarte: um acerto só força a regravação do
+            # cache quando a data gravada tem mais de um dia
+            now = time.time()
+            if now - entry.get("last_seen", 0) > FINGERPRINT_LAST_SEEN_REFRESH_SECONDS:
+                entry["last_seen"] = now
+                self.changed = True
+            return entry.get("hash")
+        return None
+
+    def put(self, file_path: str, stat: os.stat_result, content_hash: str):
+        self.entries[os.path.abspath(file_path)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": content_hash,
+            "last_seen": time.time(),
+        }
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        if len(self.entries) > FINGERPRINT_CACHE_MAX_ENTRIES:
+            recent = sorted(self.entries.items(), key=lambda item: item[1].get("last_seen", 0), reverse=True)
+            self.entries = dict(recent[:FINGERPRINT_CACHE_MAX_ENTRIES])
+        with AtomicOutputPath(self.cache_path) as temp_path:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"files": self.entries}, f, ensure_ascii=False)
+        self.changed = False
+
+
+def find_duplicate_files(file_paths: list, cache: FileFingerprintCache = None,
+                         cancel_token: CancellationToken = None, max_workers: int = None) -> dict:
+    """
+    Encontra arquivos com conteúdo byte a byte idêntico. Primeiro agrupa pelo tamanho
+    (obtido do sistema de arquivos, sem leitura); só os arquivos que dividem o tamanho com
+    outro têm o conteúdo lido, em paralelo, para o cálculo do hash.
+
+    Retorna {caminho_duplicado: caminho_mantido}. Em cada grupo idêntico é mantido o
+    arquivo de nome mais curto (ex.: "relatorio.xlsx" em vez de "relatorio (1).xlsx").
+    """
+    stats = {}
+    by_size = defaultdict(list)
+    for path in file_paths:
+        try:
+            stats[path] = os.stat(path)
+        except OSError:
+            continue
+        by_size[stats[path].st_size].append(path)
+
+    hashes = {}
+    to_hash = []
+    for paths in by_size.values():
+        if len(paths) < 2:
+            continue
+        for path in paths:
+            cached = cache.get(path, stats[path]) if cache is not None else None
+            if cached:
+                hashes[path] = cached
+            else:
+                to_hash.append(path)
+
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=max_workers or min(len(to_hash), os.cpu_count() or 4)) as executor:
+            futures = {path: executor.submit(_content_hash, path, cancel_token) for path in to_hash}
+            for path, future in futures.items():
+                try:
+                    hashes[path] = future.result()
+                except OSError:
+                    continue
+                if cache is not None:
+                    cache.put(path, stats[path], hashes[path])
+
+    by_content = defaultdict(list)
+    for path, content_hash in hashes.items():
+        by_content[(stats[path].st_size, content_hash)].append(path)
+
+    duplicates = {}
+    for paths in by_content.values():
+        if len(paths) < 2:
+            continue
+        kept, *others = sorted(paths, key=lambda p: (len(os.path.basename(p)), p))
+        for path in others:
+            duplicates[path] = kept
+    return duplicates
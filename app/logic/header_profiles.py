@@ -0,0 +1,104 @@
+import os
+import json
+import time
+
+import polars as pl
+
+from .cancellation import AtomicOutputPath
+
+# Quantidade máxima de fontes (arquivo + aba) lembradas no cache; as vistas há mais tempo saem primeiro
+HEADER_PROFILE_CACHE_MAX_ENTRIES = 50_000
+# Tipos inferidos na análise, gravados pelo nome
+PROFILE_DTYPES = {"String": pl.String, "Int64": pl.Int64, "Float64": pl.Float64, "Datetime": pl.Datetime}
+
+
+def dtype_to_name(dtype) -> str:
+    return next((name for name, candidate in PROFILE_DTYPES.items() if dtype == candidate), "String")
+
+
+class HeaderProfileCache:
+    """
+    Cache em disco do perfil de cabeçalhos de cada fonte (arquivo + aba): linha do
+    cabeçalho, nomes originais e normalizados, tipo inferido e proporção de nulos de
+    cada coluna. Uma entrada só vale enquanto tamanho e data de modificação do arquivo
+    (e, em CSV/TXT, o delimitador) forem os mesmos da análise, de forma que uma nova
+    análise só precisa ler as fontes novas ou alteradas.
+    """
+    FORMAT_VERSION = 1
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self.entries = self._load()
+        self.changed = False
+
+    def _load(self) -> dict:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != self.FORMAT_VERSION:
+            return {}
+        return data.get("sources", {})
+
+    @staticmethod
+    def source_key(file_path: str, sheet_name) -> str:
+        return f"{os.path.abspath(file_path)}\0{sheet_name or ''}"
+
+    @staticmethod
+    def _dialect(file_path: str, delimiter: str):
+        """Parâmetros de leitura que afetam o perfil (só os arquivos de texto dependem do delimitador)."""
+        if file_path.lower().endswith((".csv", ".txt")):
+            return {"delimiter": delimiter, "encoding": "latin-1"}
+        return None
+
+    @classmethod
+    def make_entry(cls, file_path: str, stat: os.stat_result, delimiter: str, header_row_index: int, columns: list) -> dict:
+        """
+        Perfil de uma fonte. `columns` é uma lista de dicionários com "name" (nome único
+        usado no mapeamento), "raw_name", "normalized_name", "dtype" (nome do tipo) e
+        "null_ratio". Uma fonte vazia tem `columns` vazio.
+        """
+        return {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "dialect": cls._dialect(file_path, delimiter),
+            "header_row_index": header_row_index,
+            "columns": columns,
+            "last_seen": time.time(),
+        }
+
+    @classmethod
+    def entry_matches(cls, entry: dict, file_path: str, stat: os.stat_result, delimiter: str = None) -> bool:
+        """Indica se o perfil ainda descreve a fonte (mesmo tamanho, data de modificação e delimitador)."""
+        return bool(entry) and (
+            entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns
+            and entry.get("dialect") == cls._dialect(file_path, delimiter)
+        )
+
+    def get(self, file_path: str, sheet_name, stat: os.stat_result, delimiter: str = None):
+        """Perfil gravado da fonte, ou None se ela é nova, mudou ou foi lida com outro delimitador."""
+        entry = self.entries.get(self.source_key(file_path, sheet_name))
+        if not self.entry_matches(entry, file_path, stat, delimiter):
+            return None
+        entry["last_seen"] = time.time()
+        self.changed = True
+        return entry
+
+    def put(self, file_path: str, sheet_name, stat: os.stat_result, delimiter: str, header_row_index: int, columns: list) -> dict:
+        """Grava o perfil da fonte (ver `make_entry`)."""
+        entry = self.make_entry(file_path, stat, delimiter, header_row_index, columns)
+        self.entries[self.source_key(file_path, sheet_name)] = entry
+        self.changed = True
+        return entry
+
+    def save(self):
+        if not self.changed:
+            return
+        if len(self.entries) > HEADER_PROFILE_CACHE_MAX_ENTRIES:
+            recent = sorted(self.entries.items(), key=lambda item: item[1].get("last_seen", 0), reverse=True)
+            self.entries = dict(recent[:HEADER_PROFILE_CACHE_MAX_ENTRIES])
+        with AtomicOutputPath(self.cache_path) as temp_path:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.FORMAT_VERSION, "sources": self.entries}, f, ensure_ascii=False)
+        self.changed = False
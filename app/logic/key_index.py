@@ -0,0 +1,170 @@
+import os
+import json
+
+import polars as pl
+
+from .cancellation import AtomicOutputDir
+from .enrichment import reference_key_expression
+
+# Coluna auxiliar com o hash das colunas-chave de cada linha
+KEY_HASH_COLUMN = "__chave_hash__"
+# As chaves são convertidas para texto e unidas com um separador improvável antes do hash,
+# para que o índice não dependa da tipagem (ex.: Categorical x String) escolhida em cada execução
+KEY_SEPARATOR = "\x1f"
+NULL_KEY_MARKER = "\x00"
+KEY_HASH_SEED = 0x44617461466C6F77
+# Valores fixos cujo hash é guardado com o índice. Se uma versão do Polars mudar a função
+# de hash, os hashes recalculados não batem e o índice é ignorado em vez de gerar falsos negativos.
+HASH_CANARY_VALUES = ["", "DataFlow", "123.456,78", f"São Paulo{KEY_SEPARATOR}2024-01-31", NULL_KEY_MARKER]
+# Dimensionamento do filtro de Bloom: ~1% de falsos positivos com 10 bits por chave e 7 sondagens
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASH_COUNT = 7
+BLOOM_MIN_BITS = 1024
+# Grupos de linhas pequenos no índice ordenado permitem que a consulta leia só os trechos relevantes
+INDEX_ROW_GROUP_SIZE = 128 * 1024
+# Chaves por lote ao reconstruir o filtro de Bloom
+BLOOM_BUILD_BATCH_ROWS = 1_000_000
+
+
+def key_hash_expression(key_columns: list, schema: dict = None) -> pl.Expr:
+    """
+    Hash (UInt64) da combinação das colunas-chave, estável entre execuções. Com o `schema`
+    dos dados, as chaves são normalizadas como nas junções de enriquecimento: 1.0 (decimal)
+    gera o mesmo hash que 1 (inteiro) e datas têm formato fixo.
+    """
+    schema = schema or {}
+    parts = [reference_key_expression(c, dtype=schema.get(c)).fill_null(NULL_KEY_MARKER) for c in key_columns]
+    return pl.concat_str(parts, separator=KEY_SEPARATOR).hash(seed=KEY_HASH_SEED).alias(KEY_HASH_COLUMN)
+
+def _hash_canary() -> list:
+    return pl.DataFrame({"v": HASH_CANARY_VALUES}).select(pl.col("v").hash(seed=KEY_HASH_SEED)).to_series().to_list()
+
+def _bloom_positions(hashes, bit_count: int):
+    """Posições das sondagens de cada hash no filtro (hashing duplo sobre as duas metades do hash de 64 bits)."""
+    low = hashes % (1 << 32)
+    high = (hashes // (1 << 32)) * 2 + 1
+    for probe in range(BLOOM_HASH_COUNT):
+        yield (low + high * probe) % bit_count
+
+
+class PersistentKeyIndex:
+    """
+    Índice em disco das chaves de duplicatas já entregues em execuções anteriores.
+
+    A pasta do índice guarda `chaves.parquet` (hashes únicos das colunas-chave, ordenados),
+    opcionalmente `bloom.parquet` (filtro de Bloom sobre esses hashes) e `indice.json`
+    (colunas-chave, semente e amostra de hashes, contagens). Na consulta, o filtro de Bloom
+    descarta de imediato as chaves certamente novas; só as restantes são procuradas no
+    índice ordenado. A atualização grava a pasta inteira ao lado e a troca de uma vez.
+    """
+    FORMAT_VERSION = 1
+    KEYS_FILE = "chaves.parquet"
+    BLOOM_FILE = "bloom.parquet"
+    META_FILE = "indice.json"
+
+    def __init__(self, index_dir: str, key_columns: list, use_bloom: bool = True):
+        self.index_dir = os.path.abspath(index_dir)
+        self.key_columns = list(key_columns)
+        self.use_bloom = use_bloom
+        self.meta = self._load_meta()
+
+    @staticmethod
+    def default_dir(output_path: str) -> str:
+        """Pasta padrão do índice, ao lado do arquivo de saída."""
+        return os.path.splitext(os.path.abspath(output_path))[0] + ".indice_chaves"
+
+    def _load_meta(self):
+        try:
+            with open(os.path.join(self.index_dir, self.META_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def total_keys(self) -> int:
+        return (self.meta or {}).get("total_keys", 0)
+
+    def compatibility_error(self):
+        """Motivo pelo qual o índice existente não pode ser usado, ou None."""
+        if self.meta is None:
+            return None
+        if self.meta.get("version") != self.FORMAT_VERSION:
+            return "formato de índice desconhecido"
+        if self.meta.get("key_columns") != self.key_columns:
+            return f"criado para as chaves {', '.join(self.meta.get('key_columns') or [])}"
+        if self.meta.get("hash_seed") != KEY_HASH_SEED or self.meta.get("hash_canary") != _hash_canary():
+            return "a função de hash desta versão do Polars difere da usada na criação do índice"
+        return None
+
+    def _bloom_expression(self):
+        """Expressão que é falsa para os hashes certamente ausentes do índice, ou None sem filtro de Bloom."""
+        bloom = self.meta.get("bloom") or {}
+        bloom_path = os.path.join(self.index_dir, self.BLOOM_FILE)
+        if not bloom.get("bits") or not os.path.exists(bloom_path):
+            return None
+        bits = pl.lit(pl.read_parquet(bloom_path).to_series())
+        maybe = None
+        for positions in _bloom_positions(pl.col(KEY_HASH_COLUMN), bloom["bits"]):
+            hit = bits.gather(positions)
+            maybe = hit if maybe is None else maybe & hit
+        return maybe
+
+    def known_keys(self, run_keys: pl.LazyFrame):
+        """
+        Plano lazy com os hashes de `run_keys` (chaves únicas desta execução) que já estão no
+        índice, ou None se o índice ainda não existe. O filtro de Bloom descarta antes as
+        chaves certamente novas; só as restantes são cruzadas com o índice ordenado. O plano
+        é feito para entrar na mesma execução da consolidação, sem passada extra sobre os dados.
+        """
+        if self.meta is None:
+            return None
+        if self.use_bloom:
+            maybe_known = self._bloom_expression()
+            if maybe_known is not None:
+                run_keys = run_keys.filter(maybe_known)
+        return pl.scan_parquet(os.path.join(self.index_dir, self.KEYS_FILE)).join(run_keys, on=KEY_HASH_COLUMN, how="semi")
+
+    def _write_bloom(self, keys_path: str, bloom_path: str, total_keys: int) -> int:
+        bit_count = max(BLOOM_MIN_BITS, total_keys * BLOOM_BITS_PER_KEY)
+        bits = pl.repeat(False, bit_count, dtype=pl.Boolean, eager=True).rename("bits")
+        for batch in pl.scan_parquet(keys_path).collect_batches(chunk_size=BLOOM_BUILD_BATCH_ROWS):
+            for positions in _bloom_positions(batch.to_series(), bit_count):
+                bits.scatter(positions, True)
+        bits.to_frame().write_parquet(bloom_path, compression="zstd")
+        return bit_count
+
+    def commit(self, new_hashes: pl.Series) -> int:
+        """
+        Acrescenta ao índice as chaves novas (hashes únicos ausentes do índice) entregues
+        nesta execução, reescrevendo a pasta de forma atômica. Retorna a quantidade de
+        chaves acrescentadas.
+        """
+        added = len(new_hashes)
+        if added == 0 and self.meta is not None:
+            return 0
+        sources = [new_hashes.rename(KEY_HASH_COLUMN).to_frame().lazy()]
+        if self.meta is not None:
+            sources.insert(0, pl.scan_parquet(os.path.join(self.index_dir, self.KEYS_FILE)))
+
+        with AtomicOutputDir(self.index_dir) as temp_dir:
+            keys_path = os.path.join(temp_dir, self.KEYS_FILE)
+            pl.concat(sources, how="vertical").unique().sort(KEY_HASH_COLUMN).sink_parquet(
+                keys_path, compression="zstd", row_group_size=INDEX_ROW_GROUP_SIZE
+            )
+            total_keys = pl.scan_parquet(keys_path).select(pl.len()).collect().item()
+            bloom = None
+            if self.use_bloom:
+                bloom = {"bits": self._write_bloom(keys_path, os.path.join(temp_dir, self.BLOOM_FILE), total_keys), "hashes": BLOOM_HASH_COUNT}
+            meta = {
+                "version": self.FORMAT_VERSION,
+                "key_columns": self.key_columns,
+                "hash_seed": KEY_HASH_SEED,
+                "hash_canary": _hash_canary(),
+                "polars": pl.__version__,
+                "total_keys": total_keys,
+                "bloom": bloom,
+            }
+            with open(os.path.join(temp_dir, self.META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
+        self.meta = meta
+        return added
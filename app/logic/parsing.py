@@ -0,0 +1,249 @@
+import polars as pl
+
+from ..utils import TYPE_STRING_TO_POLARS, DATA_TYPES_OPTIONS
+
+# Versão das regras de conversão; entra na assinatura dos caches de resultados por fonte
+PARSING_VERSION = 2
+# Quantos valores não vazios de cada coluna são usados para inferir separadores e formato de data
+PARSE_SAMPLE_SIZE = 500
+# Quantos valores distintos que não puderam ser convertidos são guardados como exemplo, por coluna
+FAILURE_SAMPLE_SIZE = 10
+# Símbolos ao redor dos números removidos antes da conversão (o "R$" e os espaços são removidos em qualquer posição)
+NUMBER_NOISE_CHARS = "\t\u00a0$€%"
+# Formatos de data tentados na inferência, na ordem de preferência em caso de empate
+DATE_FORMATS = [
+    "%d/%m/%Y", "%Y-%m-%d", "%d/%m/%y", "%d-%m-%Y", "%d.%m.%Y", "%Y/%m/%d", "%Y%m%d",
+    "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S%.f",
+]
+# Datas seriais do Excel (dias desde 30/12/1899), aceitas entre 01/01/1900 e 31/12/9999
+EXCEL_EPOCH = pl.date(1899, 12, 30)
+EXCEL_SERIAL_MIN, EXCEL_SERIAL_MAX = 1, 2_958_465
+TRUE_VALUES = ["sim", "s", "verdadeiro", "v", "true", "t", "1", "yes", "y", "x"]
+FALSE_VALUES = ["não", "nao", "n", "falso", "f", "false", "0", "no"]
+
+
+def _clean_number(expr: pl.Expr) -> pl.Expr:
+    # Só operações literais: bem mais rápidas que uma expressão regular em milhões de linhas
+    return expr.str.replace("R$", "", literal=True).str.replace_all(" ", "", literal=True).str.strip_chars(NUMBER_NOISE_CHARS)
+
+
+def infer_decimal_comma(sample: pl.Series):
+    """
+    Decide, pela amostra, se a vírgula é o separador decimal (padrão brasileiro,
+    "1.234,56") ou se é o ponto ("1,234.56" / "0.50"). Valores com um único ponto
+    seguido de exatamente três dígitos ("1.234") e inteiros são ambíguos e não votam;
+    sem votos, retorna None.
+    """
+    cleaned = sample.to_frame("v").select(_clean_number(pl.col("v")).str.strip_chars("()-+")).to_series()
+    votes = cleaned.to_frame("v").select(
+        comma=pl.col("v").str.contains(r",\d*$"),
+        dot=pl.col("v").str.contains(r"\.\d*$") & (pl.col("v").str.contains(",") | ~pl.col("v").str.contains(r"\.\d{3}$")),
+        thousands_dots=pl.col("v").str.count_matches(r"\.") > 1,
+    )
+    comma_votes = int(votes["comma"].sum() + votes["thousands_dots"].sum())
+    dot_votes = int(votes["dot"].sum())
+    if not comma_votes and not dot_votes:
+        return None
+    return comma_votes >= dot_votes
+
+
+def number_expression(column: str, decimal_comma: bool) -> pl.Expr:
+    """
+    Texto -> Float64: remove moeda e espaços, trata negativos contábeis ("(1.500,00)"),
+    sinal no fim ("1.500,00-") e os separadores de milhar/decimal da coluna.
+    """
+    value = _clean_number(pl.col(column))
+    negative = (value.str.starts_with("(") & value.str.ends_with(")")) | value.str.ends_with("-")
+    digits = value.str.strip_chars("()").str.strip_suffix("-")
+    if decimal_comma:
+        digits = digits.str.replace_all(".", "", literal=True).str.replace(",", ".", literal=True)
+    else:
+        digits = digits.str.replace_all(",", "", literal=True)
+    number = digits.cast(pl.Float64, strict=False)
+    return pl.when(negative).then(-number).otherwise(number)
+
+
+def integer_expression(column: str, decimal_comma: bool) -> pl.Expr:
+    """Como `number_expression`, mas valores com casas decimais diferentes de zero viram nulo."""
+    number = number_expression(column, decimal_comma)
+    return pl.when(number == number.round(0)).then(number).cast(pl.Int64, strict=False)
+
+
+def _date_from_format(column: str, date_format: str) -> pl.Expr:
+    if "%H" in date_format:
+        return pl.col(column).str.strptime(pl.Datetime, date_format, strict=False).dt.date()
+    return pl.col(column).str.strptime(pl.Date, date_format, strict=False)
+
+
+def _excel_serial_date(column: str) -> pl.Expr:
+    serial = pl.col(column).str.replace(",", ".", literal=True).cast(pl.Float64, strict=False)
+    valid = serial.is_between(EXCEL_SERIAL_MIN, EXCEL_SERIAL_MAX)
+    return pl.when(valid).then(EXCEL_EPOCH + pl.duration(days=serial.floor().cast(pl.Int64)))
+
+
+def infer_date_format(sample: pl.Series, preferred: str = None):
+    """
+    Formato de data que converte mais valores da amostra (o `preferred`, se converter
+    todos, sem testar os demais). Retorna None se nenhum formato converte algum valor.
+    """
+    frame = sample.to_frame("v")
+    candidates = ([preferred] if preferred else []) + [f for f in DATE_FORMATS if f != preferred]
+    best_format, best_count = None, 0
+    for date_format in candidates:
+        count = frame.select(_date_from_format("v", date_format).is_not_null().sum()).item()
+        if date_format == preferred and count == len(sample):
+            return preferred
+        if count > best_count:
+            best_format, best_count = date_format, count
+    return best_format
+
+
+def date_expression(column: str, date_format: str = None) -> pl.Expr:
+    """Texto -> Date pelo formato inferido, com ISO e datas seriais do Excel como alternativas."""
+    attempts = [_date_from_format(column, date_format)] if date_format else []
+    if date_format != "%Y-%m-%d":
+        attempts.append(_date_from_format(column, "%Y-%m-%d"))
+    attempts.append(_excel_serial_date(column))
+    return pl.coalesce(attempts)
+
+
+def boolean_expression(column: str) -> pl.Expr:
+    value = pl.col(column).str.strip_chars().str.to_lowercase()
+    return pl.when(value.is_in(TRUE_VALUES)).then(True).when(value.is_in(FALSE_VALUES)).then(False).otherwise(None)
+
+
+class TypedColumnParser:
+    """
+    Converte colunas de texto para os tipos escolhidos no mapeamento usando expressões
+    vetorizadas do Polars, entendendo números e datas no padrão brasileiro. Os
+    separadores decimais são inferidos pela amostra de cada fonte (uma planilha com
+    "10.25" e um CSV com "1.234,56" convivem na mesma coluna); o último separador
+    inferido só é reaproveitado quando a amostra não decide (ex.: só inteiros). O
+    formato de data guardado só é trocado se deixar de servir para a amostra da fonte.
+    """
+    def __init__(self):
+        self.decimal_comma = {} # {coluna: bool} último separador inferido
+        self.date_formats = {}  # {coluna: formato}
+        # Colunas cujo separador decimal na última chamada de `parse` mudou em relação às fontes anteriores
+        self.changed_separators = {}
+
+    def _sample(self, df: pl.DataFrame, column: str) -> pl.Series:
+        values = df.get_column(column).str.strip_chars()
+        return values.filter(values.is_not_null() & (values != "")).head(PARSE_SAMPLE_SIZE)
+
+    def expression(self, df: pl.DataFrame, column: str, type_str: str) -> pl.Expr:
+        """Expressão que converte `column` (String) para o tipo `type_str`, já com o nome da coluna."""
+        if type_str in ("Inteiro", "Decimal (Float)"):
+            sample = self._sample(df, column)
+            inferred = infer_decimal_comma(sample) if not sample.is_empty() else None
+            if inferred is not None:
+                if column in self.decimal_comma and self.decimal_comma[column] != inferred:
+                    self.changed_separators[column] = inferred
+                self.decimal_comma[column] = inferred
+            # Sem votos na amostra, vale o separador da fonte anterior ou, na primeira, o padrão brasileiro
+            decimal_comma = self.decimal_comma.get(column, True)
+            expr = integer_expression(column, decimal_comma) if type_str == "Inteiro" else number_expression(column, decimal_comma)
+        elif type_str == "Data":
+            sample = self._sample(df, column)
+            if not sample.is_empty():
+                inferred = infer_date_format(sample, self.date_formats.get(column))
+                if inferred:
+                    self.date_formats[column] = inferred
+            expr = date_expression(column, self.date_formats.get(column))
+        elif type_str == "Booleano":
+            expr = boolean_expression(column)
+        else:
+            expr = pl.col(column).cast(TYPE_STRING_TO_POLARS[type_str], strict=False)
+        return expr.alias(column)
+
+    def parse(self, df: pl.DataFrame, types: dict):
+        """
+        Converte as colunas de `df` que têm tipo em `types` ({coluna: type_str}).
+        Colunas que já chegam tipadas (ex.: números de uma planilha) recebem um cast
+        simples. Retorna (DataFrame convertido, {coluna: falhas}) só com as colunas em
+        que valores não vazios viraram nulo; as falhas de cada coluna trazem "count",
+        "inputs" (valores não vazios na entrada) e "samples" (até FAILURE_SAMPLE_SIZE
+        valores distintos que não puderam ser convertidos).
+        """
+        expressions = []
+        converted = []
+        self.changed_separators = {}
+        for column in df.columns:
+            type_str = types.get(column)
+            if not type_str or type_str == DATA_TYPES_OPTIONS[0] or type_str not in TYPE_STRING_TO_POLARS:
+                expressions.append(pl.col(column))
+            elif df.schema[column] == pl.String:
+                expressions.append(self.expression(df, column, type_str))
+                converted.append(column)
+            else:
+                expressions.append(pl.col(column).cast(TYPE_STRING_TO_POLARS[type_str], strict=False))
+                converted.append(column)
+        if not converted:
+            return df, {}
+        # A conversão roda uma única vez: o resultado (com as colunas originais ao lado, sem cópia)
+        # alimenta tanto o DataFrame convertido quanto os agregados de falhas, executados juntos
+        staged = df.lazy().select(original_value_columns(converted) + expressions).cache()
+        aggregates = conversion_failure_aggregates(converted, df.schema)
+        parsed, stats = pl.collect_all([staged.select(df.columns), staged.select(aggregates)])
+        return parsed, conversion_failures(stats.row(0, named=True), converted)
+
+
+def original_value_columns(columns: list) -> list:
+    """Cópias (`__original_<i>`) das colunas antes da conversão, para comparar com o resultado."""
+    return [pl.col(column).alias(f"__original_{i}") for i, column in enumerate(columns)]
+
+
+def conversion_failure_aggregates(columns: list, original_schema: dict) -> list:
+    """
+    Agregados que comparam cada coluna convertida com sua cópia original (ver
+    `original_value_columns`): valores preenchidos, valores que viraram nulo e até
+    FAILURE_SAMPLE_SIZE exemplos distintos das primeiras falhas. Servem tanto num
+    `select` quanto num `group_by(...).agg`, na mesma execução da conversão.
+    """
+    aggregates = []
+    for i, column in enumerate(columns):
+        value = pl.col(f"__original_{i}")
+        # Só os valores que viraram nulo são examinados; entre eles, os em branco não contam como perda
+        candidates = value.filter(value.is_not_null() & pl.col(column).is_null())
+        if original_schema[column] == pl.String:
+            candidates = candidates.filter(candidates.str.strip_chars().str.len_bytes() > 0)
+        aggregates += [
+            value.is_not_null().sum().alias(f"not_null_{i}"),
+            value.filter(value.is_not_null() & pl.col(column).is_null()).len().alias(f"nulled_{i}"),
+            candidates.len().alias(f"count_{i}"),
+            candidates.head(PARSE_SAMPLE_SIZE).cast(pl.String).unique(maintain_order=True).head(FAILURE_SAMPLE_SIZE).implode().alias(f"samples_{i}"),
+        ]
+    return aggregates
+
+
+def conversion_failures(row: dict, columns: list) -> dict:
+    """
+    {coluna: {"count", "inputs", "samples"}} das colunas em que valores não vazios viraram
+    nulo, a partir de uma linha com os `conversion_failure_aggregates`.
+    """
+    failures = {}
+    for i, column in enumerate(columns):
+        if row[f"count_{i}"]:
+            # Valores em branco também viram nulo, mas não eram entradas preenchidas
+            inputs = row[f"not_null_{i}"] - (row[f"nulled_{i}"] - row[f"count_{i}"])
+            failures[column] = {"count": row[f"count_{i}"], "inputs": inputs, "samples": list(row[f"samples_{i}"])}
+    return failures
+
+
+def parse_literals(values: list, dtype) -> pl.Series:
+    """
+    Converte valores digitados pelo usuário (ex.: valores de filtro "31/12/2024" ou
+    "1.234,56") para `dtype` com as mesmas regras usadas nas colunas, todos de uma vez.
+    Valores que não puderem ser convertidos viram nulo.
+    """
+    type_str = next((name for name, candidate in TYPE_STRING_TO_POLARS.items() if candidate == dtype), None)
+    frame = pl.DataFrame({"valor": list(values)}, schema={"valor": pl.String})
+    if type_str in (None, DATA_TYPES_OPTIONS[0]):
+        return frame.select(pl.col("valor").cast(dtype, strict=False)).to_series()
+    # Um analisador próprio: os valores do filtro não devem alterar os formatos inferidos das fontes
+    return frame.select(TypedColumnParser().expression(frame, "valor", type_str)).to_series()
+
+
+def parse_literal(value: str, dtype):
+    """Como `parse_literals`, para um único valor (None se não puder ser convertido)."""
+    return parse_literals([value], dtype).item()
@@ -0,0 +1,118 @@
+import os
+
+import polars as pl
+
+from .source_cache import SourceResultStore
+
+# Operações da Tabela de Resumo e os agregados parciais (mescláveis) de que cada uma depende.
+# "Média" é guardada como soma/contagem e "Contagem Única" como o conjunto de hashes
+# dos valores distintos, de modo que parciais de fontes diferentes possam ser combinados.
+PARTIALS_BY_OPERATION = {
+    "Soma": ("sum",),
+    "Média": ("sum", "count"),
+    "Contagem": ("count",),
+    "Mínimo": ("min",),
+    "Máximo": ("max",),
+    "Contagem Única": ("distinct",),
+}
+
+
+def pivot_output_name(column: str, operation: str) -> str:
+    """Nome da coluna de resultado, igual ao usado pelo resumo calculado sobre todas as linhas."""
+    return f"{column}_{operation.replace(' ', '_')}"
+
+def _partial_name(column: str, kind: str) -> str:
+    return f"{column}__{kind}"
+
+def _partial_expression(column: str, kind: str) -> pl.Expr:
+    col = pl.col(column)
+    if kind == "sum":
+        return col.sum().alias(_partial_name(column, kind))
+    if kind == "count":
+        return col.count().alias(_partial_name(column, kind))
+    if kind == "min":
+        return col.min().alias(_partial_name(column, kind))
+    if kind == "max":
+        return col.max().alias(_partial_name(column, kind))
+    # "distinct": hashes dos valores distintos (o nulo conta como um valor, como em n_unique)
+    return col.cast(pl.String).hash().unique().alias(_partial_name(column, kind))
+
+def _merge_expression(column: str, kind: str) -> pl.Expr:
+    col = pl.col(_partial_name(column, kind))
+    if kind in ("sum", "count"):
+        return col.sum()
+    if kind == "min":
+        return col.min()
+    if kind == "max":
+        return col.max()
+    return col.list.explode(keep_nulls=False, empty_as_null=False).unique()
+
+
+def partial_pivot(frame, group_by: list, aggregations: list) -> pl.LazyFrame:
+    """
+    Agrega uma fonte (DataFrame ou LazyFrame) nos parciais mescláveis das regras de
+    resumo, uma linha por grupo. Chaves e colunas ausentes na fonte entram como nulas,
+    como aconteceria na concatenação diagonal das fontes.
+    """
+    lf = frame.lazy()
+    columns = lf.collect_schema().names()
+    needed = list(group_by) + [rule["column"] for rule in aggregations]
+    missing = [c for c in dict.fromkeys(needed) if c not in columns]
+    if missing:
+        lf = lf.with_columns([pl.lit(None).alias(c) for c in missing])
+
+    partial_exprs = {}
+    for rule in aggregations:
+        for kind in PARTIALS_BY_OPERATION.get(rule["operation"], ()):
+            partial_exprs.setdefault(_partial_name(rule["column"], kind), _partial_expression(rule["column"], kind))
+    return lf.group_by(group_by).agg(list(partial_exprs.values()))
+
+
+def merge_partial_pivots(partials: pl.LazyFrame, group_by: list, aggregations: list) -> pl.LazyFrame:
+    """Combina parciais (de uma ou mais fontes) no resultado final da Tabela de Resumo."""
+    merge_exprs = {}
+    for rule in aggregations:
+        for kind in PARTIALS_BY_OPERATION.get(rule["operation"], ()):
+            merge_exprs.setdefault(_partial_name(rule["column"], kind), _merge_expression(rule["column"], kind).alias(_partial_name(rule["column"], kind)))
+    merged = partials.group_by(group_by).agg(list(merge_exprs.values()))
+
+    final_exprs = [pl.col(c) for c in group_by]
+    for rule in aggregations:
+        column, operation = rule["column"], rule["operation"]
+        if operation not in PARTIALS_BY_OPERATION:
+            continue
+        output_name = pivot_output_name(column, operation)
+        if operation == "Soma":
+            expr = pl.col(_partial_name(column, "sum"))
+        elif operation == "Média":
+            total, count = pl.col(_partial_name(column, "sum")), pl.col(_partial_name(column, "count"))
+            expr = pl.when(count > 0).then(total.cast(pl.Float64) / count)
+        elif operation == "Contagem":
+            expr = pl.col(_partial_name(column, "count")).cast(pl.UInt32)
+        elif operation == "Mínimo":
+            expr = pl.col(_partial_name(column, "min"))
+        elif operation == "Máximo":
+            expr = pl.col(_partial_name(column, "max"))
+        else:
+            expr = pl.col(_partial_name(column, "distinct")).list.len().cast(pl.UInt32)
+        final_exprs.append(expr.alias(output_name))
+    return merged.select(final_exprs)
+
+
+class PartialPivotStore(SourceResultStore):
+    """
+    Agregados parciais do resumo por fonte, guardados ao lado do arquivo de saída
+    (`<saída>.resumo_parcial/`). Além do mapeamento, as regras de filtro e de resumo
+    entram na impressão digital de cada fonte.
+    """
+    def __init__(self, output_path: str, header_mapping: dict, filter_rules: list, pivot_rules: dict, delimiter: str, header_rules: dict = None):
+        store_dir = os.path.splitext(os.path.abspath(output_path))[0] + ".resumo_parcial"
+        # Os hashes de "Contagem Única" dependem da versão do Polars, que já faz parte da assinatura
+        super().__init__(store_dir, header_mapping, {
+            "group_by": pivot_rules.get("group_by", []),
+            "aggregations": pivot_rules.get("aggregations", []),
+            "filters": filter_rules or [],
+            "delimiter": delimiter,
+            "types": self.types_signature(header_mapping),
+            "header_rules": header_rules or {},
+        })
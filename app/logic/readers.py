@@ -0,0 +1,251 @@
+import io
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+import polars as pl
+
+from .cancellation import CancellationToken
+from .archives import open_source_binary, source_for_reader, is_virtual_source
+from .transcode import is_valid_utf8, UTF8_ENCODING, UTF8_SAMPLE_BYTES
+
+# Quantidade de linhas decodificadas e analisadas por lote na leitura de CSV/TXT.
+# Define o tempo máximo entre duas verificações do token de cancelamento.
+CSV_CHUNK_LINES = 200_000
+# Extensões de arquivos Arrow IPC (Feather v2), aceitos como entrada já tipada
+IPC_EXTENSIONS = (".arrow", ".feather", ".ipc")
+
+
+def is_ipc_file(file_path: str) -> bool:
+    return file_path.lower().endswith(IPC_EXTENSIONS)
+
+
+def raw_column_name(index: int) -> str:
+    """Nome da coluna de índice `index` (base 0) nas leituras brutas: "column_1", "column_2"..."""
+    return f"column_{index + 1}"
+
+
+class RowFilter:
+    """
+    Filtro de linhas aplicado a cada lote da leitura bruta de CSV/TXT, antes de os lotes
+    serem juntados: só as linhas que passam no `predicate` (escrito sobre as colunas
+    brutas "column_1", "column_2"...) e as `keep_first_rows` primeiras linhas do
+    arquivo (título e cabeçalho) ficam em memória. Conta as linhas lidas e mantidas.
+    """
+    def __init__(self, predicate: pl.Expr, keep_first_rows: int = 0):
+        self.predicate = predicate
+        self.keep_first_rows = keep_first_rows
+        self.rows_scanned = 0
+        self.rows_kept = 0
+
+    def apply(self, chunk: pl.DataFrame) -> pl.DataFrame:
+        offset = self.rows_scanned
+        self.rows_scanned += chunk.height
+        keep = self.predicate
+        if offset < self.keep_first_rows:
+            keep = (pl.int_range(pl.len()) < self.keep_first_rows - offset) | keep
+        filtered = chunk.filter(keep)
+        self.rows_kept += filtered.height
+        return filtered
+
+
+def read_csv_raw(file_path: str, separator: str, cancel_token: CancellationToken = None,
+                 n_rows: int = None, encoding: str = 'latin-1', chunk_lines: int = CSV_CHUNK_LINES,
+                 utf8_cache=None, row_filter: RowFilter = None, columns: list = None) -> pl.DataFrame:
+    """
+    Lê um CSV/TXT como dados brutos (sem cabeçalho, tudo String).
+
+    Arquivos que já são UTF-8 válido (ou ASCII) vão direto para o leitor nativo do
+    Polars, sem conversão; `encoding` só vale para os demais. Com um `utf8_cache`
+    (Utf8CopyCache), esses são convertidos uma vez para uma cópia UTF-8, lida também
+    pelo leitor nativo. Sem cache, a conversão é feita lote a lote em
+    `_read_csv_transcoded`. Leituras parciais (`n_rows`) decidem a codificação pela
+    amostra inicial e sempre usam a leitura em lotes. Um `row_filter` (RowFilter) é
+    aplicado a cada lote nas leituras completas. Com `columns` (índices base 0), só
+    essas colunas são analisadas e guardadas, mantendo os nomes brutos originais
+    ("column_3"...).
+    """
+    if n_rows is not None:
+        text_encoding = UTF8_ENCODING if is_valid_utf8(file_path, max_bytes=UTF8_SAMPLE_BYTES) else encoding
+        return _read_csv_transcoded(file_path, separator, cancel_token, n_rows, text_encoding, chunk_lines)
+    if is_valid_utf8(file_path, cancel_token=cancel_token):
+        if not is_virtual_source(file_path):
+            return _read_csv_native(file_path, separator, cancel_token, row_filter, columns)
+        encoding = UTF8_ENCODING
+    elif utf8_cache is not None:
+        return _read_csv_native(utf8_cache.utf8_copy(file_path, encoding, cancel_token), separator, cancel_token, row_filter, columns)
+    return _read_csv_transcoded(file_path, separator, cancel_token, None, encoding, chunk_lines, row_filter, columns)
+
+
+def _read_csv_native(file_path: str, separator: str, cancel_token: CancellationToken = None, row_filter: RowFilter = None,
+                     columns: list = None) -> pl.DataFrame:
+    """Leitura de um arquivo UTF-8 pelo leitor nativo, em lotes, verificando o cancelamento entre eles."""
+    lf = pl.scan_csv(file_path, has_header=False, separator=separator, ignore_errors=True, infer_schema=False,
+                     quote_char=None, truncate_ragged_lines=True, raise_if_empty=False)
+    if columns is not None:
+        # Projeção levada ao leitor: as demais colunas não são convertidas nem guardadas
+        lf = lf.select([raw_column_name(i) for i in columns])
+    chunks = []
+    for chunk in lf.collect_batches(chunk_size=CSV_CHUNK_LINES):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled("Leitura cancelada.")
+        chunks.append(row_filter.apply(chunk) if row_filter is not None and chunk.width > 0 else chunk)
+    if not chunks or chunks[0].width == 0:
+        return pl.DataFrame()
+    return pl.concat(chunks, how="vertical") if len(chunks) > 1 else chunks[0]
+
+
+def _read_csv_transcoded(file_path: str, separator: str, cancel_token: CancellationToken = None,
+                         n_rows: int = None, encoding: str = 'latin-1', chunk_lines: int = CSV_CHUNK_LINES,
+                         row_filter: RowFilter = None, columns: list = None) -> pl.DataFrame:
+    """
+    Lê o CSV/TXT em lotes de `chunk_lines` linhas, verificando o token de cancelamento
+    entre os lotes.
+
+    Com uma codificação diferente de UTF-8 o Polars decodifica o arquivo inteiro
+    em Python antes de analisar; aqui a decodificação é feita lote a lote, o que
+    também limita o pico de memória. O esquema do primeiro lote é reaproveitado
+    nos seguintes para que linhas irregulares sejam truncadas/completadas como
+    na leitura de arquivo inteiro (com `columns`, o primeiro lote é lido inteiro para
+    obter esse esquema e os seguintes só com as colunas pedidas). Fontes comprimidas
+    (.gz/.zst ou membros de .zip) são descomprimidas em fluxo, junto com a decodificação.
+    """
+    chunks = []
+    schema = None
+    rows_left = n_rows
+    with io.TextIOWrapper(open_source_binary(file_path), encoding=encoding, newline='') as f:
+        while rows_left is None or rows_left > 0:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled("Leitura cancelada.")
+            batch_size = chunk_lines if rows_left is None else min(chunk_lines, rows_left)
+            lines = list(islice(f, batch_size))
+            if not lines:
+                break
+            data = "".join(lines).encode('utf-8')
+            chunk = pl.read_csv(source=io.BytesIO(data), has_header=False, separator=separator, ignore_errors=True,
+                                infer_schema=False, quote_char=None, truncate_ragged_lines=True, schema=schema,
+                                raise_if_empty=False, columns=columns if schema is not None else None)
+            if chunk.width > 0:
+                if schema is None:
+                    schema = chunk.schema
+                    if columns is not None:
+                        chunk = chunk.select([raw_column_name(i) for i in columns])
+                chunks.append(row_filter.apply(chunk) if row_filter is not None else chunk)
+            if rows_left is not None:
+                rows_left -= chunk.height
+                if len(lines) < batch_size:
+                    break
+
+    if not chunks:
+        return pl.DataFrame()
+    return pl.concat(chunks, how="vertical") if len(chunks) > 1 else chunks[0]
+
+
+def _restore_raw_names(df: pl.DataFrame, columns: list) -> pl.DataFrame:
+    # O calamine numera as colunas projetadas em sequência; voltam aos nomes brutos originais
+    return df if columns is None else df.rename(dict(zip(df.columns, [raw_column_name(i) for i in columns])))
+
+
+def read_excel_raw(file_path: str, sheet_name, cancel_token: CancellationToken = None, columns: list = None, **kwargs) -> pl.DataFrame:
+    """
+    Lê uma aba do Excel como dados brutos (sem cabeçalho). O motor (calamine)
+    processa a aba em uma única chamada nativa, então o cancelamento é verificado
+    antes e depois dela. Com `columns` (índices base 0), só essas colunas são
+    convertidas, com os nomes brutos originais ("column_3"...).
+    """
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled("Leitura cancelada.")
+    df = pl.read_excel(source=source_for_reader(file_path), sheet_name=sheet_name, has_header=False, columns=columns, **kwargs)
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled("Leitura cancelada.")
+    return _restore_raw_names(df, columns)
+
+
+def read_excel_sheets_raw(file_path: str, sheet_names: list, cancel_token: CancellationToken = None, columns: list = None, **kwargs) -> dict:
+    """
+    Lê várias abas de uma pasta de trabalho em uma única chamada, retornando
+    {nome_da_aba: DataFrame bruto}. O arquivo é aberto, descompactado e tem suas
+    strings compartilhadas/estilos decodificados uma única vez para todas as abas.
+    `columns` (índices base 0) vale para todas as abas.
+    """
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled("Leitura cancelada.")
+    frames = pl.read_excel(source=source_for_reader(file_path), sheet_name=list(sheet_names), has_header=False, columns=columns, **kwargs)
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled("Leitura cancelada.")
+    return {sheet: _restore_raw_names(df, columns) for sheet, df in frames.items()}
+
+
+def read_ipc_source(file_path: str, cancel_token: CancellationToken = None, n_rows: int = None, columns: list = None) -> pl.DataFrame:
+    """
+    Lê um arquivo Arrow IPC/Feather mapeado em memória. Diferente das fontes
+    brutas, o resultado já vem com nomes de colunas e tipos; para arquivos sem
+    compressão os buffers são usados diretamente, sem análise nem cópia (membros de
+    arquivos compactados são descomprimidos em memória antes). `columns` (nomes)
+    restringe a leitura a essas colunas.
+    """
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    df = pl.read_ipc(source_for_reader(file_path), memory_map=not is_virtual_source(file_path), n_rows=n_rows, columns=columns, rechunk=False)
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    return df
+
+
+def ipc_preview_raw(file_path: str, n_rows: int) -> pl.DataFrame:
+    """
+    Primeiras linhas de um arquivo IPC no mesmo formato das leituras brutas
+    (sem cabeçalho, tudo String), com os nomes das colunas na linha 0. Permite
+    que a análise de cabeçalhos e a pré-visualização tratem o IPC como as demais fontes.
+    """
+    df = read_ipc_source(file_path, n_rows=n_rows)
+    raw_columns = [f"column_{i + 1}" for i in range(df.width)]
+    header_row = pl.DataFrame({raw: [name] for raw, name in zip(raw_columns, df.columns)})
+    data_rows = df.select([pl.col(name).cast(pl.String).alias(raw) for name, raw in zip(df.columns, raw_columns)])
+    return pl.concat([header_row, data_rows], how="vertical")
+
+
+class SourcePrefetcher:
+    """
+    Lê fontes à frente do consumo, em paralelo, mantendo no máximo `max_workers`
+    leituras em andamento ou prontas. Usado nas fontes comprimidas, em que a
+    descompressão (zlib/zstd liberam o GIL) domina o tempo de leitura. As fontes
+    devem ser consumidas (`take`) ou descartadas (`discard`) na ordem informada.
+    """
+    def __init__(self, read_function, paths: list, max_workers: int):
+        self.read_function = read_function
+        self.pending = list(paths)
+        self.max_workers = max(1, max_workers)
+        self.futures = {}
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers) if self.pending else None
+        self._fill()
+
+    def _fill(self):
+        while self.pending and len(self.futures) < self.max_workers:
+            path = self.pending.pop(0)
+            self.futures[path] = self.executor.submit(self.read_function, path)
+
+    def take(self, path: str):
+        """Resultado da leitura da fonte (exceções da leitura são repassadas), ou None se ela não foi antecipada."""
+        future = self.futures.pop(path, None)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        finally:
+            self._fill()
+
+    def discard(self, path: str):
+        if path in self.pending:
+            self.pending.remove(path)
+        future = self.futures.pop(path, None)
+        if future is not None:
+            future.cancel()
+            self._fill()
+
+    def close(self):
+        self.pending.clear()
+        for future in self.futures.values():
+            future.cancel()
+        self.futures.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
@@ -0,0 +1,174 @@
+import re
+import json
+import fnmatch
+from collections import Counter, defaultdict
+
+from .cancellation import AtomicOutputPath
+from ..utils import _normalize_header_name, DATA_TYPES_OPTIONS
+
+RECIPE_FORMAT = "receita_dataflow"
+RECIPE_VERSION = 1
+RECIPE_FILE_EXTENSION = ".receita.json"
+RECIPE_FILE_FILTER = f"Receitas DataFlow (*{RECIPE_FILE_EXTENSION});;Arquivos JSON (*.json)"
+
+
+def mapping_rules_by_name(header_mapping: dict) -> dict:
+    """
+    Deriva do mapeamento por fonte ({(coluna, arquivo, aba): info}) regras por nome de
+    cabeçalho normalizado ({nome_normalizado: info}), aplicáveis a fontes que não
+    existiam quando o mapeamento foi feito. Se o mesmo nome foi mapeado de formas
+    diferentes, vale a forma mais frequente.
+    """
+    variants = defaultdict(Counter)
+    infos = {}
+    for (original_col, _, _), info in (header_mapping or {}).items():
+        normalized = _normalize_header_name(original_col)
+        variant = json.dumps(info, sort_keys=True, default=str)
+        variants[normalized][variant] += 1
+        infos[variant] = info
+    return {normalized: infos[counter.most_common(1)[0][0]] for normalized, counter in variants.items()}
+
+
+def _mapping_info(rule: dict) -> dict:
+    return {
+        "final_name": rule["final_name"],
+        "type_str": rule.get("type_str") or DATA_TYPES_OPTIONS[0],
+        "include": bool(rule.get("include", True)),
+    }
+
+
+class HeaderRuleSet:
+    """
+    Regras de mapeamento de cabeçalhos independentes de arquivo: por nome normalizado
+    (ex.: "valoricms") e por padrão (glob sobre o nome normalizado ou regex sobre o nome
+    original). O nome exato tem precedência; entre padrões, vale o primeiro que casar.
+    """
+    def __init__(self, name_rules: dict = None, pattern_rules: list = None):
+        self.name_rules = dict(name_rules or {})
+        self.pattern_rules = list(pattern_rules or [])
+        self._compiled = [self._compile(rule) for rule in self.pattern_rules]
+
+    @classmethod
+    def from_mapping(cls, header_mapping: dict, recipe_mapping: dict = None):
+        """Regras da receita complementadas pelo mapeamento atual (que prevalece nos nomes repetidos)."""
+        recipe_mapping = recipe_mapping or {}
+        name_rules = dict(recipe_mapping.get("by_name") or {})
+        name_rules.update(mapping_rules_by_name(header_mapping))
+        return cls(name_rules, recipe_mapping.get("patterns"))
+
+    @staticmethod
+    def _compile(rule: dict):
+        if rule.get("regex"):
+            return re.compile(rule["pattern"], re.IGNORECASE), False
+        # Globs valem para o nome normalizado: "Valor_*" passa a ser "valor*" e casa com "Valor ICMS"
+        parts = re.split(r"([*?])", rule["pattern"])
+        glob = "".join(part if part in ("*", "?") else _normalize_header_name(part) for part in parts)
+        return re.compile(fnmatch.translate(glob)), True
+
+    def __bool__(self):
+        return bool(self.name_rules or self.pattern_rules)
+
+    def match(self, original_col: str):
+        """Informações de mapeamento ({final_name, type_str, include}) da coluna, ou None."""
+        normalized = _normalize_header_name(original_col)
+        info = self.name_rules.get(normalized)
+        if info is not None:
+            return info
+        for (regex, on_normalized), rule in zip(self._compiled, self.pattern_rules):
+            if regex.match(normalized) if on_normalized else regex.search(str(original_col)):
+                return _mapping_info(rule)
+        return None
+
+    def final_types(self) -> dict:
+        """{nome_final: tipo} das colunas incluídas pelas regras."""
+        infos = list(self.name_rules.values()) + [_mapping_info(rule) for rule in self.pattern_rules]
+        return {info["final_name"]: info.get("type_str") for info in infos if info.get("include")}
+
+    def signature(self) -> dict:
+        return {"by_name": self.name_rules, "patterns": self.pattern_rules}
+
+
+def build_recipe(header_rules: HeaderRuleSet, filter_rules: list, pivot_rules: dict, duplicates_config: dict,
+                 sheet_selection_rules: dict, delimiter: str, output_format: str, output_options: dict,
+                 scan_options: dict, enrichment_rules: list = None) -> dict:
+    """Monta a receita (dicionário serializável em JSON) a partir das configurações atuais."""
+    sheet_rules = {}
+    if sheet_selection_rules:
+        sheet_rules = {"mode": sheet_selection_rules.get("mode", "include"), "names": sorted(sheet_selection_rules.get("names", []))}
+    return {
+        "format": RECIPE_FORMAT,
+        "version": RECIPE_VERSION,
+        "mapping": {
+            "by_name": dict(sorted(header_rules.name_rules.items())),
+            "patterns": header_rules.pattern_rules,
+        },
+        "filters": filter_rules or [],
+        "pivot": pivot_rules or {},
+        "enrichment": enrichment_rules or [],
+        "duplicates": duplicates_config or {},
+        "sheets": sheet_rules,
+        "delimiter": delimiter,
+        "output": {"format": output_format, "options": output_options or {}},
+        "scan": scan_options or {},
+    }
+
+
+def save_recipe(path: str, recipe: dict):
+    with AtomicOutputPath(path) as temp_path:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(recipe, f, ensure_ascii=False, indent=2)
+
+
+def load_recipe(path: str) -> dict:
+    """
+    Lê e valida uma receita. Levanta ValueError com a descrição do problema se o arquivo
+    não for uma receita válida. As regras de abas voltam com os nomes em um conjunto,
+    como no diálogo de seleção global.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            recipe = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"o arquivo não é um JSON válido ({e})")
+    if not isinstance(recipe, dict) or recipe.get("format") != RECIPE_FORMAT:
+        raise ValueError("o arquivo não é uma receita do DataFlow")
+    if recipe.get("version", 0) > RECIPE_VERSION:
+        raise ValueError(f"receita criada por uma versão mais nova (formato {recipe.get('version')})")
+
+    mapping = recipe.get("mapping") or {}
+    by_name = {}
+    for name, rule in (mapping.get("by_name") or {}).items():
+        if not isinstance(rule, dict) or not rule.get("final_name"):
+            raise ValueError(f"regra de mapeamento inválida para o cabeçalho '{name}'")
+        by_name[_normalize_header_name(name)] = _mapping_info(rule)
+    patterns = []
+    for rule in mapping.get("patterns") or []:
+        if not isinstance(rule, dict) or not rule.get("pattern") or not rule.get("final_name"):
+            raise ValueError(f"regra de padrão inválida: {rule}")
+        if rule.get("regex"):
+            try:
+                re.compile(rule["pattern"])
+            except re.error as e:
+                raise ValueError(f"expressão regular inválida '{rule['pattern']}': {e}")
+        patterns.append({"pattern": rule["pattern"], "regex": bool(rule.get("regex")), **_mapping_info(rule)})
+    for info in list(by_name.values()) + patterns:
+        if info["type_str"] not in DATA_TYPES_OPTIONS:
+            raise ValueError(f"tipo desconhecido '{info['type_str']}' na coluna '{info['final_name']}'")
+
+    enrichment = recipe.get("enrichment") or []
+    for rule in enrichment:
+        if not isinstance(rule, dict) or not rule.get("path") or not rule.get("key") or not rule.get("reference_key") or not rule.get("columns"):
+            raise ValueError(f"regra de enriquecimento inválida: {rule}")
+
+    sheets = recipe.get("sheets") or {}
+    return {
+        **recipe,
+        "mapping": {"by_name": by_name, "patterns": patterns},
+        "filters": recipe.get("filters") or [],
+        "pivot": recipe.get("pivot") or {},
+        "enrichment": enrichment,
+        "duplicates": recipe.get("duplicates") or {},
+        "sheets": {"mode": sheets.get("mode", "include"), "names": set(sheets["names"])} if sheets.get("names") else {},
+        "output": recipe.get("output") or {},
+        "scan": recipe.get("scan") or {},
+    }
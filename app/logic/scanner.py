@@ -0,0 +1,148 @@
+import os
+import re
+import time
+import fnmatch
+from datetime import datetime
+
+from .cancellation import CancellationToken
+from .readers import IPC_EXTENSIONS
+from .archives import is_container_file, container_members
+
+# Extensões aceitas como fonte de dados na listagem da pasta
+SUPPORTED_INPUT_EXTENSIONS = (".xlsx", ".csv", ".xls", ".txt") + IPC_EXTENSIONS
+# Opções padrão da varredura da pasta de entrada
+SCAN_DEFAULT_OPTIONS = {
+    "recursive": True,
+    "include": [],          # padrões glob (ou regex, com "use_regex") que o caminho relativo deve atender
+    "exclude": [],          # padrões que descartam arquivos e pastas inteiras
+    "use_regex": False,
+    "min_size_kb": 0,       # 0 = sem limite
+    "max_size_mb": 0,       # 0 = sem limite
+    "modified_after": None, # data ISO (aaaa-mm-dd), inclusive
+    "modified_before": None,
+}
+
+
+class ScanRules:
+    """Regras compiladas de uma varredura: padrões de inclusão/exclusão, tamanho e data de modificação."""
+    def __init__(self, options: dict = None):
+        options = {**SCAN_DEFAULT_OPTIONS, **(options or {})}
+        self.recursive = bool(options["recursive"])
+        self.include = [self._compile(p, options["use_regex"]) for p in options["include"] if p.strip()]
+        self.exclude = [self._compile(p, options["use_regex"]) for p in options["exclude"] if p.strip()]
+        self.min_size = int(options["min_size_kb"] or 0) * 1024
+        self.max_size = int(options["max_size_mb"] or 0) * 1024 * 1024
+        self.modified_after = self._timestamp(options["modified_after"])
+        before = self._timestamp(options["modified_before"])
+        self.modified_before = before + 86400 if before is not None else None # Inclui o dia inteiro
+
+    @staticmethod
+    def _compile(pattern: str, use_regex: bool):
+        pattern = pattern.strip()
+        if use_regex:
+            return re.compile(pattern, re.IGNORECASE)
+        # Padrões sem "/" valem para o nome do arquivo/pasta em qualquer nível
+        return re.compile(fnmatch.translate(pattern.replace("\\", "/")), re.IGNORECASE), "/" in pattern
+
+    @staticmethod
+    def _timestamp(value):
+        if not value:
+            return None
+        return datetime.fromisoformat(str(value)).timestamp()
+
+    @staticmethod
+    def _matches(rule, relative_path: str) -> bool:
+        if isinstance(rule, tuple):
+            regex, match_full_path = rule
+            return bool(regex.match(relative_path if match_full_path else relative_path.rsplit("/", 1)[-1]))
+        return bool(rule.search(relative_path))
+
+    def excludes(self, relative_path: str) -> bool:
+        return any(self._matches(rule, relative_path) for rule in self.exclude)
+
+    def accepts_file(self, relative_path: str, stat: os.stat_result) -> bool:
+        if self.excludes(relative_path):
+            return False
+        if self.include and not any(self._matches(rule, relative_path) for rule in self.include):
+            return False
+        if stat.st_size < self.min_size or (self.max_size and stat.st_size > self.max_size):
+            return False
+        if self.modified_after is not None and stat.st_mtime < self.modified_after:
+            return False
+        if self.modified_before is not None and stat.st_mtime >= self.modified_before:
+            return False
+        return True
+
+
+def scan_folder(root_folder: str, options: dict = None, cancel_token: CancellationToken = None):
+    """
+    Percorre `root_folder` com os.scandir (recursivamente, se configurado), gerando
+    (caminho_completo, caminho_relativo) dos arquivos suportados que atendem às regras.
+    Pastas excluídas não são percorridas; arquivos e pastas ocultos (".") e arquivos
+    temporários do Office ("~$") são ignorados. Pastas sem permissão de leitura são puladas.
+
+    Arquivos .zip e .gz/.zst são abertos só para listar o conteúdo: cada fonte suportada
+    dentro deles é gerada como caminho virtual "<arquivo>::<membro>", e as regras valem
+    para esse caminho (tamanho e data, para o arquivo compactado).
+    """
+    rules = ScanRules(options)
+    pending_dirs = [(root_folder, "")]
+    while pending_dirs:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled("Varredura cancelada.")
+        current_dir, relative_dir = pending_dirs.pop()
+        try:
+            with os.scandir(current_dir) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name.lower())
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.name.startswith((".", "~$")):
+                continue
+            relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if rules.recursive and not rules.excludes(relative_path):
+                        subdirs.append((entry.path, relative_path))
+                    continue
+                if is_container_file(entry.name):
+                    if rules.excludes(relative_path):
+                        continue
+                    stat = entry.stat()
+                    for member_path in _safe_container_members(entry.path):
+                        member_relative = relative_path + member_path[len(entry.path):]
+                        if rules.accepts_file(member_relative, stat):
+                            yield member_path, member_relative
+                    continue
+                if not entry.name.lower().endswith(SUPPORTED_INPUT_EXTENSIONS):
+                    continue
+                if rules.accepts_file(relative_path, entry.stat()):
+                    yield entry.path, relative_path
+            except OSError:
+                continue
+        # Pilha em ordem inversa para visitar as subpastas em ordem alfabética
+        pending_dirs.extend(reversed(subdirs))
+
+
+def _safe_container_members(container_path: str) -> list:
+    """Conteúdo de um arquivo compactado; arquivos corrompidos ou ilegíveis são ignorados."""
+    try:
+        return container_members(container_path)
+    except Exception:
+        return []
+
+
+def scan_folder_batches(root_folder: str, options: dict = None, cancel_token: CancellationToken = None,
+                        batch_size: int = 500, max_interval: float = 0.25):
+    """Agrupa os resultados de `scan_folder` em lotes de até `batch_size` itens ou `max_interval` segundos."""
+    batch = []
+    last_flush = time.monotonic()
+    for item in scan_folder(root_folder, options, cancel_token):
+        batch.append(item)
+        if len(batch) >= batch_size or time.monotonic() - last_flush >= max_interval:
+            yield batch
+            batch = []
+            last_flush = time.monotonic()
+    if batch:
+        yield batch
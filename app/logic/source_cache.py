@@ -0,0 +1,126 @@
+import os
+import json
+import hashlib
+
+import polars as pl
+
+from .cancellation import AtomicOutputPath
+from .archives import source_stat
+from .parsing import PARSING_VERSION
+
+
+class SourceResultStore:
+    """
+    Cache em disco de um resultado por fonte (arquivo + aba), guardado em `store_dir`
+    com um índice `indice.json`. Cada fonte tem uma impressão digital formada por
+    tamanho e data de modificação do arquivo, pelo mapeamento de cabeçalhos daquela
+    fonte e pela assinatura das regras; enquanto ela não muda, o resultado gravado é
+    reaproveitado e a fonte nem precisa ser lida.
+    """
+    FORMAT_VERSION = 1
+    INDEX_FILE = "indice.json"
+
+    def __init__(self, store_dir: str, header_mapping: dict, signature: dict):
+        self.store_dir = store_dir
+        self.header_mapping = header_mapping or {}
+        self.rules_signature = json.dumps({"version": self.FORMAT_VERSION, "polars": pl.__version__, "parsing": PARSING_VERSION, **signature}, sort_keys=True, default=str)
+        self.entries = self._load_index()
+        self.used_keys = set()
+        self.reused = 0
+        self.recomputed = 0
+
+    @staticmethod
+    def types_signature(header_mapping: dict) -> list:
+        """A tipagem é decidida pelo nome final em todas as fontes, então o mapa de tipos entra na assinatura global."""
+        return sorted({(info.get("final_name"), info.get("type_str")) for info in (header_mapping or {}).values() if info.get("include")}, key=str)
+
+    def _load_index(self) -> dict:
+        try:
+            with open(os.path.join(self.store_dir, self.INDEX_FILE), "r", encoding="utf-8") as f:
+                return json.load(f).get("sources", {})
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _source_key(file_path: str, sheet_name) -> str:
+        return hashlib.sha1(f"{os.path.abspath(file_path)}\0{sheet_name or ''}".encode("utf-8")).hexdigest()
+
+    def _fingerprint(self, file_path: str, sheet_name) -> str:
+        stat = source_stat(file_path)
+        source_mapping = sorted(
+            (str(key[0]), json.dumps(info, sort_keys=True, default=str))
+            for key, info in self.header_mapping.items()
+            if key[1] == file_path and key[2] == sheet_name
+        )
+        payload = json.dumps([stat.st_size, stat.st_mtime_ns, source_mapping, self.rules_signature], default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, file_path: str, sheet_name):
+        """Resultado gravado da fonte, ou None se não existir ou estiver desatualizado."""
+        key = self._source_key(file_path, sheet_name)
+        entry = self.entries.get(key)
+        try:
+            if not entry or entry["fingerprint"] != self._fingerprint(file_path, sheet_name):
+                return None
+            df_result = pl.read_parquet(os.path.join(self.store_dir, entry["partial"]))
+        except Exception:
+            return None
+        self.used_keys.add(key)
+        self.reused += 1
+        return df_result
+
+    def quality(self, file_path: str, sheet_name) -> list:
+        """Linhas do relatório de qualidade gravadas junto com o resultado da fonte."""
+        entry = self.entries.get(self._source_key(file_path, sheet_name)) or {}
+        return list(entry.get("quality", []))
+
+    def store(self, file_path: str, sheet_name, df_result: pl.DataFrame, quality: list = None):
+        key = self._source_key(file_path, sheet_name)
+        fingerprint = self._fingerprint(file_path, sheet_name)
+        os.makedirs(self.store_dir, exist_ok=True)
+        # A impressão digital no nome evita sobrescrever o arquivo ainda referenciado pelo índice anterior
+        result_file = f"{key}_{fingerprint[:16]}.parquet"
+        with AtomicOutputPath(os.path.join(self.store_dir, result_file)) as temp_path:
+            df_result.write_parquet(temp_path, compression="zstd")
+        self.entries[key] = {
+            "file": os.path.abspath(file_path),
+            "sheet": sheet_name,
+            "fingerprint": fingerprint,
+            "partial": result_file,
+            "quality": quality or [],
+        }
+        self.used_keys.add(key)
+        self.recomputed += 1
+
+    def commit(self):
+        """Grava o índice apenas com as fontes desta execução e remove arquivos órfãos."""
+        if not os.path.isdir(self.store_dir):
+            return
+        self.entries = {key: entry for key, entry in self.entries.items() if key in self.used_keys}
+        with AtomicOutputPath(os.path.join(self.store_dir, self.INDEX_FILE)) as temp_path:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"sources": self.entries}, f, ensure_ascii=False, indent=2)
+        kept_files = {entry["partial"] for entry in self.entries.values()} | {self.INDEX_FILE}
+        for name in os.listdir(self.store_dir):
+            if name not in kept_files and not name.startswith("."):
+                try:
+                    os.remove(os.path.join(self.store_dir, name))
+                except OSError:
+                    pass
+
+
+class ProcessedSourceStore(SourceResultStore):
+    """
+    Fontes já mapeadas, tipadas e filtradas de uma saída (`<saída>.fontes_processadas/`),
+    usadas pelas consolidações incrementais: só arquivos novos ou alterados são lidos
+    e processados; os demais voltam do cache prontos para a concatenação.
+    """
+    def __init__(self, output_path: str, header_mapping: dict, filter_rules: list, delimiter: str, header_rules: dict = None):
+        store_dir = os.path.splitext(os.path.abspath(output_path))[0] + ".fontes_processadas"
+        super().__init__(store_dir, header_mapping, {
+            "kind": "fontes",
+            "filters": filter_rules or [],
+            "delimiter": delimiter,
+            "types": self.types_signature(header_mapping),
+            "header_rules": header_rules or {},
+        })
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+
+import polars as pl
+
+
+class SpillManager:
+    """
+    Guarda os DataFrames processados por fonte respeitando um orçamento de memória.
+
+    Cada fonte é registrada com `add`; enquanto a soma de `estimated_size()` dos
+    fragmentos em memória ultrapassar o orçamento, o maior deles é gravado em um
+    Parquet temporário e substituído pelo caminho do arquivo. As etapas seguintes
+    (concatenação, duplicatas, resumo e exportação) consomem os fragmentos como
+    LazyFrames, de modo que os despejados são lidos sob demanda.
+    """
+    def __init__(self, budget_bytes: int = 0):
+        self.budget_bytes = budget_bytes or 0  # 0 = sem limite
+        self.fragments = []  # pl.DataFrame (em memória) ou str (caminho do Parquet despejado)
+        self.held_bytes = 0
+        self.total_rows = 0
+        self.spill_count = 0
+        self.spill_bytes = 0       # tamanho estimado em memória do que foi despejado
+        self.spill_disk_bytes = 0  # tamanho ocupado em disco pelos fragmentos
+        self._spill_dir = None
+        self._file_counter = 0
+
+    def __len__(self):
+        return len(self.fragments)
+
+    @property
+    def has_spilled(self) -> bool:
+        return self.spill_count > 0
+
+    def add(self, df: pl.DataFrame):
+        self.fragments.append(df)
+        self.held_bytes += df.estimated_size()
+        self.total_rows += df.height
+        while self.budget_bytes and self.held_bytes > self.budget_bytes:
+            in_memory = [i for i, f in enumerate(self.fragments) if isinstance(f, pl.DataFrame)]
+            if not in_memory:
+                break
+            largest = max(in_memory, key=lambda i: self.fragments[i].estimated_size())
+            self._spill_fragment(largest)
+
+    def _new_spill_path(self, name: str) -> str:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="dataflow_spill_")
+        self._file_counter += 1
+        return os.path.join(self._spill_dir, f"{name}_{self._file_counter:05d}.parquet")
+
+    def _spill_fragment(self, index: int):
+        df = self.fragments[index]
+        size = df.estimated_size()
+        path = self._new_spill_path("fonte")
+        # Compressão leve: o objetivo é liberar memória rapidamente, não economizar disco
+        df.write_parquet(path, compression='lz4')
+        self.fragments[index] = path
+        self.held_bytes -= size
+        self.spill_count += 1
+        self.spill_bytes += size
+        self.spill_disk_bytes += os.path.getsize(path)
+
+    def schemas(self) -> list:
+        return [f.schema if isinstance(f, pl.DataFrame) else pl.read_parquet_schema(f) for f in self.fragments]
+
+    def lazy_frames(self) -> list:
+        return [f.lazy() if isinstance(f, pl.DataFrame) else pl.scan_parquet(f) for f in self.fragments]
+
+    def materialize(self, named_plans: list, collected_plans: list = ()):
+        """
+        Executa juntos, no motor de streaming, os planos de `named_plans` ([(plano, nome)]),
+        gravados em Parquets temporários, e os `collected_plans`, coletados em memória
+        (ex.: resumo e agregados pequenos); etapas em comum são executadas uma única vez.
+        Retorna ([leituras lazy dos Parquets], [DataFrames coletados]).
+        """
+        paths = [self._new_spill_path(name) for _, name in named_plans]
+        sinks = [lf.sink_parquet(path, compression='lz4', lazy=True) for (lf, _), path in zip(named_plans, paths)]
+        results = pl.collect_all(sinks + list(collected_plans), engine='streaming')
+        self.spill_disk_bytes += sum(os.path.getsize(path) for path in paths)
+        return [pl.scan_parquet(path) for path in paths], results[len(sinks):]
+
+    def summary(self) -> str:
+        return (f"{self.spill_count} fragmento(s) despejado(s) em disco "
+                f"({self.spill_bytes / 1024**2:,.1f} MB em memória, {self.spill_disk_bytes / 1024**2:,.1f} MB em disco)")
+
+    def cleanup(self):
+        self.fragments = []
+        self.held_bytes = 0
+        if self._spill_dir and os.path.isdir(self._spill_dir):
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+        self._spill_dir = None
@@ -0,0 +1,102 @@
+import os
+import json
+import codecs
+import hashlib
+import threading
+
+from .cancellation import CancellationToken, AtomicOutputPath
+from .archives import open_source_binary, source_stat
+
+# Bloco lido na validação de UTF-8 e na conversão (a decodificação em C processa o bloco inteiro de uma vez)
+TRANSCODE_BLOCK_SIZE = 4 * 1024 * 1024
+# Leituras parciais (pré-visualização, análise de cabeçalhos) decidem a codificação por esta amostra inicial
+UTF8_SAMPLE_BYTES = 1024 * 1024
+# Codificação usada para arquivos já em UTF-8 (ignora o BOM, se houver)
+UTF8_ENCODING = "utf-8-sig"
+
+
+def is_valid_utf8(file_path: str, max_bytes: int = None, cancel_token: CancellationToken = None) -> bool:
+    """
+    Indica se a fonte é UTF-8 válido (ASCII puro também é). Lê em blocos e para no
+    primeiro byte inválido, o que costuma acontecer logo no início dos arquivos em
+    latin-1. Com `max_bytes`, só essa quantidade inicial é verificada.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    bytes_read = 0
+    with open_source_binary(file_path) as f:
+        while True:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled("Leitura cancelada.")
+            block = f.read(TRANSCODE_BLOCK_SIZE if max_bytes is None else min(TRANSCODE_BLOCK_SIZE, max_bytes - bytes_read))
+            try:
+                if not block:
+                    decoder.decode(b"", final=True)
+                    return True
+                decoder.decode(block)
+            except UnicodeDecodeError:
+                return False
+            bytes_read += len(block)
+            if max_bytes is not None and bytes_read >= max_bytes:
+                return True
+
+
+def transcode_to_utf8(file_path: str, encoding: str, dest_path: str, cancel_token: CancellationToken = None):
+    """Converte a fonte de `encoding` para UTF-8 em `dest_path`, bloco a bloco (memória limitada ao bloco)."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    with AtomicOutputPath(dest_path) as temp_path:
+        with open_source_binary(file_path) as src, open(temp_path, "wb") as dst:
+            while True:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled("Conversão cancelada.")
+                block = src.read(TRANSCODE_BLOCK_SIZE)
+                dst.write(decoder.decode(block, final=not block).encode("utf-8"))
+                if not block:
+                    break
+
+
+class Utf8CopyCache:
+    """
+    Cópias em UTF-8 das fontes de texto em outras codificações, guardadas em `cache_dir`
+    com um índice `indice.json`. Uma cópia vale enquanto tamanho e data de modificação
+    da fonte e a codificação de origem forem os mesmos da conversão; com ela, as
+    próximas leituras usam direto o leitor nativo (multithread) do Polars.
+    Pode ser usada por várias threads ao mesmo tempo.
+    """
+    INDEX_FILE = "indice.json"
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self.entries = self._load_index()
+        self.converted = 0
+        self.reused = 0
+
+    def _load_index(self) -> dict:
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX_FILE), "r", encoding="utf-8") as f:
+                return json.load(f).get("sources", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        with AtomicOutputPath(os.path.join(self.cache_dir, self.INDEX_FILE)) as temp_path:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"sources": self.entries}, f, ensure_ascii=False, indent=2)
+
+    def utf8_copy(self, file_path: str, encoding: str, cancel_token: CancellationToken = None) -> str:
+        """Caminho da cópia UTF-8 da fonte, convertendo-a se ainda não existir ou estiver desatualizada."""
+        stat = source_stat(file_path)
+        key = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+        copy_path = os.path.join(self.cache_dir, f"{key}.csv")
+        signature = {"source": os.path.abspath(file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "encoding": encoding}
+        with self._lock:
+            if self.entries.get(key) == signature and os.path.exists(copy_path):
+                self.reused += 1
+                return copy_path
+        os.makedirs(self.cache_dir, exist_ok=True)
+        transcode_to_utf8(file_path, encoding, copy_path, cancel_token)
+        with self._lock:
+            self.entries[key] = signature
+            self._save_index()
+            self.converted += 1
+        return copy_path
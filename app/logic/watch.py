@@ -0,0 +1,54 @@
+import os
+import time
+
+# Intervalo padrão entre duas varreduras da pasta monitorada, em segundos
+WATCH_POLL_SECONDS = 10
+# Tempo em que tamanho e data de modificação precisam ficar inalterados para o arquivo ser considerado completo
+WATCH_DEBOUNCE_SECONDS = 15
+
+
+class StableFileTracker:
+    """
+    Acompanha os arquivos de uma pasta entre varreduras e indica quais são novos ou
+    foram alterados desde a última consolidação, mas só depois que tamanho e data de
+    modificação pararem de mudar por `debounce_seconds` (arquivo ainda sendo copiado
+    ou gravado não dispara nada).
+    """
+    def __init__(self, debounce_seconds: float = WATCH_DEBOUNCE_SECONDS):
+        self.debounce_seconds = debounce_seconds
+        self.observed = {}  # caminho -> (assinatura, instante em que ela foi vista pela primeira vez)
+        self.processed = {} # caminho -> assinatura já consolidada
+
+    @staticmethod
+    def signature(stat: os.stat_result) -> tuple:
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def set_baseline(self, signatures: dict):
+        """Considera os arquivos informados ({caminho: assinatura}) como já consolidados."""
+        self.processed = dict(signatures)
+        self.observed = {path: (sig, 0.0) for path, sig in signatures.items()}
+
+    def update(self, signatures: dict, now: float = None) -> list:
+        """
+        Registra o estado atual da pasta ({caminho: assinatura}) e retorna os caminhos
+        novos/alterados que já estão estáveis. Arquivos removidos são esquecidos.
+        """
+        now = time.monotonic() if now is None else now
+        ready = []
+        for path, sig in signatures.items():
+            previous = self.observed.get(path)
+            if previous is None or previous[0] != sig:
+                self.observed[path] = (sig, now)
+                continue
+            if self.processed.get(path) != sig and now - previous[1] >= self.debounce_seconds:
+                ready.append(path)
+        for path in [p for p in self.observed if p not in signatures]:
+            self.observed.pop(path, None)
+            self.processed.pop(path, None)
+        return ready
+
+    def mark_processed(self, paths: list):
+        for path in paths:
+            observed = self.observed.get(path)
+            if observed is not None:
+                self.processed[path] = observed[0]
@@ -1,4 +1,6 @@
 import os
+import re
+import threading
 import polars as pl
 import openpyxl
 import xlrd
@@ -8,24 +10,44 @@ from PySide6.QtCore import QThread, Signal
 
 # Importa as funções e constantes do novo módulo de utilitários
 from ..utils import (
-    LogLevel, _find_header_row_index, _make_headers_unique, 
+    LogLevel, _find_header_row_index, _make_headers_unique,
     _normalize_header_name, DATA_TYPES_OPTIONS, TYPE_STRING_TO_POLARS,
-    OPERATOR_OPTIONS, OPERATORS_NO_VALUE
+    OPERATOR_OPTIONS, OPERATORS_NO_VALUE, OPERATORS_LIST_VALUE, split_value_list
 )
-
-# Exceção customizada para interrupção
-class InterruptedError(Exception):
-    pass
+from .cancellation import InterruptedError, CancellationToken, AtomicOutputPath, AtomicOutputDir
+from .archives import source_stat, source_for_reader, source_display_name, is_virtual_source
+from .readers import read_csv_raw, read_excel_raw, read_excel_sheets_raw, is_ipc_file, read_ipc_source, ipc_preview_raw, SourcePrefetcher, RowFilter, raw_column_name
+from .spill import SpillManager
+from .pivot import partial_pivot, merge_partial_pivots, PartialPivotStore
+from .source_cache import ProcessedSourceStore
+from .recipes import HeaderRuleSet
+from .transcode import Utf8CopyCache
+from .parsing import TypedColumnParser, parse_literal, parse_literals, original_value_columns, conversion_failure_aggregates, conversion_failures
+from .enrichment import ReferenceTableCache, build_lookup, join_lookup, enrichment_output_columns
+from .header_profiles import HeaderProfileCache, PROFILE_DTYPES, dtype_to_name
+from .encoding import enable_global_string_cache, encode_low_cardinality, decode_categoricals, ENCODED_OUTPUT_FORMATS
+from .key_index import PersistentKeyIndex, key_hash_expression, KEY_HASH_COLUMN
+from .fingerprints import FileFingerprintCache, find_duplicate_files
+from .scanner import scan_folder, scan_folder_batches
+from .watch import StableFileTracker, WATCH_POLL_SECONDS, WATCH_DEBOUNCE_SECONDS
+from .writers import _frame_height, _iter_frame_slices, _max_text_lengths, write_parquet_dataset, write_csv_export, CSV_COMPRESSION_EXTENSIONS
+
+# A cada quantas linhas os laços de escrita verificam o cancelamento e reportam progresso
+WRITE_CHECK_EVERY_ROWS = 5000
+# Quantas fontes comprimidas podem ser descomprimidas em paralelo durante a consolidação
+PREFETCH_MAX_WORKERS = 4
+# Linhas iniciais usadas na detecção do cabeçalho de cada fonte
+N_PREREAD_ROWS = 20
 
 class ConsolidationWorker(QThread):
-    progress_updated = Signal(int) 
-    log_message = Signal(str, LogLevel) 
-    finished = Signal(bool, str) 
+    progress_updated = Signal(int)
+    log_message = Signal(str, LogLevel)
+    finished = Signal(bool, str)
     progress_text_updated = Signal(str)
 
-    def __init__(self, files_to_process, output_path, output_format, header_mapping, filter_rules, delimiter, pivot_rules, duplicates_config=None):
+    def __init__(self, files_to_process, output_path, output_format, header_mapping, filter_rules, delimiter, pivot_rules, duplicates_config=None, memory_budget_mb=0, output_options=None, skip_identical_files=False, fingerprint_cache_path=None, incremental=False, recipe_mapping=None, source_catalog=None, utf8_cache_dir=None, enrichment_rules=None, reference_cache_dir=None):
         super().__init__()
-        self.files_to_process = files_to_process 
+        self.files_to_process = files_to_process
         self.output_path = output_path
         self.output_format = output_format
         self.header_mapping = header_mapping
@@ -33,605 +55,1367 @@ class ConsolidationWorker(QThread):
         self.pivot_rules = pivot_rules
         self.duplicates_config = duplicates_config or {}
         self.delimiter = delimiter
-        self.is_running = True
+        self.memory_budget_mb = memory_budget_mb or 0 # 0 = sem limite
+        self.output_options = output_options or {} # Opções específicas de cada formato de saída (ex.: "dataset")
+        self.skip_identical_files = skip_identical_files
+        self.fingerprint_cache_path = fingerprint_cache_path # Cache dos hashes de conteúdo (None = sem cache)
+        self.incremental = incremental # Reaproveita as fontes já processadas em execuções anteriores para esta saída
+        # Fontes que não estavam na análise de cabeçalhos (ex.: arquivos novos no modo de monitoramento
+        # ou uma pasta nova com uma receita carregada) são mapeadas pelo nome normalizado ou pelos
+        # padrões de cabeçalho da receita
+        self.mapped_sources = {(key[1], key[2]) for key in (header_mapping or {})}
+        self.header_rules = HeaderRuleSet.from_mapping(header_mapping, recipe_mapping)
+        self.final_name_to_type_str = self._final_types()
+        # Conversão de números/datas no padrão brasileiro; guarda o formato inferido de cada coluna entre as fontes
+        self.type_parser = TypedColumnParser()
+        self.parse_failures = Counter() # {coluna: valores não vazios que viraram nulo na conversão}
+        # Relatório de qualidade: uma linha por fonte e coluna com valores perdidos na tipagem ou na harmonização
+        self.quality_report = []
+        # Perfis da análise de cabeçalhos ({(arquivo, aba): perfil}); fontes inalteradas desde a
+        # análise usam a linha e os nomes de cabeçalho que o usuário viu no mapeamento
+        self.source_catalog = source_catalog or {}
+        self.catalog_hits = 0
+        # Planos de leitura ({(arquivo, aba): plano}) das fontes lidas já com o cabeçalho conhecido:
+        # só as colunas usadas e, em CSV/TXT, com os filtros antecipáveis aplicados na leitura.
+        # Preenchido também pelas threads de pré-leitura e consumido em _process_source
+        self.read_plans = {}
+        # Cópias UTF-8 persistentes dos CSV/TXT em latin-1 (None = conversão em lotes a cada leitura)
+        self.utf8_cache = Utf8CopyCache(utf8_cache_dir) if utf8_cache_dir else None
+        # Tabelas de referência juntadas aos dados consolidados (ex.: CNPJ -> razão social), com cópias
+        # em Parquet reaproveitadas entre execuções (None = tabelas lidas do arquivo original a cada execução)
+        self.enrichment_rules = enrichment_rules or []
+        self.reference_cache = ReferenceTableCache(reference_cache_dir) if reference_cache_dir and self.enrichment_rules else None
+        self.cancel_token = CancellationToken()
+        self.spill = SpillManager(self.memory_budget_mb * 1024 * 1024)
+        self.prefetcher = None
+
+    def _final_types(self):
+        """Mapa {final_name: type_str} das regras de cabeçalho e do header_mapping (chaveado pelo nome ORIGINAL)."""
+        final_name_to_type_str = self.header_rules.final_types()
+        for original_h, map_details in (self.header_mapping or {}).items():
+            if map_details.get("include"):
+                final_name_to_type_str[map_details.get("final_name", original_h)] = map_details.get("type_str")
+        return final_name_to_type_str
 
     def run(self):
         try:
-            self.log_message.emit("Iniciando processo de consolidação...", LogLevel.INFO)
-            all_dataframes_processed = [] 
-            
-            total_items = 0
-            for _, sheets_to_process_for_file in self.files_to_process:
-                if sheets_to_process_for_file is None: total_items += 1
-                else: total_items += len(sheets_to_process_for_file)
-            if total_items == 0:
-                self.log_message.emit("Nenhum item válido para processar.", LogLevel.WARNING)
-                self.finished.emit(False, "Nenhum item para processar.")
-                return
-            processed_items = 0
-
-            for file_path, selected_sheets in self.files_to_process:
-                if not self.is_running: break 
-                file_name = os.path.basename(file_path)
-                sheets_to_iterate = selected_sheets if selected_sheets is not None else [None]
-
+            self._consolidate()
+        except InterruptedError:
+            self.log_message.emit("Consolidação cancelada. Nenhum arquivo de saída parcial foi mantido.", LogLevel.WARNING)
+            self.finished.emit(False, "Cancelado")
+        except Exception as e:
+            self.log_message.emit(f"Erro inesperado consolidação: {e}", LogLevel.ERROR)
+            self.finished.emit(False, f"Erro: {e}")
+        finally:
+            if self.prefetcher is not None:
+                self.prefetcher.close()
+            self.spill.cleanup()
+
+    def _consolidate(self):
+        self.log_message.emit("Iniciando processo de consolidação...", LogLevel.INFO)
+        # Colunas codificadas em dicionário de fontes diferentes precisam compartilhar o mesmo cache
+        enable_global_string_cache()
+        if self.skip_identical_files:
+            self._skip_identical_inputs()
+        if self.memory_budget_mb:
+            self.log_message.emit(f"Orçamento de memória: {self.memory_budget_mb:,} MB. Resultados por fonte acima do limite serão despejados em disco.", LogLevel.INFO)
+        partial_pivot_mode = self._uses_partial_pivot()
+        result_store = None # Cache por fonte: agregados parciais (somente resumo) ou fontes processadas (incremental)
+        key_index = None
+        key_index_plans = []
+        if partial_pivot_mode:
+            self.log_message.emit("Somente resumo: cada arquivo/aba será reduzido a agregados parciais por grupo, sem manter as linhas consolidadas.", LogLevel.INFO)
+            result_store = PartialPivotStore(self.output_path, self.header_mapping, self.filter_rules, self.pivot_rules, self.delimiter, self.header_rules.signature())
+        elif self.incremental:
+            # Só as consolidações incrementais (ex.: disparadas pelo monitoramento da pasta) mantêm o
+            # cache; a primeira delas processa todas as fontes, as seguintes só as novas ou alteradas
+            self.log_message.emit("Consolidação incremental: apenas arquivos novos ou alterados serão lidos e processados.", LogLevel.INFO)
+            result_store = ProcessedSourceStore(self.output_path, self.header_mapping, self.filter_rules, self.delimiter, self.header_rules.signature())
+
+        total_items = 0
+        for _, sheets_to_process_for_file in self.files_to_process:
+            if sheets_to_process_for_file is None: total_items += 1
+            else: total_items += len(sheets_to_process_for_file)
+        if total_items == 0:
+            self.log_message.emit("Nenhum item válido para processar.", LogLevel.WARNING)
+            self.finished.emit(False, "Nenhum item para processar.")
+            return
+        processed_items = 0
+        # Arquivos comprimidos e membros de .zip (CSV/TXT/IPC) são descomprimidos em paralelo,
+        # à frente do processamento; com orçamento de memória, só um fica pronto por vez
+        compressed_sources = [fp for fp, sheets in self.files_to_process if sheets is None and is_virtual_source(fp)]
+        if compressed_sources:
+            workers = 1 if self.memory_budget_mb else min(PREFETCH_MAX_WORKERS, os.cpu_count() or 1)
+            self.prefetcher = SourcePrefetcher(lambda path: self._read_source_raw(path, None), compressed_sources, workers)
+
+        for file_path, selected_sheets in self.files_to_process:
+            self.cancel_token.raise_if_cancelled()
+            file_name = source_display_name(file_path)
+            sheets_to_iterate = selected_sheets if selected_sheets is not None else [None]
+            # Resultados por fonte ainda válidos dispensam a leitura da fonte
+            cached_partials = {}
+            if result_store is not None:
                 for sheet_name in sheets_to_iterate:
-                    if not self.is_running: break 
-                    current_item_description = f"'{file_name}'" + (f" - Aba: '{sheet_name}'" if sheet_name else "")
-                    try:
-                        # ETAPA 1: Pré-leitura e Detecção do Cabeçalho
-                        n_preread_rows = 20
-                        header_row_index = 0
-                        header_names = []
-                        
-                        pre_read_df = None
-                        if file_path.lower().endswith((".csv", ".txt")):
-                            pre_read_df = pl.read_csv(source=file_path, has_header=False, n_rows=n_preread_rows, separator=self.delimiter, encoding='latin-1', ignore_errors=True, infer_schema = False, quote_char = None, truncate_ragged_lines = True)
-                        elif file_path.lower().endswith((".xlsx", ".xls")):
-                            pre_read_df = pl.read_excel(source=file_path, sheet_name=sheet_name, has_header = False).head(n_preread_rows)
-
-                        if pre_read_df is not None and not pre_read_df.is_empty():
-                            header_row_index = _find_header_row_index(pre_read_df, n_preread_rows)
-                            header_names_raw = [str(h) if h is not None else f"column_{i}" for i, h in enumerate(pre_read_df.row(header_row_index))]
-                            header_names = _make_headers_unique(header_names_raw)
-                        
-                        # --- LÓGICA DE LEITURA FINAL E ROBUSTA ---
-                        df_original = None
-                        
-                        # Ler o arquivo inteiro como dados brutos, sem cabeçalho
-                        if file_path.lower().endswith((".csv", ".txt")):
-                            df_raw_data = pl.read_csv(source=file_path, has_header=False, separator=self.delimiter, encoding='latin-1', infer_schema = False, ignore_errors = True, quote_char = None, truncate_ragged_lines = True)
-                        elif file_path.lower().endswith((".xlsx", ".xls")):
-                            df_raw_data = pl.read_excel(source=file_path, sheet_name=sheet_name, has_header = False)
-                        
-                        if df_raw_data is not None and not df_raw_data.is_empty():
-                            # Fatiar o DataFrame para remover lixo + linha do cabeçalho
-                            df_data_only = df_raw_data.slice(offset=header_row_index + 1)
-                            
-                            if not df_data_only.is_empty():
-                                # Renomear as colunas com os nomes que detectamos
-                                rename_mapping = {old_name: new_name for old_name, new_name in zip(df_data_only.columns, header_names)}
-                                df_original = df_data_only.rename(rename_mapping)
-
-                        # Sua lógica de fallback para erros de conversão no Excel pode ser integrada aqui se necessário,
-                        # mas esta leitura primária é muito mais estável.
-                        
-                        if df_original is None or df_original.is_empty():
-                            self.log_message.emit(f"Dados vazios ou erro ao ler {current_item_description}. Pulando.", LogLevel.WARNING)
-                            processed_items += 1
-                            continue
+                    df_cached = result_store.lookup(file_path, sheet_name)
+                    if df_cached is not None:
+                        cached_partials[sheet_name] = df_cached
+            if self.prefetcher is not None and selected_sheets is None and cached_partials:
+                self.prefetcher.discard(file_path)
+            sheets_to_read = [sheet for sheet in (selected_sheets or []) if sheet not in cached_partials]
+            # Abas do mesmo arquivo são lidas juntas, com a pasta de trabalho aberta uma única vez
+            sheet_frames = self._read_workbook_sheets(file_path, sheets_to_read) if sheets_to_read else {}
+
+            for sheet_name in sheets_to_iterate:
+                self.cancel_token.raise_if_cancelled()
+                current_item_description = f"'{file_name}'" + (f" - Aba: '{sheet_name}'" if sheet_name else "")
+                try:
+                    if sheet_name in cached_partials:
+                        self.log_message.emit(f"Fonte inalterada, resultado anterior reaproveitado: {current_item_description}", LogLevel.INFO)
+                        df_processed = cached_partials.pop(sheet_name)
+                        self.quality_report.extend(result_store.quality(file_path, sheet_name))
+                    else:
+                        df_raw_data = sheet_frames.pop(sheet_name, None)
+                        if df_raw_data is None and sheet_name is None and self.prefetcher is not None:
+                            df_raw_data = self.prefetcher.take(file_path)
+                        if df_raw_data is None:
+                            df_raw_data = self._read_source_raw(file_path, sheet_name)
+                        quality_rows_before = len(self.quality_report)
+                        df_processed = self._process_source(file_path, sheet_name, current_item_description, df_raw_data)
+                        if df_processed is not None and partial_pivot_mode:
+                            df_processed = partial_pivot(df_processed, self.pivot_rules["group_by"], self.pivot_rules["aggregations"]).collect(engine='streaming')
+                        if df_processed is not None and result_store is not None:
+                            result_store.store(file_path, sheet_name, df_processed, quality=self.quality_report[quality_rows_before:])
+                    if df_processed is not None:
+                        spills_before = self.spill.spill_count
+                        self.spill.add(df_processed)
+                        if self.spill.spill_count > spills_before:
+                            self.log_message.emit(f"Orçamento de memória excedido após {current_item_description}: {self.spill.summary()}.", LogLevel.INFO)
+                except InterruptedError:
+                    raise
+                except Exception as e:
+                    self.log_message.emit(f"Erro ao processar (ler/mapear/tipar) {current_item_description}: {e}", LogLevel.ERROR)
 
-                        # --- 1. Aplicar Mapeamento de Nomes e Filtro de Colunas (com Coalesce) ---
-                        df_intermediate = df_original
-                        if self.header_mapping:
-                            # 1. Agrupar colunas de origem por seu nome final de destino
-                            final_name_to_source = defaultdict(list)
-                            for original_col_name in df_original.columns:
-                                source_key = (original_col_name, file_path, sheet_name)
-                                mapping_info = self.header_mapping.get(source_key)
-                                if mapping_info and mapping_info.get("include", False):
-                                    final_name = mapping_info.get("final_name")
-                                    final_name_to_source[final_name].append(original_col_name)
-                            # final_name_to_original_map = {}
-                            # for original_name, mapping_info in self.header_mapping.items():
-                            #     if mapping_info.get("include", False):
-                            #         final_name = mapping_info.get("final_name", original_name)
-                            #         if final_name not in final_name_to_original_map:
-                            #             final_name_to_original_map[final_name] = []
-                            #         final_name_to_original_map[final_name].append(original_name)
-
-                            # 2. Construir as expressões de seleção usando coalesce quando necessário
-                            select_expressions = []
-                            df_original_columns = set(df_original.columns) # Para buscas mais rápidas
-
-                            for final_name, original_cols_list in final_name_to_source.items():
-                                # Filtrar a lista para incluir apenas as colunas que existem no DataFrame atual
-                                # existing_original_cols = [col for col in original_cols_list if col in df_original_columns]
-                                
-                                # if not existing_original_cols:
-                                #     continue # Nenhuma das colunas de origem para este nome final existe neste arquivo/aba
-
-                                # Se apenas uma coluna de origem existe, faz um alias simples.
-                                # Se mais de uma, usa coalesce para combinar os dados.
-                                if not original_cols_list:
-                                    continue
-                                if len(original_cols_list) > 1:
-                                    self.log_message.emit(f"Combinando colunas {original_cols_list} em '{final_name}' para {current_item_description}", LogLevel.INFO)
-                                    expr = pl.coalesce(original_cols_list).alias(final_name)
-                                else:
-                                    self.log_message.emit(f"Combinando colunas {original_cols_list} em '{final_name}' para {current_item_description}", LogLevel.INFO)
-                                    expr = pl.col(original_cols_list[0]).alias(final_name)
-                                
-                                select_expressions.append(expr)
-
-                            # Se, após o mapeamento, não sobrar nenhuma expressão, pular o arquivo/aba
-                            if not select_expressions:
-                                self.log_message.emit(f"Nenhuma coluna do arquivo {current_item_description} corresponde ao mapeamento. Pulando.", LogLevel.WARNING)
-                                processed_items += 1
-                                continue
-
-                            # 3. Executar a seleção no DataFrame
-                            df_intermediate = df_original.select(select_expressions)
-                        
-                        if df_intermediate.width == 0:
-                            self.log_message.emit(f"Nenhuma coluna restante em {current_item_description} após mapeamento de nomes. Pulando.", LogLevel.WARNING)
-                            processed_items += 1; continue
-                        
-                        # --- 2. Aplicar Tipagem Especificada pelo Usuário ---
-                        df_typed = df_intermediate
-                        if self.header_mapping:
-                            # Precisamos iterar sobre as colunas FINAIS do df_intermediate
-                            # e encontrar a regra de tipagem correspondente no header_mapping
-                            # (que é chaveado pelo nome ORIGINAL).
-                            
-                            # Criar um mapa reverso: {final_name: original_name_info_from_mapping}
-                            # ou mais direto: {final_name: type_str_from_mapping}
-                            final_name_to_type_str = {}
-                            for original_h, map_details in self.header_mapping.items():
-                                if map_details.get("include"):
-                                    final_name_to_type_str[map_details.get("final_name", original_h)] = map_details.get("type_str")
-
-                            casting_expressions = []
-                            for final_col_name in df_typed.columns: # Iterar sobre colunas já mapeadas/renomeadas
-                                type_str = final_name_to_type_str.get(final_col_name)
-                                
-                                if type_str and type_str != DATA_TYPES_OPTIONS[0]: # Se não for "Automático/String"
-                                    polars_type = TYPE_STRING_TO_POLARS.get(type_str)
-                                    if polars_type:
-                                        self.log_message.emit(f"Convertendo coluna '{final_col_name}' para {type_str} em {current_item_description}", LogLevel.INFO)
-                                        casting_expressions.append(pl.col(final_col_name).cast(polars_type, strict=False))
-                                    else: # Tipo string não encontrado no mapa (não deve acontecer)
-                                        casting_expressions.append(pl.col(final_col_name)) # Manter como está
-                                else: # "Automático/String" ou tipo não mapeado
-                                    casting_expressions.append(pl.col(final_col_name)) # Manter como está
-                            
-                            if casting_expressions: # Se houver alguma expressão (sempre haverá se df_typed não for vazio)
-                                df_typed = df_typed.select(casting_expressions) # .select() é mais seguro que .with_columns() para recriar
-                    
-                        # --- 4. Aplicar Filtros (com lógica hierárquica E/OU) ---
-                        df_filtered = df_typed
-                        if self.filter_rules:
-                            # from collections import defaultdict
-
-                            # Definir quais operadores são para exclusão
-                            EXCLUSION_OPERATORS = {"Diferente de", "Não contém"}
-
-                            grouped_rules = defaultdict(list)
-                            for rule in self.filter_rules:
-                                if rule.get("column"):
-                                    grouped_rules[rule["column"]].append(rule)
-
-                            final_expressions_to_and = []
-                            df_schema = df_filtered.schema
-
-                            for col_name, rules_for_col in grouped_rules.items():
-                                if col_name not in df_schema:
-                                    continue
-
-                                inclusion_exprs = []
-                                exclusion_exprs = []
-                                col_type = df_schema[col_name]
-
-                                # 1. Separar regras em Inclusão e Exclusão
-                                for rule in rules_for_col:
-                                    operator = rule.get("operator")
-                                    value = rule.get("value") # Pega o valor (pode ser string ou lista)
-
-                                    target_list = exclusion_exprs if operator in EXCLUSION_OPERATORS else inclusion_exprs
-
-                                    # Adicionado para pular regras incompletas
-                                    if operator is None or value is None:
-                                        continue
-                                    
-                                    try:
-                                        polars_col = pl.col(col_name)
-                                        expr = None
-                                        
-                                        if operator in OPERATORS_NO_VALUE:
-                                            if operator == "Está em branco": expr = polars_col.is_null()
-                                            elif operator == "Não está em branco": expr = polars_col.is_not_null()
-                                        
-                                        elif operator == "Entre":
-                                            if isinstance(value, list) and len(value) == 2:
-                                                min_val_str, max_val_str = value
-                                                # Strip é aplicado aqui, onde sabemos que são strings
-                                                if min_val_str.strip() and max_val_str.strip():
-                                                    lit_min = pl.lit(min_val_str.strip()).cast(col_type, strict=False)
-                                                    lit_max = pl.lit(max_val_str.strip()).cast(col_type, strict=False)
-                                                    expr = polars_col.is_between(lit_min, lit_max)
-
-                                        # Garante que o valor é uma string antes de usar o .strip()
-                                        elif isinstance(value, str) and value.strip():
-                                            value_str = value.strip()
-                                            lit_val = pl.lit(value_str).cast(col_type, strict=False)
-
-                                            if operator == "Igual a": expr = (polars_col == lit_val)
-                                            elif operator == "Diferente de": expr = (polars_col != lit_val)
-                                            elif operator == "Maior que": expr = (polars_col > lit_val)
-                                            elif operator == "Menor que": expr = (polars_col < lit_val)
-                                            elif col_type == pl.String:
-                                                if operator == "Contém": expr = polars_col.str.contains(value_str, literal=True)
-                                                elif operator == "Não contém": expr = ~polars_col.str.contains(value_str, literal=True)
-                                                elif operator == "Começa com": expr = polars_col.str.starts_with(value_str)
-                                                elif operator == "Termina com": expr = polars_col.str.ends_with(value_str)
-                                        
-                                        if expr is not None:
-                                            target_list.append(expr)
-
-                                    except Exception as e_filter:
-                                        self.log_message.emit(f"Não foi possível aplicar a regra de filtro '{col_name} {operator} {value}': {e_filter}", LogLevel.WARNING)
-                                
-                                # 2. Construir a expressão final para esta coluna
-                                col_final_expr = None
-                                
-                                # Combinar todas as expressões de inclusão com OU (OR)
-                                final_inclusion_expr = pl.any_horizontal(inclusion_exprs) if len(inclusion_exprs) > 1 else (inclusion_exprs[0] if inclusion_exprs else None)
-                                
-                                # Combinar todas as expressões de exclusão com E (AND)
-                                final_exclusion_expr = pl.all_horizontal(exclusion_exprs) if len(exclusion_exprs) > 1 else (exclusion_exprs[0] if exclusion_exprs else None)
-
-                                # Juntar inclusão e exclusão com E (AND)
-                                if final_inclusion_expr is not None and final_exclusion_expr is not None:
-                                    col_final_expr = final_inclusion_expr & final_exclusion_expr
-                                elif final_inclusion_expr is not None:
-                                    col_final_expr = final_inclusion_expr
-                                elif final_exclusion_expr is not None:
-                                    col_final_expr = final_exclusion_expr
-
-                                if col_final_expr is not None:
-                                    final_expressions_to_and.append(col_final_expr)
-
-                            # 3. Aplicar os filtros finais combinados com E (AND)
-                            if final_expressions_to_and:
-                                rows_before = df_filtered.height
-                                df_filtered = df_filtered.filter(final_expressions_to_and)
-                                rows_after = df_filtered.height
-                                self.log_message.emit(f"Filtro aplicado em {current_item_description}. Linhas restantes: {rows_after} de {rows_before}.", LogLevel.INFO)
-                        
-                        # --- Fim do Bloco de Filtros ---
-
-                        # --- 3. Adicionar Coluna de Origem --- 
-                        file_name_only = os.path.basename(file_path)
-                        source_name = f"{file_name_only} ({sheet_name})" if sheet_name else file_name_only
-                        
-                        df_final_for_list = df_filtered.with_columns( # <-- Usa df_filtered
-                            pl.lit(source_name).alias("Origem")
-                        )
-
-                        all_dataframes_processed.append(df_final_for_list)
-
-                    except Exception as e:
-                        self.log_message.emit(f"Erro ao processar (ler/mapear/tipar) {current_item_description}: {e}", LogLevel.ERROR)
-                    
-                    processed_items += 1
-                    progress = int((processed_items / total_items) * 100) if total_items > 0 else 0
-                    self.progress_updated.emit(progress)
+                processed_items += 1
+                progress = int((processed_items / total_items) * 100) if total_items > 0 else 0
+                self.progress_updated.emit(progress)
 
-                if not self.is_running: break 
+        if self.utf8_cache is not None and (self.utf8_cache.converted or self.utf8_cache.reused):
+            self.log_message.emit(f"Cópias UTF-8: {self.utf8_cache.converted} arquivo(s) convertido(s), {self.utf8_cache.reused} reaproveitado(s). Cache em: {self.utf8_cache.cache_dir}", LogLevel.INFO)
+        if self.parse_failures:
+            summary = ", ".join(f"{col}: {count}" for col, count in self.parse_failures.most_common())
+            self.log_message.emit(f"Valores que não puderam ser convertidos (ficaram em branco), por coluna: {summary}. Detalhes por fonte e exemplos no relatório de qualidade.", LogLevel.WARNING)
+        if self.source_catalog:
+            self.log_message.emit(f"Cabeçalho de {self.catalog_hits} fonte(s) reaproveitado da análise de cabeçalhos; as demais tiveram o cabeçalho detectado novamente.", LogLevel.INFO)
 
-            if not self.is_running:
-                 self.log_message.emit("Consolidação cancelada.", LogLevel.WARNING)
-                 self.finished.emit(False, "Cancelado"); return
+        if not len(self.spill):
+            self.log_message.emit("Nenhum dado após processamento.", LogLevel.WARNING)
+            self.finished.emit(False, "Nenhum dado processado."); return
 
-            if not all_dataframes_processed:
-                self.log_message.emit("Nenhum dado após processamento.", LogLevel.WARNING)
-                self.finished.emit(False, "Nenhum dado processado."); return
+        final_frames_to_concat, harmonization_checks = self._harmonize_types(self.spill.lazy_frames(), self.spill.schemas())
 
-            # --- Harmonização de Tipos (Pós-Tipagem do Usuário e Mapeamento) ---
-            self.log_message.emit("Harmonizando tipos (2ª passagem) entre arquivos processados...", LogLevel.INFO)
-            
-            # 1. Coletar todos os tipos para cada nome de coluna final único
-            #    em todos os DataFrames processados.
-            column_all_types_globally = {} # {final_col_name: set_of_dtypes}
-            for df_processed in all_dataframes_processed:
-                 for col_name, dtype in df_processed.schema.items():
-                     if col_name not in column_all_types_globally:
-                         column_all_types_globally[col_name] = set()
-                     column_all_types_globally[col_name].add(dtype)
-            
-            # 2. Determinar o tipo alvo para cada coluna globalmente
-            global_target_types = {} # {final_col_name: target_polars_type}
-            for final_col_name, dtypes_set in column_all_types_globally.items():
-                is_int_present = any(t.is_integer() for t in dtypes_set)
-                is_float_present = any(t.is_float() for t in dtypes_set)
-                is_string_present = any(t == pl.String or t == pl.Utf8 for t in dtypes_set)
-                is_temporal_present = any(t.is_temporal() for t in dtypes_set)
-                is_boolean_present = any(t == pl.Boolean for t in dtypes_set)
-                is_null_present = any(t == pl.Null for t in dtypes_set) # Null type
-
-                target_type_for_col = None
-
-                # Regra de Prioridade para determinar o tipo alvo:
-                if is_string_present: # Se String estiver presente, tudo vira String
-                    target_type_for_col = pl.String
-                    self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global String (devido à presença de String).", LogLevel.INFO)
-                elif is_temporal_present and (is_int_present or is_float_present or is_boolean_present): # Temporal com outros não-string -> String
-                    target_type_for_col = pl.String
-                    self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global String (conflito Temporal com Numérico/Booleano).", LogLevel.INFO)
-                elif is_boolean_present and (is_int_present or is_float_present): # Booleano com Numérico -> String
-                    target_type_for_col = pl.String
-                    self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global String (conflito Booleano com Numérico).", LogLevel.INFO)
-                elif is_float_present: # Se Float estiver presente (e não String), tudo vira Float
-                    target_type_for_col = pl.Float64
-                    self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global Decimal (Float) (devido à presença de Float ou Int+Float).", LogLevel.INFO)
-                elif is_int_present: # Se apenas Int (e talvez Null, Boolean que pode ser Int)
-                    target_type_for_col = pl.Int64 # Se só há Int e Null, pode ser Int. Se Booleano, pode ser Int.
-                    # Se Booleano estiver presente e quisermos ser mais específicos, poderíamos ter mais regras
-                    # Mas Int64 pode acomodar Booleanos como 0/1 se o cast funcionar.
-                    self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global Inteiro.", LogLevel.INFO)
-                elif is_temporal_present: # Apenas Temporal (e talvez Null)
-                    # Se houver múltiplos tipos temporais (Date, Datetime, Duration), escolher o mais geral (Datetime?) ou String.
-                    # Por simplicidade, se só Temporal, manter (o primeiro que encontrar, ou o mais comum).
-                    # Para ser seguro, se houver vários tipos temporais, converter para String ou o tipo mais abrangente.
-                    # Esta parte pode precisar de mais refinamento se você tiver mistura de Date, Datetime, etc.
-                    # Vamos pegar o primeiro tipo temporal encontrado como exemplo, ou default para pl.Date.
-                    first_temporal_type = next((t for t in dtypes_set if t.is_temporal()), pl.Date)
-                    target_type_for_col = first_temporal_type
-                    self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global {first_temporal_type} (apenas Temporal).", LogLevel.INFO)
-                elif is_boolean_present: # Apenas Booleano (e talvez Null)
-                    target_type_for_col = pl.Boolean
-                    self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global Booleano.", LogLevel.INFO)
-                # Se for apenas Null, ou tipos não cobertos, ele permanecerá None, e o cast não será aplicado abaixo
-                # ou podemos definir um default como String.
-                elif is_null_present and len(dtypes_set) == 1: # Apenas Null type
-                     # Deixar como está por enquanto, o concat pode lidar com coluna toda Null.
-                     # Ou, se quisermos ser proativos:
-                     # target_type_for_col = pl.String
-                     # self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global String (era apenas Null).", LogLevel.INFO)
-                     pass # Não define target_type, o cast não será aplicado para esta coluna se ela for só Null
-
-                if target_type_for_col:
-                    global_target_types[final_col_name] = target_type_for_col
-            
-            # 3. Aplicar o tipo alvo global a cada DataFrame
-            harmonized_dataframes_final_pass = [] 
-            for df_to_harmonize in all_dataframes_processed:
-                 df_modified_this_pass = df_to_harmonize
-                 
-                 expressions_to_apply = []
-                 for col_name_in_df in df_to_harmonize.columns:
-                     target_type = global_target_types.get(col_name_in_df)
-                     current_type = df_to_harmonize.schema.get(col_name_in_df)
-
-                     if target_type and current_type != target_type:
-                         # Só aplicar cast se o tipo atual for diferente do alvo
-                         expressions_to_apply.append(pl.col(col_name_in_df).cast(target_type, strict=False).alias(col_name_in_df))
-                         self.log_message.emit(f"Aplicando tipo alvo '{target_type}' à coluna '{col_name_in_df}' (era '{current_type}').", LogLevel.INFO)
-                     else:
-                         # Manter a coluna como está (ou porque não há tipo alvo ou já é o tipo alvo)
-                         expressions_to_apply.append(pl.col(col_name_in_df))
-                 
-                 if expressions_to_apply: # Se houver colunas no DF (sempre deve haver se chegou aqui)
-                     df_modified_this_pass = df_to_harmonize.select(expressions_to_apply)
-                 
-                 harmonized_dataframes_final_pass.append(df_modified_this_pass)
-            
-            final_dataframes_to_concat = harmonized_dataframes_final_pass
-            # --- Fim Harmonização (2ª passagem) ---
-            # dataframes_final_pass_no_null_type = []
-            # for df in dataframes_final_pass_no_null_type:
-            #     expression_for_null_cast = []
-            #     needs_null_type_casting = False
-            #     for col_name in df.columns:
-            #         if df[col_name].dtype == pl.Null:
-            #             expression_for_null_cast.append(pl.col(col_name).cast(pl.String).alias(col_name))
-            #             needs_null_type_casting = True
-            #         else:
-            #             expression_for_null_cast.append(pl.col(col_name))
-            #     if needs_null_type_casting and expression_for_null_cast:
-            #         dataframes_final_pass_no_null_type.append(df.select(expression_for_null_cast))
-            #     else:
-            #         final_dataframes_to_concat = dataframes_final_pass_no_null_type
-            self.log_message.emit("Concatenando dados processados...", LogLevel.INFO)
-            try:
-                consolidated_df = pl.concat(final_dataframes_to_concat, how="diagonal")
+        self.log_message.emit("Concatenando dados processados...", LogLevel.INFO)
+        try:
+            if partial_pivot_mode:
+                consolidated_lf, removed_duplicates_lf = None, None
+                pivot_lf = self._merge_pivot_partials(final_frames_to_concat)
+                if pivot_lf is None:
+                    self.finished.emit(False, "Erro ao criar a tabela de resumo."); return
+            else:
+                consolidated_lf = pl.concat(final_frames_to_concat, how="diagonal")
                 # --- Reordenar Coluna "Origem" para o Final ---
-                if "Origem" in consolidated_df.columns:
+                consolidated_columns = consolidated_lf.collect_schema().names()
+                if "Origem" in consolidated_columns:
                     # Pega todas as colunas, exceto "Origem"
-                    all_other_columns = [col for col in consolidated_df.columns if col != "Origem"]
+                    all_other_columns = [col for col in consolidated_columns if col != "Origem"]
                     # Cria a nova ordem com "Origem" no final
                     new_column_order = all_other_columns + ["Origem"]
                     # Seleciona as colunas na nova ordem
-                    consolidated_df = consolidated_df.select(new_column_order)
-                
-                # --- Remoção de duplicatas ---
-                removed_duplicates_df = None
-                key_columns = self.duplicates_config.get("key_columns", [])
-                generate_report = self.duplicates_config.get("generate_report", False)
-                if key_columns:
-                    rows_before = consolidated_df.height
-                    self.log_message.emit(f"Removendo duplicatas com base nas chaves: {', '.join(key_columns)}...", LogLevel.INFO)
-                    df_with_index = consolidated_df.with_row_index("__temp_index__")
-                    unique_rows = df_with_index.unique(subset = key_columns, keep = 'first')
-                    if generate_report:
-                        removed_duplicates_df = df_with_index.join(unique_rows, on = "__temp_index__", how = "anti").drop("__temp_index__")
-                    consolidated_df = unique_rows.drop("__temp_index__")
-                    rows_after = consolidated_df.height
-                    self.log_message.emit(f"{rows_before - rows_after} linhas duplicadas foram removidas. Linhas restantes: {rows_after}", LogLevel.SUCCESS)
-                    if removed_duplicates_df is not None and not removed_duplicates_df.is_empty():
-                        self.log_message.emit(f"Uma aba com as {removed_duplicates_df.height} linhas removidas será gerada.", LogLevel.INFO)
-                
-                # --- Aplicar Regras da Tabela de Resumo (Pivot) ---
-                pivot_df = None # DataFrame para a tabela de resumo
-                if self.pivot_rules and self.pivot_rules.get("group_by") and self.pivot_rules.get("aggregations"):
-                    self.log_message.emit("Criando Tabela de Resumo (em memória)...", LogLevel.INFO)
-                    try:
-                        group_by_cols = self.pivot_rules['group_by']
-                        aggregations = self.pivot_rules['aggregations']
-
-                        op_map = {
-                            "Soma": pl.sum, "Média": pl.mean, "Contagem": pl.count,
-                            "Mínimo": pl.min, "Máximo": pl.max,
-                            "Contagem Única": lambda col: pl.col(col).n_unique()
-                        }
-
-                        agg_expressions = []
-                        for rule in aggregations:
-                            col_name = rule['column']
-                            op_str = rule['operation']
-                            
-                            if col_name not in consolidated_df.columns:
-                                self.log_message.emit(f"Coluna '{col_name}' da regra de resumo não encontrada. Pulando.", LogLevel.WARNING)
-                                continue
-                            
-                            if op_str in op_map:
-                                polars_func = op_map[op_str]
-                                new_col_name = f"{col_name}_{op_str.replace(' ', '_')}"
-                                agg_expressions.append(polars_func(col_name).alias(new_col_name))
-                        
-                        if agg_expressions:
-                            pivot_df = consolidated_df.group_by(group_by_cols).agg(agg_expressions).sort(group_by_cols)
-                            self.log_message.emit("Tabela de resumo criada com sucesso.", LogLevel.SUCCESS)
-
-                    except Exception as e_pivot:
-                        self.log_message.emit(f"Erro ao criar tabela de resumo: {e_pivot}. O resultado do resumo não será salvo.", LogLevel.ERROR)
-                        pivot_df = None
-                # --- FIM DO BLOCO DE PIVOT --
-            except Exception as e: 
-                 self.log_message.emit(f"Erro concatenação final: {e}", LogLevel.ERROR)
-                 self.finished.emit(False, f"Erro concatenação: {e}"); return
+                    consolidated_lf = consolidated_lf.select(new_column_order)
+
+                removed_by_index_lf = None
+                if self.duplicates_config.get("key_columns") and self.duplicates_config.get("persistent_index"):
+                    key_index, consolidated_lf, removed_by_index_lf, key_index_plans = self._apply_key_index(consolidated_lf)
+                consolidated_lf, removed_duplicates_lf = self._remove_duplicates(consolidated_lf)
+                if removed_by_index_lf is not None:
+                    removed_duplicates_lf = removed_by_index_lf if removed_duplicates_lf is None else pl.concat([removed_by_index_lf, removed_duplicates_lf], how="diagonal")
+                consolidated_lf = self._apply_enrichment(consolidated_lf)
+                pivot_lf = self._build_pivot(consolidated_lf)
+
+            if self.output_format not in ENCODED_OUTPUT_FORMATS and consolidated_lf is not None:
+                # XLSX e CSV não têm dicionário: as colunas categóricas são decodificadas só na escrita
+                consolidated_lf = decode_categoricals(consolidated_lf)
+                if removed_duplicates_lf is not None:
+                    removed_duplicates_lf = decode_categoricals(removed_duplicates_lf)
+
             if self.output_format == "XLSX":
                 illegal_xml_chars_re = r"[\u0000-\u0008\u000B\u000C\u000E-\u001F]"
-                # Sanitiza ambos os dataframes
-                consolidated_df = consolidated_df.with_columns(
-                    pl.col(pl.String).str.replace_all(illegal_xml_chars_re, "")
-                )
-                if pivot_df is not None:
-                    pivot_df = pivot_df.with_columns(
+                # Sanitiza os dados e o resumo
+                if consolidated_lf is not None:
+                    consolidated_lf = consolidated_lf.with_columns(
+                        pl.col(pl.String).str.replace_all(illegal_xml_chars_re, "")
+                    )
+                if pivot_lf is not None:
+                    pivot_lf = pivot_lf.with_columns(
                         pl.col(pl.String).str.replace_all(illegal_xml_chars_re, "")
                     )
-            
-            self.log_message.emit(f"Salvando: {self.output_path}", LogLevel.INFO)
-            only_pivot = self.pivot_rules.get("only_pivot", False)
 
-            if self.output_format == "XLSX":
-                try:
-                    import xlsxwriter
-                    workbook = xlsxwriter.Workbook(self.output_path, {'use_zip64': True})
-                    
-                    # Formatos
-                    header_format = workbook.add_format({'font_name': 'Aptos', 'bold': True, 'font_color': 'white', 'bg_color': '#000000', 'border': 1, 'align': 'center', 'valign': 'vcenter'})
-                    data_format = workbook.add_format({'font_name': 'Aptos'})
-                    group_by_header_format = workbook.add_format({'font_name': 'Aptos', 'bold': True, 'font_color': 'white', 'bg_color': '#000000', 'border': 1, 'align': 'center', 'valign': 'vcenter'})
-
-                    total_rows_to_write = consolidated_df.height + (pivot_df.height if pivot_df is not None else 0)
-                    total_rows_written = 0
-
-                    # 1. Escrever a Tabela de Resumo (pivot_df), se existir
-                    if pivot_df is not None:
-                        self.log_message.emit("Escrevendo aba 'Tabela_Resumo'...", LogLevel.INFO)
-                        worksheet_pivot = workbook.add_worksheet("Tabela_Resumo")
-                        worksheet_pivot.freeze_panes('A2')
-                        worksheet_pivot.set_zoom(70)
-                        worksheet_pivot.hide_gridlines(2)
-                        
-                        group_by_cols = self.pivot_rules.get('group_by', [])
-                        for col_idx, col_name in enumerate(pivot_df.columns):
-                            fmt = group_by_header_format if col_name in group_by_cols else header_format
-                            worksheet_pivot.write(0, col_idx, col_name, fmt)
-                        
-                        max_lengths_pivot = {col: max(len(str(col)), pivot_df.select(pl.col(col).cast(pl.String).str.len_chars().max()).item() or 1) for col in pivot_df.columns}
-                        for col_idx, col_name in enumerate(pivot_df.columns):
-                            width = min(max_lengths_pivot.get(col_name, len(col_name)) + 2, 60)
-                            worksheet_pivot.set_column(col_idx, col_idx, width, data_format)
-                        
-                        for r_idx, row_tuple in enumerate(pivot_df.iter_rows(), start=1):
-                            worksheet_pivot.write_row(r_idx, 0, row_tuple)
-                            total_rows_written += 1
-                    if not only_pivot:
-                        # 2. Escrever os Dados Consolidados 
-                        self.log_message.emit("Escrevendo aba(s) de 'Dados_Consolidados'...", LogLevel.INFO)
-                        max_rows_per_sheet = 1_048_570
-                        dfs_to_write = []
-                        if consolidated_df.height > max_rows_per_sheet:
-                            num_chunks = (consolidated_df.height + max_rows_per_sheet - 1) // max_rows_per_sheet
-                            for i in range(num_chunks):
-                                df_chunk = consolidated_df.slice(i * max_rows_per_sheet, max_rows_per_sheet)
-                                dfs_to_write.append((f"Dados_Consolidados_{i+1}", df_chunk))
-                        else:
-                            dfs_to_write.append(("Dados_Consolidados", consolidated_df))
-
-                        max_lengths_consolidated = {col: max(len(str(col)), consolidated_df.select(pl.col(col).cast(pl.String).str.len_chars().max()).item() or 1) for col in consolidated_df.columns}
-                        if removed_duplicates_df is not None and not removed_duplicates_df.is_empty():
-                            self.log_message.emit("Escrevendo aba 'Duplicatas_Removidas'...", LogLevel.INFO)
-                            duplicates_header_format = workbook.add_format({'font_name': 'Aptos', 'bold': True, 'font_color': 'white', 'bg_color': '#C00000', 'border': 1, 'align': 'center', 'valign': 'vcenter'}) # Cabeçalho vermelho
-
-                            # A lógica de chunking é importante aqui também
-                            max_rows_per_sheet = 1_048_570
-                            duplicates_to_write = []
-                            if removed_duplicates_df.height > max_rows_per_sheet:
-                                num_chunks = (removed_duplicates_df.height + max_rows_per_sheet - 1) // max_rows_per_sheet
-                                for i in range(num_chunks):
-                                    duplicates_to_write.append((f"Duplicatas_Removidas_{i+1}", removed_duplicates_df.slice(i * max_rows_per_sheet, max_rows_per_sheet)))
-                            else:
-                                duplicates_to_write.append(("Duplicatas_Removidas", removed_duplicates_df))
-                            
-                            max_lengths_duplicates = {col: max(len(str(col)), removed_duplicates_df.select(pl.col(col).cast(pl.String).str.len_chars().max()).item() or 1) for col in removed_duplicates_df.columns}
-
-                            for sheet_name, df_chunk in duplicates_to_write:
-                                worksheet = workbook.add_worksheet(sheet_name)
-                                worksheet.freeze_panes('A2')
-                                worksheet.set_zoom(70)
-                                worksheet.hide_gridlines(2)
-                                worksheet.write_row('A1', df_chunk.columns, duplicates_header_format)
-                                worksheet.autofilter(0, 0, df_chunk.height, df_chunk.width - 1)
-                                for col_idx, col_name in enumerate(df_chunk.columns):
-                                    worksheet.set_column(col_idx, col_idx, min(max_lengths_duplicates.get(col_name, len(col_name)) + 2, 60), data_format)
-                                for r_idx, row_tuple in enumerate(df_chunk.iter_rows(), start=1):
-                                    worksheet.write_row(r_idx, 0, row_tuple)
-                                    total_rows_written += 1
-                                    if total_rows_written % 5000 == 0:
-                                        self.progress_text_updated.emit(f"Escrevendo linha {total_rows_written:,} de {total_rows_to_write:,}...")
-                                
-                            
-                            # max_lengths_duplicates = {col: max(len(str(col)), removed_duplicates_df.select(pl.col(col).cast(pl.String).str.len_chars().max()).item() or 1) for col in removed_duplicates_df.columns}
-                        for sheet_name, df_chunk in dfs_to_write:
-                            worksheet = workbook.add_worksheet(sheet_name)
-                            worksheet.freeze_panes('A2')
-                            worksheet.set_zoom(70)
-                            worksheet.hide_gridlines(2)
-                            worksheet.write_row('A1', df_chunk.columns, header_format)
-                            worksheet.autofilter(0, 0, df_chunk.height, df_chunk.width - 1)
-                            for col_idx, col_name in enumerate(df_chunk.columns):
-                                width = min(max_lengths_consolidated.get(col_name, len(col_name)) + 2, 60)
-                                worksheet.set_column(col_idx, col_idx, width, data_format)
-                            
-                            for r_idx, row_tuple in enumerate(df_chunk.iter_rows(), start=1):
-                                worksheet.write_row(r_idx, 0, row_tuple)
-                                total_rows_written += 1
-                                if total_rows_written % 5000 == 0:
-                                    self.progress_text_updated.emit(f"Escrevendo linha {total_rows_written:,} de {total_rows_to_write:,}...")
-                        
-                        self.progress_text_updated.emit(f"Finalizando escrita de {total_rows_to_write:,} linhas...")
-                    workbook.close()
-
-                except Exception as e_save_excel:
-                    self.log_message.emit(f"Erro ao salvar arquivo Excel com XlsxWriter: {e_save_excel}", LogLevel.ERROR)
-                    self.finished.emit(False, f"Erro ao salvar Excel: {e_save_excel}")
-                    return
-
-            elif self.output_format in ["CSV", "Parquet"]:
+            harmonization_plans = [plan for _, plan in harmonization_checks]
+            consolidated_df, removed_duplicates_df, pivot_df, extra_results = self._execute_plans(consolidated_lf, removed_duplicates_lf, pivot_lf, harmonization_plans + key_index_plans)
+            self.cancel_token.raise_if_cancelled()
+            self._report_harmonization_losses(harmonization_checks, extra_results[:len(harmonization_plans)])
+            key_index_results = extra_results[len(harmonization_plans):]
+            new_keys = None
+            if key_index is not None:
+                new_keys = key_index_results[0].to_series()
+                delivered_rows = key_index_results[1].item() if len(key_index_results) > 1 else 0
+                if delivered_rows:
+                    self.log_message.emit(f"{delivered_rows:,} linha(s) com chaves já entregues em execuções anteriores foram descartadas.", LogLevel.INFO)
+                else:
+                    self.log_message.emit("Nenhuma linha desta execução havia sido entregue anteriormente.", LogLevel.INFO)
+        except InterruptedError:
+            raise
+        except Exception as e:
+             self.log_message.emit(f"Erro concatenação final: {e}", LogLevel.ERROR)
+             self.finished.emit(False, f"Erro concatenação: {e}"); return
+
+        self.log_message.emit(f"Salvando: {self.output_path}", LogLevel.INFO)
+        saved_paths = [self.output_path]
+        # As linhas consolidadas só são gravadas no XLSX, no modo multi-saída ou quando não há resumo
+        consolidated_written = consolidated_df is not None and (self.output_format == "XLSX" or bool(self.output_options.get("multi_output")) or pivot_df is None)
+
+        if self.output_format == "XLSX":
+            try:
+                with AtomicOutputPath(self.output_path) as temp_path:
+                    self._write_xlsx(temp_path, consolidated_df, pivot_df, removed_duplicates_df)
+            except InterruptedError:
+                raise
+            except Exception as e_save_excel:
+                self.log_message.emit(f"Erro ao salvar arquivo Excel com XlsxWriter: {e_save_excel}", LogLevel.ERROR)
+                self.finished.emit(False, f"Erro ao salvar Excel: {e_save_excel}")
+                return
+
+        elif self.output_format in ["CSV", "Parquet", "Parquet (Dataset)", "Arrow IPC"]:
+            if self.output_options.get("multi_output"):
+                # Cada resultado em seu próprio arquivo, todos vindos da mesma execução dos planos
+                outputs = [("Dados consolidados", consolidated_df, self.output_path)]
+                if pivot_df is not None:
+                    outputs.append(("Tabela de Resumo", pivot_df, _sibling_output_path(self.output_path, "_resumo")))
+                if removed_duplicates_df is not None and _frame_height(removed_duplicates_df) > 0:
+                    outputs.append(("Duplicatas removidas", removed_duplicates_df, _sibling_output_path(self.output_path, "_duplicatas")))
+                saved_paths = []
+                for label, frame, path in outputs:
+                    if frame is None:
+                        continue
+                    self.log_message.emit(f"Salvando {label} em {self.output_format}: {path}", LogLevel.INFO)
+                    # Só os dados consolidados são divididos em partes; resumo e duplicatas ficam em um arquivo
+                    saved_paths += self._write_tabular(frame, path, split_parts=path == self.output_path)
+            else:
                 df_to_save = pivot_df if pivot_df is not None else consolidated_df
                 if pivot_df is not None:
                     self.log_message.emit(f"Salvando resultado da Tabela de Resumo em {self.output_format}.", LogLevel.INFO)
-                
-                if self.output_format == "CSV":
-                    df_to_save.write_csv(self.output_path, separator='|')
-                elif self.output_format == "Parquet":
-                    df_to_save.write_parquet(self.output_path, compression='zstd')
+                saved_paths = self._write_tabular(df_to_save, self.output_path, split_parts=pivot_df is None)
+            self._write_quality_report()
 
-            self.progress_updated.emit(100)
-            self.log_message.emit(f"Concluído! Salvo em: {self.output_path}", LogLevel.SUCCESS)
-            self.finished.emit(True, f"Salvo em: {self.output_path}")
+        if key_index is not None and not consolidated_written:
+            self.log_message.emit("Índice persistente de chaves não atualizado: as linhas consolidadas não foram gravadas nesta execução (apenas a Tabela de Resumo).", LogLevel.INFO)
+        elif key_index is not None:
+            try:
+                added_keys = key_index.commit(new_keys)
+                self.log_message.emit(f"Índice persistente de chaves atualizado: {added_keys:,} chave(s) nova(s), {key_index.total_keys:,} no total. Em: {key_index.index_dir}", LogLevel.INFO)
+            except Exception as e_index:
+                self.log_message.emit(f"A saída foi salva, mas o índice persistente de chaves não pôde ser atualizado: {e_index}", LogLevel.WARNING)
+        if result_store is not None:
+            result_store.commit()
+            cache_label = "Agregados parciais do resumo" if partial_pivot_mode else "Fontes processadas"
+            self.log_message.emit(f"{cache_label}: {result_store.reused} fonte(s) reaproveitada(s), {result_store.recomputed} recalculada(s). Cache em: {result_store.store_dir}", LogLevel.INFO)
+        if self.spill.has_spilled:
+            self.log_message.emit(f"Resumo do despejo em disco: {self.spill.summary()}.", LogLevel.INFO)
+        self.progress_updated.emit(100)
+        self.log_message.emit(f"Concluído! Salvo em: {', '.join(saved_paths)}", LogLevel.SUCCESS)
+        self.finished.emit(True, f"Salvo em: {', '.join(saved_paths)}")
+
+    def _skip_identical_inputs(self):
+        """
+        Remove da lista de entrada os arquivos com conteúdo idêntico ao de outro arquivo da
+        lista (ex.: a mesma exportação salva duas vezes). De uma pasta de trabalho repetida
+        continuam sendo lidas apenas as abas que não foram selecionadas no arquivo mantido.
+        """
+        self.progress_text_updated.emit("Verificando arquivos de entrada idênticos...")
+        cache = FileFingerprintCache(self.fingerprint_cache_path) if self.fingerprint_cache_path else None
+        duplicates = find_duplicate_files([file_path for file_path, _ in self.files_to_process], cache, self.cancel_token)
+        if cache is not None:
+            try:
+                cache.save()
+            except OSError as e_cache:
+                self.log_message.emit(f"Não foi possível gravar o cache de impressões digitais dos arquivos: {e_cache}", LogLevel.WARNING)
+        if not duplicates:
+            return
 
+        selections = dict(self.files_to_process)
+        remaining_files = []
+        skipped_files = 0
+        for file_path, selected_sheets in self.files_to_process:
+            kept_path = duplicates.get(file_path)
+            if kept_path is None:
+                remaining_files.append((file_path, selected_sheets))
+                continue
+            kept_sheets = selections[kept_path]
+            extra_sheets = [sheet for sheet in (selected_sheets or []) if sheet not in (kept_sheets or [])]
+            if extra_sheets:
+                self.log_message.emit(f"Arquivo '{os.path.basename(file_path)}' tem conteúdo idêntico a '{os.path.basename(kept_path)}'; apenas as abas não selecionadas lá serão lidas: {', '.join(extra_sheets)}.", LogLevel.WARNING)
+                remaining_files.append((file_path, extra_sheets))
+                continue
+            self.log_message.emit(f"Arquivo '{os.path.basename(file_path)}' ignorado: conteúdo idêntico a '{os.path.basename(kept_path)}'.", LogLevel.WARNING)
+            skipped_files += 1
+        self.files_to_process = remaining_files
+        if skipped_files:
+            self.log_message.emit(f"{skipped_files} arquivo(s) idêntico(s) a outros da lista não será(ão) processado(s).", LogLevel.INFO)
+
+    def _execute_plans(self, consolidated_lf, removed_duplicates_lf, pivot_lf, extra_plans=()):
+        """
+        Executa os planos lazy de dados consolidados, duplicatas removidas e resumo, e os
+        `extra_plans` (ex.: chaves novas para o índice persistente), que entram na mesma
+        execução para aproveitar as etapas em comum e voltam como lista de DataFrames.
+
+        Sem fragmentos em disco, os três são coletados juntos (collect_all), compartilhando
+        a concatenação e a deduplicação. Se houve despejo, tudo roda numa única execução no
+        motor de streaming: o resumo e os planos extras são coletados e os demais são gravados
+        em Parquets temporários, devolvidos como LazyFrames que os escritores percorrem em
+        blocos. Quando só o resumo será gravado, apenas ele e os planos extras são executados
+        (no motor de streaming) e os dados consolidados retornam None.
+        Numa exportação CSV em arquivo único só com os dados consolidados (sem resumo nem
+        remoção de duplicatas), o plano volta sem executar e é escrito bloco a bloco; nos
+        demais casos o CSV é gravado a partir do resultado já coletado.
+        """
+        plans = [lf for lf in (consolidated_lf, removed_duplicates_lf, pivot_lf) if lf is not None]
+        rows_after = None
+        if pivot_lf is not None and not self._needs_consolidated_output():
+            self.log_message.emit("Calculando somente a Tabela de Resumo (streaming, sem materializar os dados consolidados)...", LogLevel.INFO)
+            count_rows = consolidated_lf is not None and self.duplicates_config.get("key_columns")
+            plans = [pivot_lf]
+            if count_rows:
+                plans.append(consolidated_lf.select(pl.len())) # Apenas a contagem, para o log de duplicatas
+            results = iter(pl.collect_all(plans + list(extra_plans), engine='streaming'))
+            consolidated, removed_duplicates, pivot_df = None, None, next(results)
+            if count_rows:
+                rows_after = next(results).item()
+            extra_results = list(results)
+        elif self._streams_csv_output(consolidated_lf, removed_duplicates_lf, pivot_lf, extra_plans):
+            self.log_message.emit("Os dados consolidados serão gravados no CSV em blocos, sem materializar o resultado inteiro.", LogLevel.INFO)
+            consolidated, removed_duplicates, pivot_df, extra_results = consolidated_lf, None, None, []
+        elif not self.spill.has_spilled:
+            results = iter(pl.collect_all(plans + list(extra_plans)))
+            consolidated = next(results)
+            removed_duplicates = next(results) if removed_duplicates_lf is not None else None
+            pivot_df = next(results) if pivot_lf is not None else None
+            extra_results = list(results)
+        else:
+            self.log_message.emit("Executando as etapas finais sobre os fragmentos em disco (streaming)...", LogLevel.INFO)
+            named_plans = [(consolidated_lf, "consolidado")]
+            if removed_duplicates_lf is not None:
+                named_plans.append((removed_duplicates_lf, "duplicatas"))
+            collected_plans = ([pivot_lf] if pivot_lf is not None else []) + list(extra_plans)
+            materialized, collected = self.spill.materialize(named_plans, collected_plans)
+            consolidated = materialized[0]
+            removed_duplicates = materialized[1] if removed_duplicates_lf is not None else None
+            pivot_df = collected[0] if pivot_lf is not None else None
+            extra_results = collected[1:] if pivot_lf is not None else collected
+
+        if self.duplicates_config.get("key_columns") and (consolidated is not None or rows_after is not None):
+            rows_before = self.spill.total_rows
+            rows_after = _frame_height(consolidated) if consolidated is not None else rows_after
+            self.log_message.emit(f"{rows_before - rows_after} linhas duplicadas foram removidas. Linhas restantes: {rows_after}", LogLevel.SUCCESS)
+            if removed_duplicates is not None and _frame_height(removed_duplicates) > 0:
+                self.log_message.emit(f"Uma aba com as {rows_before - rows_after} linhas removidas será gerada.", LogLevel.INFO)
+        if pivot_df is not None:
+            self.log_message.emit("Tabela de resumo criada com sucesso.", LogLevel.SUCCESS)
+        return consolidated, removed_duplicates, pivot_df, extra_results
+
+    def _read_workbook_sheets(self, file_path, sheet_names):
+        """
+        Lê todas as abas selecionadas de uma pasta de trabalho em uma única passada.
+        Se a leitura conjunta falhar (ex.: uma aba corrompida), retorna um dicionário
+        vazio e cada aba é lida individualmente, para que o erro fique restrito a ela.
+        Se todas as abas têm o cabeçalho conhecido pela análise, só as colunas usadas
+        pelo mapeamento em alguma delas são convertidas.
+        """
+        columns = self._plan_workbook_reads(file_path, sheet_names)
+        try:
+            return read_excel_sheets_raw(file_path, sheet_names, self.cancel_token, columns=columns)
+        except InterruptedError:
+            raise
         except Exception as e:
-            self.log_message.emit(f"Erro inesperado consolidação: {e}", LogLevel.ERROR)
-            self.finished.emit(False, f"Erro: {e}")
+            for sheet_name in sheet_names:
+                self.read_plans.pop((file_path, sheet_name), None)
+            self.log_message.emit(f"Não foi possível ler as abas de '{os.path.basename(file_path)}' em uma única passada ({e}). Lendo aba por aba.", LogLevel.WARNING)
+            return {}
+
+    def _plan_workbook_reads(self, file_path, sheet_names):
+        """
+        Colunas (índices) a ler de todas as abas, ou None para ler todas. A leitura conjunta
+        usa uma única projeção: a união das colunas usadas, desde que exista em todas as abas.
+        """
+        plans = {sheet: self._plan_source_read(file_path, sheet, self._catalog_source_header(file_path, sheet), with_row_filter=False)
+                 for sheet in sheet_names}
+        if not plans or any(plan is None for plan in plans.values()):
+            return None
+        columns = sorted(set().union(*(plan["columns"] for plan in plans.values())))
+        if columns[-1] >= min(plan["width"] for plan in plans.values()):
+            return None
+        for sheet, plan in plans.items():
+            plan["columns"] = columns
+            self.read_plans[(file_path, sheet)] = plan
+        return columns
+
+    def _read_source_raw(self, file_path, sheet_name, use_plan=True):
+        """
+        Lê uma fonte inteira como dados brutos, sem cabeçalho (arquivos IPC já vêm com
+        cabeçalho e tipos). Com o cabeçalho conhecido antes da leitura (pela análise ou,
+        em CSV/TXT, pelas primeiras linhas), só as colunas usadas pelo mapeamento são
+        lidas e, em CSV/TXT, os filtros antecipáveis descartam as linhas durante a leitura.
+        """
+        lower = file_path.lower()
+        if is_ipc_file(file_path):
+            return read_ipc_source(file_path, self.cancel_token, columns=self._ipc_columns(file_path) if use_plan else None)
+        is_text = lower.endswith((".csv", ".txt"))
+        if not is_text and not lower.endswith((".xlsx", ".xls")):
+            return None
+        plan = None
+        if use_plan and (self.header_mapping or self.header_rules or (is_text and self.filter_rules)):
+            header = self._catalog_source_header(file_path, sheet_name)
+            if header is None and is_text:
+                header = self._preread_header(file_path)
+            plan = self._plan_source_read(file_path, sheet_name, header, with_row_filter=is_text)
+        if plan is not None:
+            self.read_plans[(file_path, sheet_name)] = plan
+        columns = plan["columns"] if plan is not None else None
+        if is_text:
+            row_filter = plan["row_filter"] if plan is not None else None
+            return read_csv_raw(file_path, self.delimiter, self.cancel_token, utf8_cache=self.utf8_cache, row_filter=row_filter, columns=columns)
+        return read_excel_raw(file_path, sheet_name, self.cancel_token, columns=columns)
+
+    def _ipc_columns(self, file_path):
+        """Colunas de um arquivo IPC usadas pelo mapeamento, ou None para ler todas."""
+        if not (self.header_mapping or self.header_rules) or is_virtual_source(file_path):
+            return None
+        names = list(pl.read_ipc_schema(file_path))
+        final_name_to_source = self._map_source_columns(file_path, None, names)
+        needed = {col for cols in final_name_to_source.values() for col in cols}
+        columns = [name for name in names if name in needed]
+        return columns if columns and len(columns) < len(names) else None
+
+    @staticmethod
+    def _detect_header(pre_read_df):
+        """(linha_do_cabeçalho, nomes únicos) detectados nas primeiras linhas de uma fonte bruta."""
+        header_row_index = _find_header_row_index(pre_read_df, N_PREREAD_ROWS)
+        header_names_raw = [str(h) if h is not None else f"column_{i}" for i, h in enumerate(pre_read_df.row(header_row_index))]
+        return header_row_index, _make_headers_unique(header_names_raw)
+
+    def _preread_header(self, file_path):
+        """Cabeçalho de um CSV/TXT detectado lendo só as primeiras linhas (None se vazio)."""
+        pre_read_df = read_csv_raw(file_path, self.delimiter, self.cancel_token, n_rows=N_PREREAD_ROWS)
+        if pre_read_df.is_empty():
+            return None
+        return self._detect_header(pre_read_df) + (False,)
+
+    def _catalog_source_header(self, file_path, sheet_name):
+        """(linha_do_cabeçalho, nomes, True) do catálogo da análise, se a fonte não mudou desde então; senão None."""
+        entry = self.source_catalog.get((file_path, sheet_name))
+        if not entry or not entry.get("columns") or is_ipc_file(file_path):
+            return None
+        try:
+            if not HeaderProfileCache.entry_matches(entry, file_path, source_stat(file_path), self.delimiter):
+                return None
+        except OSError:
+            return None
+        return entry["header_row_index"], [column["name"] for column in entry["columns"]], True
+
+    def _plan_source_read(self, file_path, sheet_name, header, with_row_filter=True):
+        """
+        Plano de leitura de uma fonte com cabeçalho (linha, nomes, veio_do_catálogo) já
+        conhecido: índices das colunas brutas usadas pelo mapeamento ("columns", None =
+        todas) e o RowFilter com os filtros antecipáveis reescritos sobre as colunas brutas.
+        None se não houver o que antecipar (a fonte é lida inteira, como sempre).
+        """
+        if header is None:
+            return None
+        header_row_index, header_names, from_catalog = header
+        final_name_to_source = self._map_source_columns(file_path, sheet_name, header_names)
+        needed = {col for cols in final_name_to_source.values() for col in cols}
+        columns = [i for i, name in enumerate(header_names) if name in needed]
+        if not columns or len(columns) == len(header_names):
+            columns = None # Nada ou tudo mapeado: lê todas (a fonte sem colunas mapeadas é pulada com o aviso de sempre)
+        row_filter = None
+        if with_row_filter and self.filter_rules:
+            raw_names = {name: raw_column_name(i) for i, name in enumerate(header_names)}
+            predicate, _ = self._source_filter(final_name_to_source, {raw: pl.String for raw in raw_names.values()}, raw_names)
+            if predicate is not None:
+                row_filter = RowFilter(predicate, keep_first_rows=header_row_index + 1)
+        if columns is None and row_filter is None:
+            return None
+        return {"header_row_index": header_row_index, "header_names": header_names, "width": len(header_names),
+                "from_catalog": from_catalog, "columns": columns, "row_filter": row_filter}
+
+    def _map_source_columns(self, file_path, sheet_name, columns):
+        """
+        Agrupa as colunas de origem por nome final ({nome_final: [colunas de origem]}),
+        pelo mapeamento da fonte ou, para fontes fora da análise, pelas regras por nome.
+        Sem mapeamento, cada coluna é mapeada para ela mesma.
+        """
+        if not (self.header_mapping or self.header_rules):
+            return {column: [column] for column in columns}
+        use_name_rules = (file_path, sheet_name) not in self.mapped_sources
+        final_name_to_source = defaultdict(list)
+        for original_col_name in columns:
+            if use_name_rules:
+                mapping_info = self.header_rules.match(original_col_name)
+            else:
+                mapping_info = self.header_mapping.get((original_col_name, file_path, sheet_name))
+            if mapping_info and mapping_info.get("include", False):
+                final_name_to_source[mapping_info.get("final_name")].append(original_col_name)
+        return final_name_to_source
+
+    def _source_filter(self, final_name_to_source, source_schema, source_names=None):
+        """
+        Predicado com as regras de filtro que podem ser avaliadas sobre as colunas de
+        origem, antes da seleção e da tipagem: as de colunas finais de texto
+        (Automático/String) cujas colunas de origem também são texto. Retorna
+        (predicado ou None, {colunas finais filtradas}). `source_names` renomeia as
+        colunas de origem (ex.: para os nomes brutos "column_1"... da leitura).
+        """
+        source_names = source_names or {}
+        filtered_columns = {rule.get("column") for rule in self.filter_rules}
+        column_exprs = {}
+        for final_name, source_cols in final_name_to_source.items():
+            type_str = self.final_name_to_type_str.get(final_name)
+            if final_name not in filtered_columns or (type_str and type_str != DATA_TYPES_OPTIONS[0]):
+                continue
+            raw_cols = [source_names.get(col, col) for col in source_cols]
+            if not raw_cols or any(source_schema.get(col) != pl.String for col in raw_cols):
+                continue
+            column_exprs[final_name] = pl.coalesce(raw_cols) if len(raw_cols) > 1 else pl.col(raw_cols[0])
+        if not column_exprs:
+            return None, set()
+        expressions = self._build_filter_expressions({name: pl.String for name in column_exprs}, column_exprs)
+        if not expressions:
+            return None, set()
+        return pl.all_horizontal(expressions) if len(expressions) > 1 else expressions[0], set(column_exprs)
+
+    def _catalog_header(self, file_path, sheet_name, df_raw_data):
+        """
+        (linha_do_cabeçalho, nomes) vindos do catálogo da análise, se a fonte não mudou desde
+        então e a largura lida bate com a analisada; senão None (o cabeçalho é detectado).
+        """
+        header = self._catalog_source_header(file_path, sheet_name) if df_raw_data is not None else None
+        if header is None or len(header[1]) != df_raw_data.width:
+            return None
+        self.catalog_hits += 1
+        return header[0], header[1]
+
+    def _process_source(self, file_path, sheet_name, current_item_description, df_raw_data):
+        """Detecta o cabeçalho, mapeia, tipa e filtra uma fonte já lida. Retorna None se a fonte deve ser pulada."""
+        # ETAPA 1: Detecção do Cabeçalho nas primeiras linhas dos dados brutos
+        header_row_index = 0
+        header_names = []
+
+        # Fontes lidas com um plano (só as colunas usadas / filtradas na leitura) já têm o cabeçalho
+        plan = self.read_plans.pop((file_path, sheet_name), None)
+        if plan is not None and df_raw_data is not None and not df_raw_data.is_empty():
+            if df_raw_data.width != (len(plan["columns"]) if plan["columns"] else plan["width"]):
+                self.log_message.emit(f"O cabeçalho de {current_item_description} não confere com o previsto para a leitura; lendo a fonte novamente, inteira.", LogLevel.WARNING)
+                plan = None
+                df_raw_data = self._read_source_raw(file_path, sheet_name, use_plan=False)
+        row_filter = plan["row_filter"] if plan is not None else None
+        if plan is not None:
+            header_row_index, header_names = plan["header_row_index"], plan["header_names"]
+            if plan["from_catalog"]:
+                self.catalog_hits += 1
+        else:
+            catalog_columns = self._catalog_header(file_path, sheet_name, df_raw_data)
+            if catalog_columns is not None:
+                header_row_index, header_names = catalog_columns
+            elif df_raw_data is not None and not df_raw_data.is_empty() and not is_ipc_file(file_path):
+                header_row_index, header_names = self._detect_header(df_raw_data.head(N_PREREAD_ROWS))
+
+        df_original = None
+
+        if is_ipc_file(file_path):
+            # Arrow IPC já tem nomes de colunas e tipos: não há cabeçalho a detectar
+            df_original = df_raw_data
+        elif df_raw_data is not None and not df_raw_data.is_empty():
+            # Fatiar o DataFrame para remover lixo + linha do cabeçalho
+            df_data_only = df_raw_data.slice(offset=header_row_index + 1)
+
+            if not df_data_only.is_empty():
+                # Renomear as colunas com os nomes que detectamos
+                if plan is not None and plan["columns"]:
+                    rename_mapping = {raw_column_name(i): header_names[i] for i in plan["columns"]}
+                else:
+                    rename_mapping = {old_name: new_name for old_name, new_name in zip(df_data_only.columns, header_names)}
+                df_original = df_data_only.rename(rename_mapping)
+
+        if row_filter is not None and (df_original is None or df_original.is_empty()):
+            self.log_message.emit(f"Filtro antecipado (durante a leitura) em {current_item_description}: nenhuma de {row_filter.rows_scanned - (header_row_index + 1):,} linhas lidas mantida.", LogLevel.INFO)
+            return None
+        if df_original is None or df_original.is_empty():
+            self.log_message.emit(f"Dados vazios ou erro ao ler {current_item_description}. Pulando.", LogLevel.WARNING)
+            return None
+
+        # --- 1. Aplicar Mapeamento de Nomes e Filtro de Colunas (com Coalesce) ---
+        final_name_to_source = self._map_source_columns(file_path, sheet_name, df_original.columns)
+        # Filtros de colunas de texto são avaliados sobre as colunas de origem, antes da seleção
+        # e da tipagem (ou já na leitura, se houve RowFilter); só as linhas mantidas são convertidas
+        pushed_predicate, pushed_columns = self._source_filter(final_name_to_source, df_original.schema) if self.filter_rules else (None, set())
+        rows_scanned = df_original.height
+        if row_filter is not None:
+            rows_scanned = row_filter.rows_scanned - (header_row_index + 1)
+            pushed_predicate = None # Já aplicado durante a leitura
+
+        df_intermediate = df_original
+        if self.header_mapping or self.header_rules:
+            use_name_rules = (file_path, sheet_name) not in self.mapped_sources
+            if use_name_rules and self.header_mapping:
+                self.log_message.emit(f"{current_item_description} não fazia parte da análise de cabeçalhos; aplicando o mapeamento pelo nome das colunas.", LogLevel.INFO)
+
+            # 2. Construir as expressões de seleção usando coalesce quando necessário
+            select_expressions = []
+            for final_name, original_cols_list in final_name_to_source.items():
+                # Se apenas uma coluna de origem existe, faz um alias simples.
+                # Se mais de uma, usa coalesce para combinar os dados.
+                if not original_cols_list:
+                    continue
+                self.log_message.emit(f"Combinando colunas {original_cols_list} em '{final_name}' para {current_item_description}", LogLevel.INFO)
+                if len(original_cols_list) > 1:
+                    expr = pl.coalesce(original_cols_list).alias(final_name)
+                else:
+                    expr = pl.col(original_cols_list[0]).alias(final_name)
+
+                select_expressions.append(expr)
+
+            # Se, após o mapeamento, não sobrar nenhuma expressão, pular o arquivo/aba
+            if not select_expressions:
+                self.log_message.emit(f"Nenhuma coluna do arquivo {current_item_description} corresponde ao mapeamento. Pulando.", LogLevel.WARNING)
+                return None
+
+            # 3. Executar a seleção no DataFrame (com o filtro antecipado antes dela)
+            lf_intermediate = df_original.lazy()
+            if pushed_predicate is not None:
+                lf_intermediate = lf_intermediate.filter(pushed_predicate)
+            df_intermediate = lf_intermediate.select(select_expressions).collect()
+        elif pushed_predicate is not None:
+            df_intermediate = df_original.filter(pushed_predicate)
+
+        if pushed_columns:
+            where = "durante a leitura" if row_filter is not None else "antes da tipagem"
+            self.log_message.emit(f"Filtro antecipado ({where}) em {current_item_description} nas colunas {sorted(pushed_columns)}: {df_intermediate.height:,} de {rows_scanned:,} linhas lidas mantidas.", LogLevel.INFO)
+
+        if df_intermediate.width == 0:
+            self.log_message.emit(f"Nenhuma coluna restante em {current_item_description} após mapeamento de nomes. Pulando.", LogLevel.WARNING)
+            return None
+
+        # --- 2. Aplicar Tipagem Especificada pelo Usuário ---
+        df_typed = df_intermediate
+        if self.final_name_to_type_str:
+            for final_col_name in df_typed.columns:
+                type_str = self.final_name_to_type_str.get(final_col_name)
+                if type_str and type_str != DATA_TYPES_OPTIONS[0] and type_str in TYPE_STRING_TO_POLARS:
+                    self.log_message.emit(f"Convertendo coluna '{final_col_name}' para {type_str} em {current_item_description}", LogLevel.INFO)
+            df_typed, failures = self.type_parser.parse(df_typed, self.final_name_to_type_str)
+            for final_col_name, decimal_comma in self.type_parser.changed_separators.items():
+                self.log_message.emit(f"Coluna '{final_col_name}' em {current_item_description}: separador decimal {'vírgula' if decimal_comma else 'ponto'}, diferente da fonte anterior.", LogLevel.INFO)
+            for final_col_name, failure in failures.items():
+                self.parse_failures[final_col_name] += failure["count"]
+                self.log_message.emit(f"{failure['count']} valor(es) da coluna '{final_col_name}' não puderam ser convertidos para {self.final_name_to_type_str[final_col_name]} em {current_item_description} e ficaram em branco. Exemplos: {', '.join(repr(v) for v in failure['samples'])}", LogLevel.WARNING)
+                self._record_quality(self._origin_name(file_path, sheet_name), final_col_name, "Tipagem", self.final_name_to_type_str[final_col_name], failure)
+
+        # --- 4. Aplicar Filtros (com lógica hierárquica E/OU) ---
+        df_filtered = df_typed
+        if self.filter_rules:
+            remaining_schema = {name: dtype for name, dtype in df_filtered.schema.items() if name not in pushed_columns}
+            final_expressions_to_and = self._build_filter_expressions(remaining_schema)
+
+            # Aplicar os filtros finais combinados com E (AND)
+            if final_expressions_to_and:
+                rows_before = df_filtered.height
+                df_filtered = df_filtered.filter(final_expressions_to_and)
+                rows_after = df_filtered.height
+                self.log_message.emit(f"Filtro aplicado em {current_item_description}. Linhas restantes: {rows_after} de {rows_before}.", LogLevel.INFO)
+
+        # --- 3. Adicionar Coluna de Origem ---
+        source_name = self._origin_name(file_path, sheet_name)
+
+        df_with_origin = df_filtered.with_columns(
+            pl.lit(source_name).alias("Origem")
+        )
+
+        # --- 5. Codificar "Origem" e colunas de texto de baixa cardinalidade em dicionário ---
+        df_encoded, encoded_columns = encode_low_cardinality(df_with_origin)
+        low_cardinality = [c for c in encoded_columns if c != "Origem"]
+        if low_cardinality:
+            self.log_message.emit(f"Colunas de baixa cardinalidade codificadas como categóricas em {current_item_description}: {', '.join(low_cardinality)}", LogLevel.INFO)
+        return df_encoded
+
+    @staticmethod
+    def _origin_name(file_path, sheet_name):
+        """Valor da coluna "Origem" das linhas da fonte."""
+        file_name_only = source_display_name(file_path)
+        return f"{file_name_only} ({sheet_name})" if sheet_name else file_name_only
+
+    def _record_quality(self, origin, column, stage, target_type, failure):
+        """Acrescenta ao relatório de qualidade as perdas de uma coluna em uma fonte."""
+        if not isinstance(target_type, str):
+            target_type = next((name for name, dtype in TYPE_STRING_TO_POLARS.items() if dtype == target_type), str(target_type))
+        self.quality_report.append({
+            "Origem": origin,
+            "Coluna": column,
+            "Etapa": stage,
+            "Tipo de destino": target_type,
+            "Valores preenchidos": failure["inputs"],
+            "Valores perdidos": failure["count"],
+            "% perdido": round(100 * failure["count"] / failure["inputs"], 2) if failure["inputs"] else 0.0,
+            "Exemplos": "; ".join(failure["samples"]),
+        })
+
+    @staticmethod
+    def _filter_literal(value_str, col_type):
+        """Valor do filtro no tipo da coluna, lido com as mesmas regras das fontes ("1.234,56", "31/12/2024")."""
+        if col_type == pl.String:
+            return pl.lit(value_str)
+        return pl.lit(parse_literal(value_str, col_type), dtype=col_type)
+
+    @staticmethod
+    def _filter_value_set(values, col_type):
+        """Lista de valores do filtro convertida para o tipo da coluna, sem nulos e sem repetições."""
+        if col_type == pl.String:
+            return pl.Series(values, dtype=pl.String).unique()
+        return parse_literals(values, col_type).drop_nulls().unique()
+
+    def _build_filter_expressions(self, df_schema, column_exprs=None):
+        """
+        Constrói as expressões de filtro (OU na mesma coluna, E entre colunas) para o esquema
+        informado. `column_exprs` ({coluna: expressão}) substitui `pl.col(coluna)`, para
+        avaliar as regras sobre as colunas de origem.
+        """
+        column_exprs = column_exprs or {}
+        # Definir quais operadores são para exclusão
+        EXCLUSION_OPERATORS = {"Diferente de", "Não contém"}
+
+        grouped_rules = defaultdict(list)
+        for rule in self.filter_rules:
+            if rule.get("column"):
+                grouped_rules[rule["column"]].append(rule)
+
+        final_expressions_to_and = []
+
+        for col_name, rules_for_col in grouped_rules.items():
+            if col_name not in df_schema:
+                continue
+
+            inclusion_exprs = []
+            exclusion_exprs = []
+            equal_values = [] # Vários "Igual a" na mesma coluna viram uma única busca em conjunto (is_in)
+            col_type = df_schema[col_name]
+
+            # 1. Separar regras em Inclusão e Exclusão
+            for rule in rules_for_col:
+                operator = rule.get("operator")
+                value = rule.get("value") # Pega o valor (pode ser string ou lista)
+
+                target_list = exclusion_exprs if operator in EXCLUSION_OPERATORS else inclusion_exprs
+
+                # Adicionado para pular regras incompletas
+                if operator is None or value is None:
+                    continue
 
-    def stop(self): # stop() permanece o mesmo
-        self.is_running = False
+                try:
+                    polars_col = column_exprs.get(col_name, pl.col(col_name))
+                    expr = None
+
+                    if operator in OPERATORS_NO_VALUE:
+                        if operator == "Está em branco": expr = polars_col.is_null()
+                        elif operator == "Não está em branco": expr = polars_col.is_not_null()
+
+                    elif operator in OPERATORS_LIST_VALUE:
+                        values = split_value_list(value) if isinstance(value, str) else [str(v).strip() for v in value if str(v).strip()]
+                        if values and operator == "Está na lista":
+                            expr = polars_col.is_in(pl.lit(self._filter_value_set(values, col_type)).implode())
+                        elif values and col_type == pl.String: # "Contém algum de": busca de vários padrões (Aho-Corasick)
+                            expr = polars_col.str.contains_any(list(dict.fromkeys(values)))
+
+                    elif operator == "Entre":
+                        if isinstance(value, list) and len(value) == 2:
+                            min_val_str, max_val_str = value
+                            # Strip é aplicado aqui, onde sabemos que são strings
+                            if min_val_str.strip() and max_val_str.strip():
+                                lit_min = self._filter_literal(min_val_str.strip(), col_type)
+                                lit_max = self._filter_literal(max_val_str.strip(), col_type)
+                                expr = polars_col.is_between(lit_min, lit_max)
+
+                    # Garante que o valor é uma string antes de usar o .strip()
+                    elif isinstance(value, str) and value.strip():
+                        value_str = value.strip()
+                        if operator == "Igual a":
+                            equal_values.append(value_str)
+                            continue
+                        lit_val = self._filter_literal(value_str, col_type)
+
+                        if operator == "Diferente de": expr = (polars_col != lit_val)
+                        elif operator == "Maior que": expr = (polars_col > lit_val)
+                        elif operator == "Menor que": expr = (polars_col < lit_val)
+                        elif col_type == pl.String:
+                            if operator == "Contém": expr = polars_col.str.contains(value_str, literal=True)
+                            elif operator == "Não contém": expr = ~polars_col.str.contains(value_str, literal=True)
+                            elif operator == "Começa com": expr = polars_col.str.starts_with(value_str)
+                            elif operator == "Termina com": expr = polars_col.str.ends_with(value_str)
+
+                    if expr is not None:
+                        target_list.append(expr)
+
+                except Exception as e_filter:
+                    self.log_message.emit(f"Não foi possível aplicar a regra de filtro '{col_name} {operator} {value}': {e_filter}", LogLevel.WARNING)
+
+            polars_col = column_exprs.get(col_name, pl.col(col_name))
+            if len(equal_values) == 1:
+                inclusion_exprs.append(polars_col == self._filter_literal(equal_values[0], col_type))
+            elif equal_values:
+                inclusion_exprs.append(polars_col.is_in(pl.lit(self._filter_value_set(equal_values, col_type)).implode()))
+
+            # 2. Construir a expressão final para esta coluna
+            col_final_expr = None
+
+            # Combinar todas as expressões de inclusão com OU (OR)
+            final_inclusion_expr = pl.any_horizontal(inclusion_exprs) if len(inclusion_exprs) > 1 else (inclusion_exprs[0] if inclusion_exprs else None)
+
+            # Combinar todas as expressões de exclusão com E (AND)
+            final_exclusion_expr = pl.all_horizontal(exclusion_exprs) if len(exclusion_exprs) > 1 else (exclusion_exprs[0] if exclusion_exprs else None)
+
+            # Juntar inclusão e exclusão com E (AND)
+            if final_inclusion_expr is not None and final_exclusion_expr is not None:
+                col_final_expr = final_inclusion_expr & final_exclusion_expr
+            elif final_inclusion_expr is not None:
+                col_final_expr = final_inclusion_expr
+            elif final_exclusion_expr is not None:
+                col_final_expr = final_exclusion_expr
+
+            if col_final_expr is not None:
+                final_expressions_to_and.append(col_final_expr)
+
+        return final_expressions_to_and
+
+    def _harmonize_types(self, frames, schemas):
+        """
+        Harmoniza os tipos de cada coluna final entre todos os fragmentos processados.
+        Recebe os fragmentos como LazyFrames (em memória ou despejados em disco) e seus
+        esquemas, e retorna (LazyFrames com os casts aplicados, verificações de perda).
+        As verificações são pares ({coluna: tipo alvo}, plano de agregados por "Origem")
+        dos casts que podem anular valores; os planos compartilham o cast com o fragmento
+        harmonizado e devem ser executados junto com ele (ver `_report_harmonization_losses`).
+        """
+        self.log_message.emit("Harmonizando tipos (2ª passagem) entre arquivos processados...", LogLevel.INFO)
+
+        # 1. Coletar todos os tipos para cada nome de coluna final único
+        #    em todos os fragmentos processados.
+        column_all_types_globally = {} # {final_col_name: set_of_dtypes}
+        for schema in schemas:
+             for col_name, dtype in schema.items():
+                 if col_name not in column_all_types_globally:
+                     column_all_types_globally[col_name] = set()
+                 column_all_types_globally[col_name].add(dtype)
+
+        # 2. Determinar o tipo alvo para cada coluna globalmente
+        global_target_types = {} # {final_col_name: target_polars_type}
+        for final_col_name, dtypes_set in column_all_types_globally.items():
+            is_int_present = any(t.is_integer() for t in dtypes_set)
+            is_float_present = any(t.is_float() for t in dtypes_set)
+            is_string_present = any(t == pl.String or t == pl.Utf8 for t in dtypes_set)
+            is_categorical_present = any(t == pl.Categorical for t in dtypes_set)
+            is_temporal_present = any(t.is_temporal() for t in dtypes_set)
+            is_boolean_present = any(t == pl.Boolean for t in dtypes_set)
+            is_null_present = any(t == pl.Null for t in dtypes_set) # Null type
+
+            target_type_for_col = None
+
+            # Regra de Prioridade para determinar o tipo alvo:
+            if is_string_present: # Se String estiver presente, tudo vira String
+                target_type_for_col = pl.String
+                self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global String (devido à presença de String).", LogLevel.INFO)
+            elif is_categorical_present: # Categórica em todas as fontes: mantém o dicionário; com outros tipos, vira String
+                if all(t == pl.Categorical or t == pl.Null for t in dtypes_set):
+                    target_type_for_col = pl.Categorical
+                    self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global Categórico (baixa cardinalidade em todas as fontes).", LogLevel.INFO)
+                else:
+                    target_type_for_col = pl.String
+                    self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global String (conflito Categórico com outros tipos).", LogLevel.INFO)
+            elif is_temporal_present and (is_int_present or is_float_present or is_boolean_present): # Temporal com outros não-string -> String
+                target_type_for_col = pl.String
+                self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global String (conflito Temporal com Numérico/Booleano).", LogLevel.INFO)
+            elif is_boolean_present and (is_int_present or is_float_present): # Booleano com Numérico -> String
+                target_type_for_col = pl.String
+                self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global String (conflito Booleano com Numérico).", LogLevel.INFO)
+            elif is_float_present: # Se Float estiver presente (e não String), tudo vira Float
+                target_type_for_col = pl.Float64
+                self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global Decimal (Float) (devido à presença de Float ou Int+Float).", LogLevel.INFO)
+            elif is_int_present: # Se apenas Int (e talvez Null, Boolean que pode ser Int)
+                target_type_for_col = pl.Int64
+                self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global Inteiro.", LogLevel.INFO)
+            elif is_temporal_present: # Apenas Temporal (e talvez Null)
+                # Se houver vários tipos temporais (Date, Datetime...), usa o primeiro encontrado, ou pl.Date.
+                first_temporal_type = next((t for t in dtypes_set if t.is_temporal()), pl.Date)
+                target_type_for_col = first_temporal_type
+                self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global {first_temporal_type} (apenas Temporal).", LogLevel.INFO)
+            elif is_boolean_present: # Apenas Booleano (e talvez Null)
+                target_type_for_col = pl.Boolean
+                self.log_message.emit(f"Coluna '{final_col_name}': Tipo alvo global Booleano.", LogLevel.INFO)
+            elif is_null_present and len(dtypes_set) == 1: # Apenas Null type
+                 pass # Não define target_type, o concat pode lidar com coluna toda Null
+
+            if target_type_for_col:
+                global_target_types[final_col_name] = target_type_for_col
+
+        # 3. Aplicar o tipo alvo global a cada fragmento
+        harmonized_frames_final_pass = []
+        harmonization_checks = []
+        for lf_to_harmonize, schema in zip(frames, schemas):
+             self.cancel_token.raise_if_cancelled()
+             lf_modified_this_pass = lf_to_harmonize
+
+             expressions_to_apply = []
+             fragment_lossy_casts = {}
+             for col_name_in_df, current_type in schema.items():
+                 target_type = global_target_types.get(col_name_in_df)
+
+                 if target_type and current_type != target_type:
+                     # Só aplicar cast se o tipo atual for diferente do alvo
+                     expressions_to_apply.append(pl.col(col_name_in_df).cast(target_type, strict=False).alias(col_name_in_df))
+                     self.log_message.emit(f"Aplicando tipo alvo '{target_type}' à coluna '{col_name_in_df}' (era '{current_type}').", LogLevel.INFO)
+                     if self._cast_can_lose_values(current_type, target_type):
+                         fragment_lossy_casts[col_name_in_df] = target_type
+                 else:
+                     # Manter a coluna como está (ou porque não há tipo alvo ou já é o tipo alvo)
+                     expressions_to_apply.append(pl.col(col_name_in_df))
+
+             if fragment_lossy_casts:
+                 # As colunas originais ficam ao lado das convertidas para que a contagem das perdas
+                 # saia do mesmo cast, sem uma segunda leitura do fragmento
+                 lossy_columns = list(fragment_lossy_casts)
+                 staged = lf_to_harmonize.select(original_value_columns(lossy_columns) + expressions_to_apply).cache()
+                 lf_modified_this_pass = staged.select(list(schema))
+                 # Agregados parciais do resumo não têm a coluna "Origem"
+                 origin = pl.col("Origem").cast(pl.String) if "Origem" in schema else pl.lit("(agregados parciais)").alias("Origem")
+                 harmonization_checks.append((fragment_lossy_casts, staged.group_by(origin).agg(conversion_failure_aggregates(lossy_columns, schema))))
+             elif expressions_to_apply: # Se houver colunas no fragmento (sempre deve haver se chegou aqui)
+                 lf_modified_this_pass = lf_to_harmonize.select(expressions_to_apply)
+
+             harmonized_frames_final_pass.append(lf_modified_this_pass)
+
+        return harmonized_frames_final_pass, harmonization_checks
+
+    @staticmethod
+    def _cast_can_lose_values(current_type, target_type):
+        """
+        Indica se o cast da harmonização pode transformar valores em nulo. Os alargamentos
+        escolhidos pelas regras acima (qualquer tipo para texto, inteiros para decimal ou
+        Int64, datas entre si) nunca perdem valores e dispensam a verificação.
+        """
+        if current_type == pl.Null or target_type == pl.String:
+            return False
+        if target_type == pl.Float64 and current_type.is_numeric():
+            return False
+        if target_type == pl.Int64 and current_type.is_integer() and current_type != pl.UInt64:
+            return False
+        return not (target_type.is_temporal() and current_type.is_temporal())
+
+    def _report_harmonization_losses(self, harmonization_checks, results):
+        """
+        Registra, por fonte, os valores que os casts da harmonização com risco de perda (ex.:
+        UInt64 acima do limite do Int64) transformaram em nulo. `results` são os agregados
+        das verificações, coletados na mesma execução dos planos finais.
+        """
+        for (casts, _), result in zip(harmonization_checks, results):
+            for row in result.iter_rows(named=True):
+                for column, failure in conversion_failures(row, list(casts)).items():
+                    target_type = casts[column]
+                    self.log_message.emit(f"{failure['count']} valor(es) da coluna '{column}' em '{row['Origem']}' ficaram em branco ao harmonizar o tipo para {target_type}. Exemplos: {', '.join(failure['samples'])}", LogLevel.WARNING)
+                    self._record_quality(row["Origem"], column, "Harmonização", target_type, failure)
+
+    def _remove_duplicates(self, consolidated_lf):
+        """
+        Monta o plano de remoção de duplicatas pelas colunas-chave.
+        Retorna (plano_sem_duplicatas, plano_das_removidas_ou_None); a contagem é registrada após a execução.
+        """
+        removed_duplicates_lf = None
+        key_columns = self.duplicates_config.get("key_columns", [])
+        generate_report = self.duplicates_config.get("generate_report", False)
+        if key_columns:
+            self.log_message.emit(f"Removendo duplicatas com base nas chaves: {', '.join(key_columns)}...", LogLevel.INFO)
+            lf_with_index = consolidated_lf.with_row_index("__temp_index__")
+            unique_rows = lf_with_index.unique(subset = key_columns, keep = 'first')
+            if generate_report:
+                removed_duplicates_lf = lf_with_index.join(unique_rows.select("__temp_index__"), on = "__temp_index__", how = "anti").drop("__temp_index__")
+            consolidated_lf = unique_rows.drop("__temp_index__")
+        return consolidated_lf, removed_duplicates_lf
+
+    def _apply_key_index(self, consolidated_lf):
+        """
+        Descarta as linhas cujas chaves já foram entregues em execuções anteriores, cruzando
+        o plano com o índice persistente de chaves (antes da deduplicação dentro da execução).
+        Retorna (índice_ou_None, plano_sem_as_já_entregues, plano_das_descartadas_ou_None,
+        planos_do_índice). Os planos do índice (chaves novas e linhas descartadas) são
+        executados junto com a consolidação, e o índice só é atualizado depois que a saída é gravada.
+        """
+        key_columns = self.duplicates_config["key_columns"]
+        index_dir = self.duplicates_config.get("index_dir") or PersistentKeyIndex.default_dir(self.output_path)
+        key_index = PersistentKeyIndex(index_dir, key_columns, use_bloom=self.duplicates_config.get("bloom_filter", True))
+        incompatibility = key_index.compatibility_error()
+        if incompatibility:
+            self.log_message.emit(f"Índice persistente de chaves ignorado e não atualizado ({incompatibility}): {index_dir}", LogLevel.WARNING)
+            return None, consolidated_lf, None, []
+
+        self.log_message.emit(f"Cruzando os dados com o índice persistente de chaves ({key_index.total_keys:,} chave(s) já entregue(s))...", LogLevel.INFO)
+        # O hash é calculado uma vez e compartilhado pelo plano principal e pelos planos do índice
+        hashed_lf = consolidated_lf.with_columns(key_hash_expression(key_columns, consolidated_lf.collect_schema())).cache()
+        run_keys_lf = hashed_lf.select(KEY_HASH_COLUMN).unique()
+        known_lf = key_index.known_keys(run_keys_lf)
+        if known_lf is None:
+            return key_index, hashed_lf.drop(KEY_HASH_COLUMN), None, [run_keys_lf]
+
+        removed_lf = None
+        if self.duplicates_config.get("generate_report", False):
+            removed_lf = hashed_lf.join(known_lf, on=KEY_HASH_COLUMN, how="semi", maintain_order="left").drop(KEY_HASH_COLUMN)
+        consolidated_lf = hashed_lf.join(known_lf, on=KEY_HASH_COLUMN, how="anti", maintain_order="left").drop(KEY_HASH_COLUMN)
+        key_index_plans = [
+            run_keys_lf.join(known_lf, on=KEY_HASH_COLUMN, how="anti"),
+            hashed_lf.join(known_lf, on=KEY_HASH_COLUMN, how="semi").select(pl.len()),
+        ]
+        return key_index, consolidated_lf, removed_lf, key_index_plans
+
+    def _streams_csv_output(self, consolidated_lf, removed_duplicates_lf, pivot_lf, extra_plans=()):
+        """
+        Indica se o plano consolidado pode ir direto para o escritor de CSV. Com partes,
+        duplicatas ou resumo o plano seria executado mais de uma vez (contagem de linhas,
+        fatias, outros resultados), então nesses casos ele é coletado antes.
+        """
+        csv_parts = int(self.output_options.get("csv", {}).get("parts") or 1)
+        return (self.output_format == "CSV" and not self.spill.has_spilled and consolidated_lf is not None
+                and removed_duplicates_lf is None and pivot_lf is None and not extra_plans
+                and csv_parts <= 1 and not self.duplicates_config.get("key_columns"))
+
+    def _needs_consolidated_output(self):
+        """Indica se os dados consolidados serão gravados (XLSX ou modo multi-saída, e sem "somente resumo")."""
+        if self.pivot_rules.get("only_pivot", False):
+            return False
+        return self.output_format == "XLSX" or bool(self.output_options.get("multi_output"))
+
+    def _uses_partial_pivot(self):
+        """
+        Com "somente resumo" e sem remoção de duplicatas, cada fonte pode ser reduzida
+        aos agregados parciais do resumo logo após ser lida. A remoção de duplicatas
+        depende das linhas de todas as fontes, então nesse caso o resumo é calculado
+        sobre o plano completo (também no motor de streaming).
+        """
+        return bool(
+            self.pivot_rules.get("only_pivot", False)
+            and self.pivot_rules.get("group_by")
+            and self.pivot_rules.get("aggregations")
+            and not self.duplicates_config.get("key_columns")
+            and not self._active_enrichment_rules()
+        )
+
+    def _pivot_columns(self):
+        return set(self.pivot_rules.get("group_by") or []) | {rule.get("column") for rule in self.pivot_rules.get("aggregations") or []}
+
+    def _active_enrichment_rules(self):
+        """
+        Regras de enriquecimento que afetam a saída. Com "somente resumo", só as que trazem
+        colunas usadas no resumo: as demais não teriam onde aparecer e a junção é evitada.
+        """
+        if not self.pivot_rules.get("only_pivot", False):
+            return self.enrichment_rules
+        pivot_columns = self._pivot_columns()
+        return [rule for rule in self.enrichment_rules if pivot_columns & set(enrichment_output_columns(rule).values())]
+
+    def _apply_enrichment(self, consolidated_lf):
+        """
+        Acrescenta ao plano consolidado as colunas das tabelas de referência, cada uma por
+        uma junção hash à esquerda pela chave escolhida. Cada tabela é carregada uma única
+        vez (da cópia Parquet em cache, se houver) e a junção é executada junto com o
+        restante do plano, no motor de streaming. Regras inválidas são ignoradas com aviso.
+        """
+        rules = self._active_enrichment_rules()
+        if not rules:
+            return consolidated_lf
+        for rule in rules:
+            self.cancel_token.raise_if_cancelled()
+            reference_name = os.path.basename(rule["path"]) + (f" - Aba: '{rule['sheet']}'" if rule.get("sheet") else "")
+            consolidated_columns = consolidated_lf.collect_schema().names()
+            if rule["key"] not in consolidated_columns:
+                self.log_message.emit(f"Enriquecimento com '{reference_name}' ignorado: a coluna-chave '{rule['key']}' não está nos dados consolidados.", LogLevel.WARNING)
+                continue
+            output_columns = enrichment_output_columns(rule)
+            conflicting = [name for name in output_columns.values() if name in consolidated_columns]
+            if conflicting:
+                self.log_message.emit(f"Colunas de '{reference_name}' que já existem nos dados consolidados não serão trazidas (use um prefixo): {', '.join(conflicting)}", LogLevel.WARNING)
+                rule = {**rule, "columns": [column for column, name in output_columns.items() if name not in conflicting]}
+                if not rule["columns"]:
+                    continue
+            try:
+                lookup, repeated_keys = build_lookup(rule, self.reference_cache)
+            except Exception as e:
+                self.log_message.emit(f"Enriquecimento com '{reference_name}' ignorado: {e}", LogLevel.WARNING)
+                continue
+            repeated_msg = f" {repeated_keys:,} chave(s) repetida(s) ignorada(s) (vale a primeira ocorrência)." if repeated_keys else ""
+            self.log_message.emit(f"Enriquecendo pela coluna '{rule['key']}' com '{reference_name}' ({lookup.height:,} chave(s)): {', '.join(enrichment_output_columns(rule).values())}.{repeated_msg}", LogLevel.INFO)
+            consolidated_lf = join_lookup(consolidated_lf, rule["key"], lookup, rule.get("digits_only", False))
+        # As colunas novas entram antes da coluna "Origem", que continua no final
+        consolidated_columns = consolidated_lf.collect_schema().names()
+        if "Origem" in consolidated_columns:
+            consolidated_lf = consolidated_lf.select([col for col in consolidated_columns if col != "Origem"] + ["Origem"])
+        if self.reference_cache is not None and (self.reference_cache.converted or self.reference_cache.reused):
+            self.log_message.emit(f"Tabelas de referência: {self.reference_cache.converted} convertida(s) para Parquet, {self.reference_cache.reused} reaproveitada(s). Cache em: {self.reference_cache.cache_dir}", LogLevel.INFO)
+        return consolidated_lf
+
+    def _merge_pivot_partials(self, partial_frames):
+        """Combina os agregados parciais de todas as fontes no plano da Tabela de Resumo."""
+        self.log_message.emit("Combinando agregados parciais da Tabela de Resumo...", LogLevel.INFO)
+        group_by_cols = self.pivot_rules["group_by"]
+        try:
+            partials_lf = pl.concat(partial_frames, how="diagonal")
+            pivot_lf = decode_categoricals(merge_partial_pivots(partials_lf, group_by_cols, self.pivot_rules["aggregations"])).sort(group_by_cols)
+            pivot_lf.collect_schema() # Valida colunas e tipos antes da execução
+            return pivot_lf
+        except Exception as e_pivot:
+            self.log_message.emit(f"Erro ao criar tabela de resumo: {e_pivot}. O resultado do resumo não será salvo.", LogLevel.ERROR)
+            return None
+
+    def _build_pivot(self, consolidated_lf):
+        """Monta o plano da Tabela de Resumo (Pivot). Retorna None se não houver regras ou em caso de erro."""
+        pivot_lf = None # Plano para a tabela de resumo
+        if self.pivot_rules and self.pivot_rules.get("group_by") and self.pivot_rules.get("aggregations"):
+            self.log_message.emit("Criando Tabela de Resumo...", LogLevel.INFO)
+            try:
+                group_by_cols = self.pivot_rules['group_by']
+                aggregations = self.pivot_rules['aggregations']
+
+                op_map = {
+                    "Soma": pl.sum, "Média": pl.mean, "Contagem": pl.count,
+                    "Mínimo": pl.min, "Máximo": pl.max,
+                    "Contagem Única": lambda col: pl.col(col).n_unique()
+                }
+
+                consolidated_columns = consolidated_lf.collect_schema().names()
+                agg_expressions = []
+                for rule in aggregations:
+                    col_name = rule['column']
+                    op_str = rule['operation']
+
+                    if col_name not in consolidated_columns:
+                        self.log_message.emit(f"Coluna '{col_name}' da regra de resumo não encontrada. Pulando.", LogLevel.WARNING)
+                        continue
+
+                    if op_str in op_map:
+                        polars_func = op_map[op_str]
+                        new_col_name = f"{col_name}_{op_str.replace(' ', '_')}"
+                        agg_expressions.append(polars_func(col_name).alias(new_col_name))
+
+                if agg_expressions:
+                    # A tabela de resumo é pequena: as chaves categóricas voltam a String para ordenar alfabeticamente
+                    pivot_lf = decode_categoricals(consolidated_lf.group_by(group_by_cols).agg(agg_expressions)).sort(group_by_cols)
+                    pivot_lf.collect_schema() # Valida colunas e tipos antes da execução
+
+            except Exception as e_pivot:
+                self.log_message.emit(f"Erro ao criar tabela de resumo: {e_pivot}. O resultado do resumo não será salvo.", LogLevel.ERROR)
+                pivot_lf = None
+        return pivot_lf
+
+    def _write_rows(self, worksheet, frame, total_rows_written, total_rows_to_write):
+        """Escreve as linhas de um DataFrame/LazyFrame na planilha, verificando o cancelamento a cada bloco de linhas."""
+        r_idx = 1
+        for df_slice in _iter_frame_slices(frame, WRITE_CHECK_EVERY_ROWS):
+            for row_tuple in df_slice.iter_rows():
+                worksheet.write_row(r_idx, 0, row_tuple)
+                r_idx += 1
+            total_rows_written += df_slice.height
+            self.cancel_token.raise_if_cancelled()
+            self.progress_text_updated.emit(f"Escrevendo linha {total_rows_written:,} de {total_rows_to_write:,}...")
+        return total_rows_written
+
+    def _write_data_sheets(self, workbook, base_sheet_name, frame, frame_height, header_format, data_format, total_rows_written, total_rows_to_write):
+        """Escreve um DataFrame/LazyFrame em uma ou mais abas, respeitando o limite de linhas do Excel."""
+        max_rows_per_sheet = 1_048_570
+        sheets_to_write = []
+        if frame_height > max_rows_per_sheet:
+            num_chunks = (frame_height + max_rows_per_sheet - 1) // max_rows_per_sheet
+            for i in range(num_chunks):
+                chunk_height = min(max_rows_per_sheet, frame_height - i * max_rows_per_sheet)
+                sheets_to_write.append((f"{base_sheet_name}_{i+1}", frame.slice(i * max_rows_per_sheet, max_rows_per_sheet), chunk_height))
+        else:
+            sheets_to_write.append((base_sheet_name, frame, frame_height))
+
+        columns = frame.collect_schema().names()
+        max_lengths = _max_text_lengths(frame)
+        for sheet_name, frame_chunk, chunk_height in sheets_to_write:
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.freeze_panes('A2')
+            worksheet.set_zoom(70)
+            worksheet.hide_gridlines(2)
+            worksheet.write_row('A1', columns, header_format)
+            worksheet.autofilter(0, 0, chunk_height, len(columns) - 1)
+            for col_idx, col_name in enumerate(columns):
+                width = min(max_lengths.get(col_name, len(col_name)) + 2, 60)
+                worksheet.set_column(col_idx, col_idx, width, data_format)
+
+            total_rows_written = self._write_rows(worksheet, frame_chunk, total_rows_written, total_rows_to_write)
+        return total_rows_written
+
+    def _write_xlsx(self, path, consolidated_df, pivot_df, removed_duplicates_df):
+        import xlsxwriter
+        only_pivot = self.pivot_rules.get("only_pivot", False)
+        workbook = xlsxwriter.Workbook(path, {'use_zip64': True})
+        # Formatos
+        header_format = workbook.add_format({'font_name': 'Aptos', 'bold': True, 'font_color': 'white', 'bg_color': '#000000', 'border': 1, 'align': 'center', 'valign': 'vcenter'})
+        data_format = workbook.add_format({'font_name': 'Aptos'})
+        group_by_header_format = workbook.add_format({'font_name': 'Aptos', 'bold': True, 'font_color': 'white', 'bg_color': '#000000', 'border': 1, 'align': 'center', 'valign': 'vcenter'})
+
+        consolidated_height = _frame_height(consolidated_df) if consolidated_df is not None else 0
+        total_rows_to_write = consolidated_height + (pivot_df.height if pivot_df is not None else 0)
+        total_rows_written = 0
+
+        # 1. Escrever a Tabela de Resumo (pivot_df), se existir
+        if pivot_df is not None:
+            self.log_message.emit("Escrevendo aba 'Tabela_Resumo'...", LogLevel.INFO)
+            worksheet_pivot = workbook.add_worksheet("Tabela_Resumo")
+            worksheet_pivot.freeze_panes('A2')
+            worksheet_pivot.set_zoom(70)
+            worksheet_pivot.hide_gridlines(2)
+
+            group_by_cols = self.pivot_rules.get('group_by', [])
+            for col_idx, col_name in enumerate(pivot_df.columns):
+                fmt = group_by_header_format if col_name in group_by_cols else header_format
+                worksheet_pivot.write(0, col_idx, col_name, fmt)
+
+            max_lengths_pivot = _max_text_lengths(pivot_df)
+            for col_idx, col_name in enumerate(pivot_df.columns):
+                width = min(max_lengths_pivot.get(col_name, len(col_name)) + 2, 60)
+                worksheet_pivot.set_column(col_idx, col_idx, width, data_format)
+
+            total_rows_written = self._write_rows(worksheet_pivot, pivot_df, total_rows_written, total_rows_to_write)
+        if not only_pivot:
+            # 2. Escrever os Dados Consolidados
+            self.log_message.emit("Escrevendo aba(s) de 'Dados_Consolidados'...", LogLevel.INFO)
+            removed_height = _frame_height(removed_duplicates_df) if removed_duplicates_df is not None else 0
+            if removed_height > 0:
+                self.log_message.emit("Escrevendo aba 'Duplicatas_Removidas'...", LogLevel.INFO)
+                duplicates_header_format = workbook.add_format({'font_name': 'Aptos', 'bold': True, 'font_color': 'white', 'bg_color': '#C00000', 'border': 1, 'align': 'center', 'valign': 'vcenter'}) # Cabeçalho vermelho
+                total_rows_written = self._write_data_sheets(workbook, "Duplicatas_Removidas", removed_duplicates_df, removed_height, duplicates_header_format, data_format, total_rows_written, total_rows_to_write)
+
+            total_rows_written = self._write_data_sheets(workbook, "Dados_Consolidados", consolidated_df, consolidated_height, header_format, data_format, total_rows_written, total_rows_to_write)
+
+            self.progress_text_updated.emit(f"Finalizando escrita de {total_rows_to_write:,} linhas...")
+        if self.quality_report:
+            self._write_quality_sheet(workbook, header_format, data_format)
+        self.cancel_token.raise_if_cancelled()
+        # Só fecha (e grava) o workbook se não houve cancelamento; o arquivo temporário é descartado pelo chamador
+        workbook.close()
+
+    def _quality_frame(self):
+        return pl.DataFrame(self.quality_report).sort("Valores perdidos", descending=True, maintain_order=True)
+
+    def _write_quality_sheet(self, workbook, header_format, data_format):
+        """Aba "Qualidade": valores que viraram nulo na tipagem ou na harmonização, por fonte e coluna."""
+        self.log_message.emit("Escrevendo aba 'Qualidade'...", LogLevel.INFO)
+        quality_df = self._quality_frame()
+        worksheet = workbook.add_worksheet("Qualidade")
+        worksheet.freeze_panes('A2')
+        worksheet.hide_gridlines(2)
+        max_lengths = _max_text_lengths(quality_df)
+        for col_idx, col_name in enumerate(quality_df.columns):
+            worksheet.write(0, col_idx, col_name, header_format)
+            worksheet.set_column(col_idx, col_idx, min(max(max_lengths.get(col_name, 0), len(col_name)) + 2, 80), data_format)
+        for row_idx, row in enumerate(quality_df.iter_rows(), start=1):
+            worksheet.write_row(row_idx, 0, row)
+
+    def _write_quality_report(self):
+        """
+        Grava o relatório de qualidade em CSV ao lado das saídas que não são XLSX
+        (`dados_qualidade.csv`). Sem perdas, um relatório antigo com o mesmo nome é removido.
+        """
+        path = _quality_report_path(self.output_path)
+        if not self.quality_report:
+            if os.path.exists(path):
+                os.remove(path)
+                self.log_message.emit(f"Relatório de qualidade anterior removido (nenhum valor perdido nesta execução): {path}", LogLevel.INFO)
+            return
+        with AtomicOutputPath(path) as temp_path:
+            self._quality_frame().write_csv(temp_path, separator=";", include_bom=True, decimal_comma=True)
+        self.log_message.emit(f"Relatório de qualidade salvo em: {path}", LogLevel.INFO)
+
+    def _write_tabular(self, frame, path, split_parts=True):
+        """
+        Grava um resultado no formato de saída escolhido (exceto XLSX), de forma atômica.
+        Retorna os caminhos gravados (no CSV, com a extensão da compressão ou um por parte;
+        sem `split_parts`, o CSV vai para um único arquivo mesmo com partes configuradas).
+        """
+        if self.output_format == "Parquet (Dataset)":
+            self._write_dataset(frame, path)
+        elif self.output_format == "CSV":
+            return self._write_csv(frame, path, split_parts)
+        else:
+            with AtomicOutputPath(path) as temp_path:
+                if self.output_format == "Parquet":
+                    if isinstance(frame, pl.LazyFrame):
+                        frame.sink_parquet(temp_path, compression='zstd', engine='streaming')
+                    else:
+                        frame.write_parquet(temp_path, compression='zstd')
+                    self.cancel_token.raise_if_cancelled()
+                elif self.output_format == "Arrow IPC":
+                    self._write_ipc(temp_path, frame)
+        return [path]
+
+    def _write_ipc(self, path, frame):
+        """
+        Grava Arrow IPC (Feather v2). Sem compressão o arquivo pode ser lido mapeado
+        em memória, sem cópia; lz4/zstd comprimem os buffers e exigem descompressão na leitura.
+        """
+        compression = self.output_options.get("ipc", {}).get("compression", "uncompressed")
+        if isinstance(frame, pl.LazyFrame):
+            frame.sink_ipc(path, compression=compression, engine='streaming')
+        else:
+            frame.write_ipc(path, compression=compression)
+        self.cancel_token.raise_if_cancelled()
+
+    def _write_csv(self, frame, path, split_parts=True):
+        """Exporta CSV conforme as opções (separador, aspas, decimal, compressão e partes) e retorna os caminhos gravados."""
+        csv_options = self.output_options.get("csv", {})
+        if not split_parts:
+            csv_options = {**csv_options, "parts": 1}
+        written_paths = write_csv_export(frame, path, csv_options, self.cancel_token, log=self.progress_text_updated.emit)
+        if written_paths != [path]:
+            self.log_message.emit(f"CSV gravado em {len(written_paths)} arquivo(s): {', '.join(os.path.basename(p) for p in written_paths)}", LogLevel.INFO)
+        return written_paths
+
+    def _write_dataset(self, frame, path):
+        """Grava um dataset Parquet particionado (pasta com partições Hive e manifesto), de forma atômica."""
+        dataset_options = self.output_options.get("dataset", {})
+        partition_desc = ", ".join(dataset_options.get("partition_columns") or []) or "nenhuma"
+        if dataset_options.get("date_column"):
+            partition_desc = f"Ano/Mes de '{dataset_options['date_column']}'" + ("" if partition_desc == "nenhuma" else f", {partition_desc}")
+        self.log_message.emit(f"Gravando dataset Parquet particionado (partições: {partition_desc})...", LogLevel.INFO)
+        with AtomicOutputDir(path) as temp_dir:
+            manifest = write_parquet_dataset(
+                frame, temp_dir, dataset_options, self.cancel_token,
+                log=self.progress_text_updated.emit,
+            )
+        self.log_message.emit(
+            f"Dataset gravado: {manifest['total_rows']:,} linhas em {len(manifest['files'])} arquivo(s).",
+            LogLevel.INFO,
+        )
+
+    def stop(self):
+        self.cancel_token.cancel()
         self.log_message.emit("Tentativa de parada da consolidação solicitada...", LogLevel.INFO)
 
+
+
 class SheetLoadingWorker(QThread):
     finished = Signal(str, list, str)  # file_path, sheet_names_list, error_message_or_None
 
@@ -651,15 +1435,8 @@ class SheetLoadingWorker(QThread):
             if not self.is_running: # Checar novamente
                 raise InterruptedError("Carregamento de abas cancelado.")
 
-            if self.file_path.lower().endswith(".xlsx"):
-                # Usar read_only=True para performance, data_only=True para evitar carregar fórmulas complexas se não necessário
-                workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
-                sheet_names_from_file = workbook.sheetnames
-                workbook.close() # É bom fechar o workbook
-            elif self.file_path.lower().endswith(".xls"):
-                workbook = xlrd.open_workbook(self.file_path, on_demand=True)
-                sheet_names_from_file = workbook.sheet_names()
-            # Não precisa de else, pois a thread só é chamada para .xlsx/.xls
+            # A thread só é chamada para .xlsx/.xls
+            sheet_names_from_file = _workbook_sheet_names(self.file_path)
         except InterruptedError as ie:
             error_message = str(ie)
         except Exception as e:
@@ -695,15 +1472,8 @@ class SheetAnalysisWorker(QThread):
                     raise InterruptedError("Análise de abas cancelada.")
                 
                 try:
-                    sheet_names = []
-                    # Usamos openpyxl diretamente pois é otimizado para apenas ler nomes de abas
-                    if file_path.lower().endswith(".xlsx"):
-                        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-                        sheet_names = workbook.sheetnames
-                        workbook.close()
-                    elif file_path.lower().endswith(".xls"):
-                        workbook = xlrd.open_workbook(file_path, on_demand=True)
-                        sheet_names = workbook.sheet_names()
+                    # openpyxl/xlrd leem apenas a lista de abas, sem carregar os dados
+                    sheet_names = _workbook_sheet_names(file_path)
                     
                     if sheet_names:
                         all_sheets_cache[file_path] = sheet_names
@@ -727,15 +1497,119 @@ class SheetAnalysisWorker(QThread):
     def stop(self):
         self.is_running = False
 
+class FolderScanWorker(QThread):
+    """
+    Varre a pasta de entrada em segundo plano (recursivamente, com as regras de
+    inclusão/exclusão, tamanho e data) e envia os arquivos encontrados em lotes,
+    para que a lista seja preenchida aos poucos sem travar a interface.
+    """
+    files_found = Signal(list) # [(caminho_completo, caminho_relativo), ...]
+    finished = Signal(int, str) # total de arquivos, mensagem_de_erro (vazia se OK)
+
+    def __init__(self, folder_path, scan_options=None):
+        super().__init__()
+        self.folder_path = folder_path
+        self.scan_options = scan_options or {}
+        self.cancel_token = CancellationToken()
+
+    def run(self):
+        total_files = 0
+        error_message = ""
+        try:
+            for batch in scan_folder_batches(self.folder_path, self.scan_options, self.cancel_token):
+                total_files += len(batch)
+                self.files_found.emit(batch)
+        except InterruptedError as ie:
+            error_message = str(ie)
+        except Exception as e:
+            error_message = f"Erro ao listar arquivos: {e}"
+        self.finished.emit(total_files, error_message)
+
+    def stop(self):
+        self.cancel_token.cancel()
+
+class FolderWatchWorker(QThread):
+    """
+    Monitora a pasta de entrada por varreduras periódicas. Arquivos novos ou alterados
+    são informados quando ficam estáveis (tamanho e data de modificação inalterados
+    pelo tempo de espera), junto com as abas das pastas de trabalho novas. Os arquivos
+    presentes no início do monitoramento são considerados já consolidados.
+    """
+    files_ready = Signal(list, dict) # [(caminho_completo, caminho_relativo)], {caminho_excel: [abas]}
+    log_message = Signal(str, LogLevel)
+
+    def __init__(self, folder_path, scan_options=None, poll_seconds=WATCH_POLL_SECONDS, debounce_seconds=WATCH_DEBOUNCE_SECONDS, output_path=None):
+        super().__init__()
+        self.folder_path = folder_path
+        self.scan_options = scan_options or {}
+        # A própria saída (e seus arquivos auxiliares) pode estar dentro da pasta monitorada e não deve disparar nada
+        self.is_output_artifact = _output_artifact_matcher(output_path) if output_path else None
+        self.poll_seconds = poll_seconds
+        self.tracker = StableFileTracker(debounce_seconds)
+        self.cancel_token = CancellationToken()
+        self._lock = threading.Lock()
+
+    def _snapshot(self):
+        relative_paths = {}
+        signatures = {}
+        for full_path, relative_path in scan_folder(self.folder_path, self.scan_options, self.cancel_token):
+            if self.is_output_artifact and self.is_output_artifact(full_path):
+                continue
+            try:
+                signatures[full_path] = StableFileTracker.signature(source_stat(full_path))
+            except OSError:
+                continue
+            relative_paths[full_path] = relative_path
+        return signatures, relative_paths
+
+    def run(self):
+        try:
+            signatures, _ = self._snapshot()
+            with self._lock:
+                self.tracker.set_baseline(signatures)
+            self.log_message.emit(f"Monitorando '{self.folder_path}' ({len(signatures)} arquivo(s) atuais considerados já consolidados).", LogLevel.INFO)
+            while not self.cancel_token.wait(self.poll_seconds):
+                signatures, relative_paths = self._snapshot()
+                with self._lock:
+                    ready = self.tracker.update(signatures)
+                    self.tracker.mark_processed(ready)
+                if not ready:
+                    continue
+                sheets_by_file = {}
+                for file_path in ready:
+                    if file_path.lower().endswith((".xlsx", ".xls")):
+                        try:
+                            sheets_by_file[file_path] = _workbook_sheet_names(file_path)
+                        except Exception as e:
+                            self.log_message.emit(f"Não foi possível ler as abas de '{os.path.basename(file_path)}': {e}", LogLevel.WARNING)
+                self.files_ready.emit([(path, relative_paths[path]) for path in ready], sheets_by_file)
+        except InterruptedError:
+            pass
+        except Exception as e:
+            self.log_message.emit(f"Erro no monitoramento da pasta: {e}", LogLevel.ERROR)
+
+    def release(self, file_paths):
+        """Volta a considerar os arquivos como pendentes (ex.: a consolidação disparada por eles falhou)."""
+        with self._lock:
+            for file_path in file_paths:
+                self.tracker.processed.pop(file_path, None)
+
+    def stop(self):
+        self.cancel_token.cancel()
+
 class HeaderAnalysisWorker(QThread):
     '''Worker para os cabeçalhos'''
     finished = Signal(list, object)
     progress_log = Signal(str, LogLevel)
 
-    def __init__(self, files_and_sheets_config, delimiter):
+    def __init__(self, files_and_sheets_config, delimiter, profile_cache_path=None):
         super().__init__()
         self.files_and_sheets_config = files_and_sheets_config
         self.delimiter = delimiter
+        self.profile_cache_path = profile_cache_path # Cache dos perfis de cabeçalho por fonte (None = sem cache)
+        # Catálogo das fontes desta análise ({(arquivo, aba): perfil}), entregue à consolidação
+        # para que ela não precise detectar de novo o cabeçalho das fontes inalteradas
+        self.source_catalog = {}
         self.is_running = True
 
     def _get_series_profile(self, series: pl.Series):
@@ -756,64 +1630,105 @@ class HeaderAnalysisWorker(QThread):
         except (Exception, pl.exceptions.PanicException): pass
         return {"dtype": pl.String, "null_ratio": series.is_null().mean()}
 
+    def _profile_source(self, file_path, sheet_name, n_sample_rows=200, n_preread_rows=20):
+        """
+        Lê o início da fonte, detecta a linha do cabeçalho e perfila cada coluna.
+        Retorna (linha_do_cabeçalho, colunas); uma fonte vazia retorna (0, []).
+        """
+        pre_read_df = None
+        if file_path.lower().endswith((".csv", ".txt")):
+            pre_read_df = read_csv_raw(file_path, self.delimiter, n_rows=n_preread_rows)
+        elif file_path.lower().endswith((".xlsx", ".xls")):
+            pre_read_df = read_excel_raw(file_path, sheet_name, infer_schema_length = 0).head(n_preread_rows)
+        elif is_ipc_file(file_path):
+            pre_read_df = ipc_preview_raw(file_path, n_sample_rows)
+
+        if pre_read_df is None or pre_read_df.is_empty():
+            return 0, []
+
+        # Em arquivos IPC os nomes das colunas estão sempre na linha 0
+        header_row_index = 0 if is_ipc_file(file_path) else _find_header_row_index(pre_read_df, n_preread_rows)
+        header_names_raw = [str(h) if h is not None else f"column_{i}" for i, h in enumerate(pre_read_df.row(header_row_index))]
+        header_names = _make_headers_unique(header_names_raw)
+        data_rows_df = pre_read_df.slice(offset=header_row_index + 1).head(n_sample_rows)
+
+        if data_rows_df.is_empty():
+            return header_row_index, []
+
+        rename_mapping = {old_name: new_name for old_name, new_name in zip(data_rows_df.columns, header_names)}
+        sample_df = data_rows_df.rename(rename_mapping)
+
+        columns = []
+        for col_name, raw_name in zip(sample_df.columns, header_names_raw):
+            try: # <-- INÍCIO DO BLOCO DE BLINDAGEM
+                profile = self._get_series_profile(sample_df[col_name])
+            except Exception as e_profile: # <-- CAPTURA O "PANIC"
+                # Se a análise da coluna falhar, cria um perfil "seguro"
+                self.progress_log.emit(f"Falha ao analisar coluna '{col_name}' em '{os.path.basename(file_path)}'. Tratando como texto. Erro: {e_profile}", LogLevel.WARNING)
+                profile = {"dtype": pl.String, "null_ratio": 0.0} # Tipo de dado seguro
+            columns.append({
+                "name": col_name,
+                "raw_name": raw_name,
+                "normalized_name": _normalize_header_name(col_name),
+                "dtype": dtype_to_name(profile["dtype"]),
+                "null_ratio": float(profile["null_ratio"] or 0.0),
+            })
+        return header_row_index, columns
+
     def run(self):
         if not self.is_running:
             self.finished.emit([], InterruptedError("Análise cancelada."))
             return
 
         all_column_fingerprints = []
-        n_sample_rows, n_preread_rows = 200, 20
+        profile_cache = HeaderProfileCache(self.profile_cache_path) if self.profile_cache_path else None
+        reused_sources = profiled_sources = 0
 
         try:
             for file_path, selected_sheets in self.files_and_sheets_config:
                 if not self.is_running: raise InterruptedError("Análise cancelada.")
 
-                self.progress_log.emit(f"Analisando: {os.path.basename(file_path)}...", LogLevel.INFO)
-                
                 sheets_to_iterate = selected_sheets if selected_sheets is not None else [None]
+                try:
+                    stat = source_stat(file_path)
+                except OSError:
+                    continue
+                cached_profiles = {}
+                if profile_cache is not None:
+                    for sheet_name in sheets_to_iterate:
+                        cached = profile_cache.get(file_path, sheet_name, stat, self.delimiter)
+                        if cached is not None:
+                            cached_profiles[sheet_name] = cached
+                if len(cached_profiles) < len(sheets_to_iterate):
+                    self.progress_log.emit(f"Analisando: {source_display_name(file_path)}...", LogLevel.INFO)
+
                 for sheet_name in sheets_to_iterate:
                     if not self.is_running: raise InterruptedError("Análise cancelada.")
-                    try:
-                        pre_read_df = None
-                        if file_path.lower().endswith((".csv", ".txt")):
-                            pre_read_df = pl.read_csv(source=file_path, has_header=False, n_rows=n_preread_rows, separator=self.delimiter, encoding='latin-1', ignore_errors=True, infer_schema = False, truncate_ragged_lines = True, quote_char = None)
-                        elif file_path.lower().endswith((".xlsx", ".xls")):
-                            pre_read_df = pl.read_excel(source=file_path, sheet_name=sheet_name, has_header = False, infer_schema_length = 0).head(n_preread_rows)
-                        
-                        if pre_read_df is None or pre_read_df.is_empty(): continue
-                        
-                        header_row_index = _find_header_row_index(pre_read_df, n_preread_rows)
-                        header_names_raw = [str(h) if h is not None else f"column_{i}" for i, h in enumerate(pre_read_df.row(header_row_index))]
-                        header_names = _make_headers_unique(header_names_raw)
-                        data_rows_df = pre_read_df.slice(offset=header_row_index + 1).head(n_sample_rows)
-                        
-                        if data_rows_df.is_empty(): continue
-                        
-                        rename_mapping = {old_name: new_name for old_name, new_name in zip(data_rows_df.columns, header_names)}
-                        sample_df = data_rows_df.rename(rename_mapping)
-
-                        for col_name in sample_df.columns:
-                            try: # <-- INÍCIO DO BLOCO DE BLINDAGEM
-                                series = sample_df[col_name]
-                                profile = self._get_series_profile(series)
-                                fingerprint = {
-                                    "source_tuple": (col_name, file_path, sheet_name),
-                                    "normalized_name": _normalize_header_name(col_name),
-                                    "dtype": profile["dtype"],
-                                    "null_ratio": profile["null_ratio"],
-                                }
-                            except Exception as e_profile: # <-- CAPTURA O "PANIC"
-                                # Se a análise da coluna falhar, cria um perfil "seguro"
-                                self.progress_log.emit(f"Falha ao analisar coluna '{col_name}' em '{os.path.basename(file_path)}'. Tratando como texto. Erro: {e_profile}", LogLevel.WARNING)
-                                fingerprint = {
-                                    "source_tuple": (col_name, file_path, sheet_name),
-                                    "normalized_name": _normalize_header_name(col_name),
-                                    "dtype": pl.String, # Tipo de dado seguro
-                                    "null_ratio": 0.0,
-                                }
-                            all_column_fingerprints.append(fingerprint)
-                    except Exception:
-                        continue
+                    profile = cached_profiles.get(sheet_name)
+                    if profile is not None:
+                        reused_sources += 1
+                    else:
+                        try:
+                            header_row_index, columns = self._profile_source(file_path, sheet_name)
+                        except Exception:
+                            continue
+                        profiled_sources += 1
+                        if profile_cache is not None:
+                            profile = profile_cache.put(file_path, sheet_name, stat, self.delimiter, header_row_index, columns)
+                        else:
+                            profile = HeaderProfileCache.make_entry(file_path, stat, self.delimiter, header_row_index, columns)
+                    self.source_catalog[(file_path, sheet_name)] = profile
+
+                    for column in profile["columns"]:
+                        all_column_fingerprints.append({
+                            "source_tuple": (column["name"], file_path, sheet_name),
+                            "normalized_name": column["normalized_name"],
+                            "dtype": PROFILE_DTYPES.get(column["dtype"], pl.String),
+                            "null_ratio": column["null_ratio"],
+                        })
+
+            if profile_cache is not None:
+                self.progress_log.emit(f"Perfis de cabeçalho: {reused_sources} fonte(s) reaproveitada(s) do cache, {profiled_sources} analisada(s).", LogLevel.INFO)
 
             # --- ALGORITMO DE AGRUPAMENTO DEFINITIVO ---
             groups_by_name = defaultdict(list)
@@ -838,6 +1753,64 @@ class HeaderAnalysisWorker(QThread):
                 self.finished.emit(final_groups, None)
         except Exception as e:
             self.finished.emit([], e)
+        finally:
+            # Perfis calculados antes de um cancelamento também ficam para a próxima análise
+            if profile_cache is not None:
+                try:
+                    profile_cache.save()
+                except OSError as e:
+                    self.progress_log.emit(f"Não foi possível gravar o cache de perfis de cabeçalho: {e}", LogLevel.WARNING)
 
     def stop(self):
         self.is_running = False
+
+
+def _workbook_sheet_names(file_path):
+    """Nomes das abas de uma pasta de trabalho .xlsx/.xls, sem carregar os dados."""
+    source = source_for_reader(file_path)
+    if file_path.lower().endswith(".xlsx"):
+        # read_only=True para performance, data_only=True para não carregar fórmulas
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        sheet_names = workbook.sheetnames
+        workbook.close()
+        return sheet_names
+    if isinstance(source, str):
+        return xlrd.open_workbook(source, on_demand=True).sheet_names()
+    return xlrd.open_workbook(file_contents=source.getvalue(), on_demand=True).sheet_names()
+
+def _quality_report_path(output_path):
+    """Relatório de qualidade ao lado da saída: `dados.parquet` (ou `dados.csv.gz`) -> `dados_qualidade.csv`."""
+    name = output_path
+    while os.path.splitext(name)[1].lower() in (".csv", ".gz", ".zst", ".parquet", ".arrow", ".feather", ".ipc"):
+        name = os.path.splitext(name)[0]
+    return f"{name}_qualidade.csv"
+
+def _output_artifact_matcher(output_path):
+    """
+    Função que indica se um caminho é a saída ou um dos arquivos que a consolidação grava
+    ao lado dela: `_resumo`/`_duplicatas`, partes e versões comprimidas do CSV,
+    `_qualidade.csv`, os caches `.fontes_processadas`/`.resumo_parcial`, o índice de
+    chaves e o conteúdo do dataset Parquet. Entradas que só começam com o mesmo nome
+    (ex.: `vendas_fevereiro.csv` para a saída `vendas.xlsx`) não são ignoradas.
+    """
+    output_path = os.path.abspath(output_path)
+    base, ext = os.path.splitext(output_path)
+    compressions = "|".join(re.escape(suffix) for suffix in CSV_COMPRESSION_EXTENSIONS.values() if suffix)
+    files_re = re.compile(
+        re.escape(base) + r"(_resumo|_duplicatas)?(\.part\d{3})?" + re.escape(ext) + rf"({compressions})?",
+        re.IGNORECASE if os.path.normcase("A") == "a" else 0,
+    )
+    quality_path = os.path.normcase(_quality_report_path(output_path))
+    artifact_dirs = [os.path.normcase(path) + os.sep for path in (
+        output_path, base + ".fontes_processadas", base + ".resumo_parcial", PersistentKeyIndex.default_dir(output_path))]
+
+    def is_artifact(path):
+        path = os.path.abspath(path)
+        normalized = os.path.normcase(path)
+        return bool(files_re.fullmatch(path)) or normalized == quality_path or any(normalized.startswith(d) for d in artifact_dirs)
+    return is_artifact
+
+def _sibling_output_path(output_path, suffix):
+    """Caminho de uma saída adicional ao lado da principal: `dados.csv` -> `dados_resumo.csv`."""
+    name, ext = os.path.splitext(output_path)
+    return f"{name}{suffix}{ext}"
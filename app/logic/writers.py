@@ -0,0 +1,253 @@
+import os
+import json
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import polars as pl
+
+from .cancellation import CancellationToken, AtomicOutputPath
+
+# Linhas por lote ao percorrer um LazyFrame para gravar um dataset particionado
+DATASET_BATCH_ROWS = 1_000_000
+# Valor usado no caminho de partições cujo valor é nulo (convenção do Hive)
+HIVE_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+# Arquivos auxiliares do dataset, com extensões que o padrão de leitura `**/*.parquet` não inclui
+DATASET_SCHEMA_FILE = "_schema.arrow"
+DATASET_MANIFEST_FILE = "_manifest.json"
+# Colunas derivadas quando o dataset é particionado por uma coluna de data
+DATE_PARTITION_COLUMNS = ("Ano", "Mes")
+# Tamanho dos blocos de linhas usados na escrita incremental de CSV
+CSV_WRITE_CHUNK_ROWS = 100_000
+# Extensão acrescentada ao arquivo CSV conforme a compressão escolhida
+CSV_COMPRESSION_EXTENSIONS = {"uncompressed": "", "gzip": ".gz", "zstd": ".zst"}
+# Opções padrão da exportação CSV (o separador '|' é o formato histórico do DataFlow)
+CSV_DEFAULT_OPTIONS = {
+    "separator": "|",
+    "quote_style": "necessary",
+    "decimal_comma": False,
+    "compression": "uncompressed",
+    "parts": 1,
+}
+
+
+def _frame_height(frame) -> int:
+    """Número de linhas de um DataFrame ou LazyFrame (para Parquet despejado, vem dos metadados)."""
+    if isinstance(frame, pl.DataFrame):
+        return frame.height
+    return frame.select(pl.len()).collect().item()
+
+def _iter_frame_slices(frame, size):
+    """Percorre um DataFrame ou LazyFrame em blocos de até `size` linhas."""
+    if isinstance(frame, pl.DataFrame):
+        yield from frame.iter_slices(size)
+    else:
+        yield from frame.collect_batches(chunk_size=size)
+
+def _max_text_lengths(frame) -> dict:
+    """Maior comprimento textual de cada coluna (incluindo o cabeçalho), calculado em uma única passada."""
+    columns = frame.collect_schema().names()
+    if not columns:
+        return {}
+    lengths = frame.lazy().select(
+        [pl.col(col).cast(pl.String).str.len_chars().max().alias(col) for col in columns]
+    ).collect()
+    return {col: max(len(str(col)), lengths[col][0] or 1) for col in columns}
+
+
+def _hive_segment(column: str, value) -> str:
+    value_str = HIVE_NULL_PARTITION if value is None else quote(str(value), safe="")
+    return f"{quote(column, safe='')}={value_str}"
+
+def _manifest_value(value):
+    """Valor de partição no manifesto: números e booleanos mantêm o tipo JSON; os demais viram texto."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+def _column_statistics(df: pl.DataFrame) -> dict:
+    """Mínimo, máximo e nulos das colunas ordenáveis de um arquivo, para o manifesto."""
+    columns = [c for c, t in df.schema.items() if t.is_numeric() or t.is_temporal() or t == pl.String]
+    if not columns or df.is_empty():
+        return {}
+    exprs = []
+    for col in columns:
+        exprs += [pl.col(col).min().alias(f"{col}__min"), pl.col(col).max().alias(f"{col}__max"), pl.col(col).null_count().alias(f"{col}__nulls")]
+    row = df.select(exprs).row(0)
+    stats = {}
+    for i, col in enumerate(columns):
+        stats[col] = {"min": row[3 * i], "max": row[3 * i + 1], "null_count": row[3 * i + 2]}
+    return stats
+
+def add_date_partition_columns(frame, date_column: str):
+    """Deriva as colunas Ano/Mes a partir de uma coluna de data (Date, Datetime ou texto ISO)."""
+    dtype = frame.collect_schema().get(date_column)
+    if dtype is None:
+        raise ValueError(f"Coluna de data '{date_column}' não encontrada nos dados.")
+    date_expr = pl.col(date_column)
+    if not dtype.is_temporal():
+        date_expr = date_expr.cast(pl.String).str.to_date(strict=False)
+    # Int64, o tipo que a leitura com hive_partitioning infere para os valores dos caminhos
+    return frame.with_columns(
+        date_expr.dt.year().cast(pl.Int64).alias(DATE_PARTITION_COLUMNS[0]),
+        date_expr.dt.month().cast(pl.Int64).alias(DATE_PARTITION_COLUMNS[1]),
+    )
+
+def write_parquet_dataset(frame, dataset_dir: str, options: dict, cancel_token: CancellationToken = None, log=None) -> dict:
+    """
+    Grava `frame` (DataFrame ou LazyFrame) como um dataset Parquet particionado no
+    estilo Hive (`coluna=valor/part-00000.parquet`) dentro de `dataset_dir`.
+
+    Opções: `partition_columns` (lista), `date_column` (gera Ano/Mes), `row_group_size`,
+    `compression_level` (zstd) e `statistics`. As partições de cada lote são gravadas
+    em paralelo. Ao final são gerados `_schema.arrow` (esquema completo, sem linhas, em
+    Arrow IPC) e `_manifest.json` (arquivos, valores de partição, linhas e estatísticas
+    por coluna), permitindo que os leitores descartem partições e arquivos sem abri-los.
+    Para ler o dataset use `pl.scan_parquet("<pasta>/**/*.parquet", hive_partitioning=True)`,
+    que não inclui os arquivos auxiliares. Retorna o manifesto.
+    """
+    log = log or (lambda message: None)
+    partition_columns = list(options.get("partition_columns") or [])
+    date_column = options.get("date_column")
+    if date_column:
+        frame = add_date_partition_columns(frame, date_column)
+        partition_columns = [c for c in DATE_PARTITION_COLUMNS if c not in partition_columns] + partition_columns
+
+    schema = frame.collect_schema()
+    missing = [c for c in partition_columns if c not in schema]
+    if missing:
+        log(f"Colunas de partição ausentes nos dados e ignoradas: {', '.join(missing)}")
+        partition_columns = [c for c in partition_columns if c in schema]
+
+    write_kwargs = {
+        "compression": "zstd",
+        "compression_level": options.get("compression_level"),
+        "statistics": options.get("statistics", True),
+        "row_group_size": options.get("row_group_size"),
+    }
+    collect_statistics = bool(options.get("statistics", True))
+    os.makedirs(dataset_dir, exist_ok=True)
+
+    manifest_files = []
+    part_counters = {}
+
+    def _write_part(partition_values, df_part):
+        segments = [_hive_segment(c, v) for c, v in zip(partition_columns, partition_values)]
+        part_dir = os.path.join(dataset_dir, *segments)
+        os.makedirs(part_dir, exist_ok=True)
+        part_number = part_counters.get(part_dir, 0)
+        part_counters[part_dir] = part_number + 1
+        relative_path = "/".join(segments + [f"part-{part_number:05d}.parquet"])
+        data = df_part.drop(partition_columns)
+        return relative_path, partition_values, data
+
+    def _flush(relative_path, partition_values, data):
+        data.write_parquet(os.path.join(dataset_dir, *relative_path.split("/")), **write_kwargs)
+        entry = {
+            "path": relative_path,
+            "partition": {c: _manifest_value(v) for c, v in zip(partition_columns, partition_values)},
+            "rows": data.height,
+        }
+        if collect_statistics:
+            entry["statistics"] = _column_statistics(data)
+        return entry
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
+        for batch in _iter_frame_slices(frame, DATASET_BATCH_ROWS):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            if batch.is_empty():
+                continue
+            if partition_columns:
+                parts = batch.partition_by(partition_columns, as_dict=True, maintain_order=False)
+            else:
+                parts = {(): batch}
+            # Os caminhos são decididos na thread principal; a gravação (que libera o GIL) roda em paralelo
+            jobs = [_write_part(values, df_part) for values, df_part in parts.items()]
+            futures = [executor.submit(_flush, *job) for job in jobs]
+            for future in futures:
+                manifest_files.append(future.result())
+            log(f"Dataset: {len(manifest_files)} arquivo(s) gravado(s) em {len(part_counters)} partição(ões)...")
+
+    full_schema = {name: str(dtype) for name, dtype in schema.items()}
+    pl.DataFrame(schema=schema).write_ipc(os.path.join(dataset_dir, DATASET_SCHEMA_FILE))
+    manifest = {
+        "format": "parquet",
+        "layout": "hive",
+        "partition_columns": partition_columns,
+        "schema": full_schema,
+        "compression": "zstd",
+        "compression_level": write_kwargs["compression_level"],
+        "row_group_size": write_kwargs["row_group_size"],
+        "total_rows": sum(f["rows"] for f in manifest_files),
+        "files": manifest_files,
+    }
+    with open(os.path.join(dataset_dir, DATASET_MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+    return manifest
+
+
+def csv_output_paths(output_path: str, options: dict) -> list:
+    """Caminhos finais da exportação CSV: um arquivo, ou `nome.partNNN.csv` por parte, com a extensão da compressão."""
+    options = {**CSV_DEFAULT_OPTIONS, **(options or {})}
+    suffix = CSV_COMPRESSION_EXTENSIONS.get(options["compression"], "")
+    parts = max(1, int(options["parts"] or 1))
+    if parts == 1:
+        return [output_path + suffix]
+    name, ext = os.path.splitext(output_path)
+    return [f"{name}.part{i + 1:03d}{ext}{suffix}" for i in range(parts)]
+
+def _write_csv_stream(frame, file_obj, options: dict, cancel_token: CancellationToken = None):
+    """
+    Escreve um DataFrame/LazyFrame em CSV bloco a bloco, sem materializar o conjunto
+    inteiro. Com compressão cada bloco vira um membro gzip/quadro zstd independente;
+    a concatenação deles é um arquivo válido para qualquer descompressor.
+    """
+    write_kwargs = {
+        "separator": options["separator"],
+        "quote_style": options["quote_style"],
+        "decimal_comma": options["decimal_comma"],
+        "compression": options["compression"],
+    }
+    wrote_header = False
+    for df_slice in _iter_frame_slices(frame, CSV_WRITE_CHUNK_ROWS):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        df_slice.write_csv(file_obj, include_header=not wrote_header, **write_kwargs)
+        wrote_header = True
+    if not wrote_header:
+        frame.lazy().head(0).collect().write_csv(file_obj, **write_kwargs)
+
+def write_csv_export(frame, output_path: str, options: dict, cancel_token: CancellationToken = None, log=None) -> list:
+    """
+    Exporta `frame` para CSV com separador, aspas e formato decimal configuráveis e
+    compressão gzip/zstd em streaming. Com `parts` > 1 as linhas são divididas em
+    faixas contíguas gravadas em paralelo, cada uma em seu arquivo com cabeçalho.
+    Todos os arquivos são escritos em temporários e só substituem os destinos
+    quando todas as partes terminam. Retorna os caminhos gravados.
+    """
+    log = log or (lambda message: None)
+    options = {**CSV_DEFAULT_OPTIONS, **(options or {})}
+    final_paths = csv_output_paths(output_path, options)
+
+    if len(final_paths) == 1:
+        frames = [frame]
+    else:
+        total_rows = _frame_height(frame)
+        rows_per_part = -(-total_rows // len(final_paths)) if total_rows else 0
+        frames = [frame.slice(i * rows_per_part, rows_per_part) for i in range(len(final_paths))]
+        log(f"Dividindo {total_rows:,} linhas em {len(final_paths)} arquivos CSV gravados em paralelo...")
+
+    def _write_part(part_frame, temp_path):
+        with open(temp_path, 'wb') as f:
+            _write_csv_stream(part_frame, f, options, cancel_token)
+
+    with ExitStack() as stack:
+        temp_paths = [stack.enter_context(AtomicOutputPath(path)) for path in final_paths]
+        if len(frames) == 1:
+            _write_part(frames[0], temp_paths[0])
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(frames), os.cpu_count() or 4)) as executor:
+                for future in [executor.submit(_write_part, f, t) for f, t in zip(frames, temp_paths)]:
+                    future.result()
+    return final_paths
@@ -3,12 +3,14 @@ from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QLabel,
     QListWidget, QListWidgetItem, QComboBox, QTextEdit, QDialogButtonBox,
     QTableWidget, QTableWidgetItem, QCheckBox, QHeaderView, QScrollArea,
-    QGroupBox, QAbstractItemView, QInputDialog, QRadioButton, QWidget
+    QGroupBox, QAbstractItemView, QInputDialog, QRadioButton, QWidget, QSpinBox,
+    QFormLayout, QFileDialog, QDateEdit, QPlainTextEdit, QMessageBox
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QDate
 
 # Importa as constantes do módulo de utilitários
-from ..utils import DATA_TYPES_OPTIONS, OPERATOR_OPTIONS, OPERATORS_NO_VALUE
+from ..utils import DATA_TYPES_OPTIONS, OPERATOR_OPTIONS, OPERATORS_NO_VALUE, OPERATORS_LIST_VALUE, split_value_list
+from ..logic.enrichment import REFERENCE_FILE_FILTER, reference_sheet_names, reference_columns, enrichment_output_columns
 
 class PivotDialog(QDialog):
     """Um diálogo para configurar a operação de tabela dinâmica (pivot)."""
@@ -175,6 +177,206 @@ class PivotDialog(QDialog):
             "only_pivot": self.only_pivot_checkbox.isChecked() 
         }
 
+class EnrichmentDialog(QDialog):
+    """Lista das tabelas de referência juntadas aos dados consolidados (ex.: CNPJ -> razão social, CFOP -> descrição)."""
+    def __init__(self, final_headers, existing_rules=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Enriquecer com Tabelas de Referência")
+        self.setMinimumSize(600, 400)
+        self.final_headers = final_headers
+        self.rules = [dict(rule) for rule in existing_rules or []]
+
+        main_layout = QVBoxLayout(self)
+        main_layout.addWidget(QLabel("Cada tabela traz colunas novas para as linhas cuja chave for encontrada nela. Linhas sem correspondência ficam com as colunas novas em branco."))
+        self.rules_list = QListWidget()
+        self.rules_list.itemDoubleClicked.connect(lambda _: self.edit_rule())
+        main_layout.addWidget(self.rules_list)
+
+        actions_layout = QHBoxLayout()
+        add_button = QPushButton("Adicionar Tabela...")
+        add_button.clicked.connect(self.add_rule)
+        edit_button = QPushButton("Editar...")
+        edit_button.clicked.connect(self.edit_rule)
+        remove_button = QPushButton("Remover")
+        remove_button.clicked.connect(self.remove_rule)
+        actions_layout.addWidget(add_button)
+        actions_layout.addWidget(edit_button)
+        actions_layout.addWidget(remove_button)
+        actions_layout.addStretch()
+        main_layout.addLayout(actions_layout)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        main_layout.addWidget(button_box)
+        self._refresh_list()
+
+    def _refresh_list(self):
+        self.rules_list.clear()
+        for rule in self.rules:
+            sheet = f" ({rule['sheet']})" if rule.get("sheet") else ""
+            columns = ", ".join(enrichment_output_columns(rule).values())
+            self.rules_list.addItem(f"{os.path.basename(rule['path'])}{sheet}: {rule['key']} = {rule['reference_key']} -> {columns}")
+
+    def add_rule(self):
+        dialog = ReferenceTableDialog(self.final_headers, None, self)
+        if dialog.exec() == QDialog.Accepted:
+            self.rules.append(dialog.get_rule())
+            self._refresh_list()
+
+    def edit_rule(self):
+        row = self.rules_list.currentRow()
+        if row < 0:
+            return
+        dialog = ReferenceTableDialog(self.final_headers, self.rules[row], self)
+        if dialog.exec() == QDialog.Accepted:
+            self.rules[row] = dialog.get_rule()
+            self._refresh_list()
+
+    def remove_rule(self):
+        row = self.rules_list.currentRow()
+        if row >= 0:
+            del self.rules[row]
+            self._refresh_list()
+
+    def get_rules(self):
+        return list(self.rules)
+
+class ReferenceTableDialog(QDialog):
+    """Configuração de uma tabela de referência: arquivo, chave de junção e colunas trazidas."""
+    def __init__(self, final_headers, existing_rule=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Tabela de Referência")
+        self.setMinimumSize(500, 550)
+        rule = existing_rule or {}
+
+        main_layout = QVBoxLayout(self)
+        form_layout = QFormLayout()
+        file_layout = QHBoxLayout()
+        self.path_edit = QLineEdit(rule.get("path", ""))
+        self.path_edit.editingFinished.connect(self._load_reference)
+        browse_button = QPushButton("Procurar...")
+        browse_button.clicked.connect(self.choose_file)
+        file_layout.addWidget(self.path_edit)
+        file_layout.addWidget(browse_button)
+        form_layout.addRow("Arquivo (CSV, TXT, Parquet, XLSX):", file_layout)
+        self.sheet_combo = QComboBox()
+        self.sheet_combo.currentTextChanged.connect(lambda _: self._load_columns())
+        form_layout.addRow("Aba:", self.sheet_combo)
+        self.delimiter_edit = QLineEdit(rule.get("delimiter") or ";")
+        self.delimiter_edit.setMaxLength(1)
+        self.delimiter_edit.editingFinished.connect(self._load_columns)
+        form_layout.addRow("Delimitador (CSV/TXT):", self.delimiter_edit)
+        self.key_combo = QComboBox()
+        self.key_combo.addItems(final_headers)
+        if rule.get("key") in final_headers:
+            self.key_combo.setCurrentText(rule["key"])
+        form_layout.addRow("Coluna-chave nos dados consolidados:", self.key_combo)
+        self.reference_key_combo = QComboBox()
+        form_layout.addRow("Coluna-chave na tabela de referência:", self.reference_key_combo)
+        self.digits_only_check_box = QCheckBox("Comparar apenas os dígitos (ignora pontuação e zeros à esquerda)")
+        self.digits_only_check_box.setToolTip("Útil para CNPJ, CPF e CFOP: '12.345.678/0001-90' passa a casar com '12345678000190'.")
+        self.digits_only_check_box.setChecked(rule.get("digits_only", False))
+        form_layout.addRow(self.digits_only_check_box)
+        self.prefix_edit = QLineEdit(rule.get("prefix", ""))
+        self.prefix_edit.setPlaceholderText("Opcional, ex.: 'Cadastro - '")
+        form_layout.addRow("Prefixo dos nomes das colunas novas:", self.prefix_edit)
+        main_layout.addLayout(form_layout)
+
+        main_layout.addWidget(QLabel("Colunas a trazer da tabela de referência:"))
+        self.columns_list = QListWidget()
+        main_layout.addWidget(self.columns_list)
+        self.status_label = QLabel()
+        main_layout.addWidget(self.status_label)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.validate_and_accept)
+        button_box.rejected.connect(self.reject)
+        main_layout.addWidget(button_box)
+
+        self._pending_rule = rule
+        self._load_reference(rule.get("sheet"))
+
+    def choose_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Selecionar Tabela de Referência", os.path.dirname(self.path_edit.text()), REFERENCE_FILE_FILTER)
+        if file_path:
+            self.path_edit.setText(file_path)
+            self._load_reference()
+
+    def _load_reference(self, sheet=None):
+        """Preenche as abas (para Excel) e as colunas do arquivo escolhido."""
+        path = self.path_edit.text().strip()
+        self.sheet_combo.blockSignals(True)
+        self.sheet_combo.clear()
+        try:
+            sheet_names = reference_sheet_names(path) if os.path.isfile(path) else []
+        except Exception as e:
+            sheet_names = []
+            self.status_label.setText(f"Não foi possível listar as abas: {e}")
+        self.sheet_combo.addItems(sheet_names)
+        if sheet in sheet_names:
+            self.sheet_combo.setCurrentText(sheet)
+        self.sheet_combo.setEnabled(bool(sheet_names))
+        self.sheet_combo.blockSignals(False)
+        self.delimiter_edit.setEnabled(path.lower().endswith((".csv", ".txt")))
+        self._load_columns()
+
+    def _load_columns(self):
+        path = self.path_edit.text().strip()
+        self.reference_key_combo.clear()
+        self.columns_list.clear()
+        if not os.path.isfile(path):
+            self.status_label.setText("Escolha o arquivo da tabela de referência." if not path else "Arquivo não encontrado.")
+            return
+        try:
+            columns = reference_columns(path, self.sheet_combo.currentText() or None, self.delimiter_edit.text() or ";")
+        except Exception as e:
+            self.status_label.setText(f"Não foi possível ler a tabela: {e}")
+            return
+        self.status_label.setText(f"{len(columns)} coluna(s) encontrada(s).")
+        # Ao reabrir uma regra, as escolhas salvas são restauradas uma única vez
+        rule, self._pending_rule = self._pending_rule, {}
+        self.reference_key_combo.addItems(columns)
+        if rule.get("reference_key") in columns:
+            self.reference_key_combo.setCurrentText(rule["reference_key"])
+        elif self.key_combo.currentText() in columns:
+            self.reference_key_combo.setCurrentText(self.key_combo.currentText())
+        selected = set(rule.get("columns", []))
+        for column in columns:
+            item = QListWidgetItem(column)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if column in selected else Qt.Unchecked)
+            self.columns_list.addItem(item)
+
+    def _selected_columns(self):
+        reference_key = self.reference_key_combo.currentText()
+        return [self.columns_list.item(i).text() for i in range(self.columns_list.count())
+                if self.columns_list.item(i).checkState() == Qt.Checked and self.columns_list.item(i).text() != reference_key]
+
+    def validate_and_accept(self):
+        if not os.path.isfile(self.path_edit.text().strip()):
+            QMessageBox.warning(self, "Tabela de Referência", "Escolha um arquivo existente.")
+            return
+        if not self.key_combo.currentText() or not self.reference_key_combo.currentText():
+            QMessageBox.warning(self, "Tabela de Referência", "Escolha as colunas-chave dos dados consolidados e da tabela de referência.")
+            return
+        if not self._selected_columns():
+            QMessageBox.warning(self, "Tabela de Referência", "Marque ao menos uma coluna (além da chave) para trazer da tabela.")
+            return
+        self.accept()
+
+    def get_rule(self):
+        return {
+            "path": self.path_edit.text().strip(),
+            "sheet": self.sheet_combo.currentText() or None,
+            "delimiter": self.delimiter_edit.text() or ";",
+            "key": self.key_combo.currentText(),
+            "reference_key": self.reference_key_combo.currentText(),
+            "columns": self._selected_columns(),
+            "prefix": self.prefix_edit.text(),
+            "digits_only": self.digits_only_check_box.isChecked(),
+        }
+
 class FilterDialog(QDialog):
     def __init__(self, final_headers, existing_filters=None, parent=None):
         super().__init__(parent)
@@ -241,6 +443,7 @@ class FilterDialog(QDialog):
         and_label = QLabel(" e ")
         value2_edit = QLineEdit()
         value2_edit.setPlaceholderText("Valor Máximo")
+        list_button = QPushButton() # Para os operadores de lista ("Está na lista", "Contém algum de")
         
         remove_button = QPushButton("X"); remove_button.setFixedWidth(30)
         
@@ -249,16 +452,19 @@ class FilterDialog(QDialog):
         row_layout.addWidget(value1_edit)
         row_layout.addWidget(and_label)
         row_layout.addWidget(value2_edit)
+        row_layout.addWidget(list_button)
         row_layout.addWidget(remove_button)
 
         # Guarda as referências aos widgets da linha para fácil acesso
-        row_widgets = {"widget": row_widget, "op_combo": operator_combo, "val1": value1_edit, "and_label": and_label, "val2": value2_edit}
+        row_widgets = {"widget": row_widget, "op_combo": operator_combo, "val1": value1_edit, "and_label": and_label, "val2": value2_edit,
+                       "list_button": list_button, "list_values": []}
         self.filter_rows.append(row_widgets)
 
         self.filters_layout.addWidget(row_widget)
 
         # Conecta o botão de remover
         remove_button.clicked.connect(lambda: self.remove_filter_row(row_widgets))
+        list_button.clicked.connect(lambda: self.edit_value_list(row_widgets))
         # Conecta a mudança do operador à lógica de visibilidade
         operator_combo.currentTextChanged.connect(lambda text: self._on_operator_changed(text, row_widgets))
         
@@ -266,7 +472,9 @@ class FilterDialog(QDialog):
         if filter_data:
             column_combo.setCurrentText(filter_data.get("column", ""))
             operator_combo.setCurrentText(filter_data.get("operator", ""))
-            if isinstance(filter_data.get("value"), list): # Se for "Entre"
+            if filter_data.get("operator") in OPERATORS_LIST_VALUE:
+                row_widgets["list_values"] = list(filter_data.get("value") or [])
+            elif isinstance(filter_data.get("value"), list): # Se for "Entre"
                 value1_edit.setText(filter_data["value"][0])
                 value2_edit.setText(filter_data["value"][1])
             else:
@@ -279,10 +487,23 @@ class FilterDialog(QDialog):
         """Ajusta a visibilidade dos campos de valor com base no operador."""
         is_between = (text == "Entre")
         is_no_value = (text in OPERATORS_NO_VALUE)
+        is_list = (text in OPERATORS_LIST_VALUE)
         
-        row_widgets["val1"].setVisible(not is_no_value)
+        row_widgets["val1"].setVisible(not is_no_value and not is_list)
         row_widgets["and_label"].setVisible(is_between)
         row_widgets["val2"].setVisible(is_between)
+        row_widgets["list_button"].setVisible(is_list)
+        self._update_list_button(row_widgets)
+
+    def _update_list_button(self, row_widgets):
+        row_widgets["list_button"].setText(f"Lista de valores ({len(row_widgets['list_values'])})...")
+
+    def edit_value_list(self, row_widgets):
+        """Abre o editor da lista de valores da linha (colar ou carregar de arquivo)."""
+        dialog = ValueListDialog(row_widgets["list_values"], self)
+        if dialog.exec() == QDialog.Accepted:
+            row_widgets["list_values"] = dialog.get_values()
+            self._update_list_button(row_widgets)
 
     def remove_filter_row(self, row_widget):
         """Remove uma linha de filtro da interface e da nossa lista de referência."""
@@ -303,6 +524,8 @@ class FilterDialog(QDialog):
                 val1 = row_data["val1"].text()
                 val2 = row_data["val2"].text()
                 value = [val1, val2] # Salva como uma lista
+            elif operator in OPERATORS_LIST_VALUE:
+                value = list(row_data["list_values"])
             else:
                 value = row_data["val1"].text()
 
@@ -313,6 +536,61 @@ class FilterDialog(QDialog):
             })
         return rules
 
+class ValueListDialog(QDialog):
+    """Editor de uma lista de valores de filtro: colados (um por linha) ou carregados de um arquivo de texto."""
+    def __init__(self, values=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Lista de Valores do Filtro")
+        self.setMinimumSize(450, 450)
+
+        main_layout = QVBoxLayout(self)
+        main_layout.addWidget(QLabel("Cole os valores, um por linha (células copiadas de uma planilha também servem), ou carregue de um arquivo de texto/CSV."))
+
+        self.values_edit = QPlainTextEdit()
+        self.values_edit.setPlainText("\n".join(values or []))
+        self.values_edit.textChanged.connect(self._update_count)
+        main_layout.addWidget(self.values_edit)
+
+        actions_layout = QHBoxLayout()
+        load_button = QPushButton("Carregar de Arquivo...")
+        load_button.clicked.connect(self.load_from_file)
+        clear_button = QPushButton("Limpar")
+        clear_button.clicked.connect(self.values_edit.clear)
+        self.count_label = QLabel()
+        actions_layout.addWidget(load_button)
+        actions_layout.addWidget(clear_button)
+        actions_layout.addStretch()
+        actions_layout.addWidget(self.count_label)
+        main_layout.addLayout(actions_layout)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        main_layout.addWidget(button_box)
+        self._update_count()
+
+    def _update_count(self):
+        self.count_label.setText(f"{len(self.get_values())} valor(es) distinto(s)")
+
+    def load_from_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Carregar Lista de Valores", "", "Arquivos de Texto (*.txt *.csv);;Todos os Arquivos (*)")
+        if not file_path:
+            return
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            QMessageBox.warning(self, "Erro ao Carregar", f"Não foi possível ler o arquivo:\n{e}")
+            return
+        try:
+            text = data.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            text = data.decode("latin-1")
+        self.values_edit.setPlainText("\n".join(split_value_list(text)))
+
+    def get_values(self):
+        return split_value_list(self.values_edit.toPlainText())
+
 class SplitGroupDialog(QDialog):
     """Um diálogo para dividir um grupo de cabeçalhos."""
     def __init__(self, group_to_split, parent = None):
@@ -356,9 +634,10 @@ class SplitGroupDialog(QDialog):
         return to_split
 
 class HeaderMappingDialog(QDialog):
-    def __init__(self, suggested_groups, parent=None, existing_mapping=None, existing_duplicate_keys=None):
+    def __init__(self, suggested_groups, parent=None, existing_mapping=None, existing_duplicate_keys=None, existing_duplicates_config=None):
         super().__init__(parent)
         self.setWindowTitle("Mapeamento e Agrupamento de Cabeçalhos")
+        existing_duplicates_config = existing_duplicates_config or {}
         self.setMinimumSize(950, 600)
 
         self.groups = suggested_groups
@@ -424,6 +703,27 @@ class HeaderMappingDialog(QDialog):
         self.report_duplicates_checkbox.setChecked(True)
         duplicates_layout.addWidget(self.report_duplicates_checkbox)
 
+        self.persistent_index_checkbox = QCheckBox("Manter índice de chaves entre execuções (descarta linhas já entregues em consolidações anteriores).")
+        self.persistent_index_checkbox.setToolTip("Os hashes das chaves entregues ficam gravados em disco e são consultados nas próximas execuções.")
+        self.persistent_index_checkbox.setChecked(existing_duplicates_config.get("persistent_index", False))
+        duplicates_layout.addWidget(self.persistent_index_checkbox)
+
+        index_layout = QHBoxLayout()
+        index_layout.addWidget(QLabel("Pasta do índice:"))
+        self.index_dir_input = QLineEdit(existing_duplicates_config.get("index_dir", ""))
+        self.index_dir_input.setPlaceholderText("(ao lado do arquivo de saída)")
+        index_layout.addWidget(self.index_dir_input)
+        self.index_dir_button = QPushButton("Procurar...")
+        self.index_dir_button.clicked.connect(self.choose_index_dir)
+        index_layout.addWidget(self.index_dir_button)
+        self.bloom_filter_checkbox = QCheckBox("Usar filtro de Bloom")
+        self.bloom_filter_checkbox.setToolTip("Descarta de imediato as chaves certamente novas, sem ler o índice completo.")
+        self.bloom_filter_checkbox.setChecked(existing_duplicates_config.get("bloom_filter", True))
+        index_layout.addWidget(self.bloom_filter_checkbox)
+        duplicates_layout.addLayout(index_layout)
+        self.persistent_index_checkbox.toggled.connect(self._update_index_controls)
+        self._update_index_controls(self.persistent_index_checkbox.isChecked())
+
         self.duplicate_check_list = QListWidget()
         self.duplicate_check_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         # Popula a lista com os nomes finais sugeridos
@@ -458,9 +758,21 @@ class HeaderMappingDialog(QDialog):
         generate_report = self.report_duplicates_checkbox.isChecked()
         return {
             "key_columns": key_columns,
-            "generate_report": generate_report
+            "generate_report": generate_report,
+            "persistent_index": self.persistent_index_checkbox.isChecked(),
+            "index_dir": self.index_dir_input.text().strip(),
+            "bloom_filter": self.bloom_filter_checkbox.isChecked(),
         }
 
+    def _update_index_controls(self, enabled):
+        for widget in (self.index_dir_input, self.index_dir_button, self.bloom_filter_checkbox):
+            widget.setEnabled(enabled)
+
+    def choose_index_dir(self):
+        folder_path = QFileDialog.getExistingDirectory(self, "Selecionar Pasta do Índice de Chaves", self.index_dir_input.text() or os.getcwd())
+        if folder_path:
+            self.index_dir_input.setText(folder_path)
+
     def populate_table(self):
         """Limpa e preenche a tabela com base na lista self.groups atual."""
         self.table_widget.setRowCount(0) # Limpa a tabela
@@ -683,6 +995,7 @@ class HelpDialog(QDialog):
                     <li>Regras para <b>colunas diferentes</b> são combinadas com <b>E</b> (ex: `(Nome = "João") E (Status = "Ativo")`).</li>
                     <li>Regras de exclusão ('Não contém', 'Diferente de') são aplicadas após as de inclusão.</li>
                 </ul>
+                <p><b>Listas de valores:</b> Para filtrar por muitos valores (ex: milhares de CNPJs), use 'Está na lista' ou 'Contém algum de' e cole a lista ou carregue-a de um arquivo de texto. A lista inteira é avaliada de uma só vez, muito mais rápido que uma regra para cada valor.</p>
                 <p>Isso permite criar filtros complexos, como 'incluir todas as Compras e Vendas, mas não incluir as que forem Vendas de Ativos'.</p>
             """,
             "4. Consolidação e Saída": """
@@ -694,7 +1007,19 @@ class HelpDialog(QDialog):
                     <li><b>Estilo Profissional:</b> O cabeçalho é formatado com um fundo escuro e texto claro.</li>
                     <li><b>Múltiplas Abas:</b> Se o resultado tiver mais de ~1 milhão de linhas, ele será automaticamente dividido em múltiplas abas ('Dados_Parte_1', 'Dados_Parte_2', etc.).</li>
                     <li><b>Formatação Adicional:</b> A planilha vem com painéis congelados, zoom ajustado e sem linhas de grade para uma melhor visualização.</li>
+                    <li><b>Aba 'Qualidade':</b> Se algum valor preenchido não puder ser convertido para o tipo escolhido (ex.: 'abc' numa coluna Decimal) e ficar em branco, esta aba mostra, por arquivo e coluna, quantos valores foram perdidos e alguns exemplos. Nos demais formatos o mesmo relatório é salvo ao lado da saída, em '<i>nome</i>_qualidade.csv'.</li>
+                </ul>
+            """,
+            "5. Tabelas de Referência": """
+                <h2>5. Enriquecimento com Tabelas de Referência</h2>
+                <p>Em 'Enriquecer com Tabelas...' você pode trazer colunas de tabelas locais (CSV, TXT, Parquet ou Excel) para os dados consolidados, como a razão social e o segmento de cada CNPJ ou a descrição de cada CFOP.</p>
+                <ul>
+                    <li>Escolha a coluna-chave dos dados consolidados, a coluna correspondente na tabela e as colunas a trazer.</li>
+                    <li><b>Comparar apenas os dígitos:</b> faz '12.345.678/0001-90' casar com '12345678000190' e '5.102' com '5102'.</li>
+                    <li>Se uma chave aparecer mais de uma vez na tabela, vale a primeira ocorrência; linhas sem correspondência ficam com as colunas novas em branco.</li>
+                    <li>As colunas novas podem ser usadas na Tabela de Resumo (ex.: somar valores por segmento).</li>
                 </ul>
+                <p>Tabelas CSV/TXT e Excel são convertidas para Parquet na primeira execução e reaproveitadas nas seguintes, enquanto o arquivo não mudar.</p>
             """,
         }
 
@@ -820,3 +1145,234 @@ class SheetSelectionDialog(QDialog):
             return {}
             
         return {"mode": mode, "names": selected_names}
+
+
+class OutputOptionsDialog(QDialog):
+    """Diálogo com as opções específicas dos formatos de saída (CSV, dataset Parquet particionado e Arrow IPC)."""
+    NO_DATE_COLUMN = "(nenhuma)"
+    IPC_COMPRESSIONS = ["uncompressed", "lz4", "zstd"]
+    CSV_SEPARATORS = {"Barra vertical (|)": "|", "Ponto e vírgula (;)": ";", "Vírgula (,)": ",", "Tabulação": "\t"}
+    CSV_QUOTE_STYLES = {"Quando necessário": "necessary", "Sempre": "always", "Apenas textos": "non_numeric", "Nunca": "never"}
+    CSV_COMPRESSIONS = {"Nenhuma": "uncompressed", "gzip (.gz)": "gzip", "zstd (.zst)": "zstd"}
+
+    def __init__(self, final_headers, existing_options=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Opções de Saída")
+        self.setMinimumSize(500, 520)
+        existing_options = existing_options or {}
+        dataset_options = existing_options.get("dataset", {})
+        ipc_options = existing_options.get("ipc", {})
+        csv_options = existing_options.get("csv", {})
+
+        layout = QVBoxLayout(self)
+
+        # --- Saídas múltiplas ---
+        outputs_box = QGroupBox("Resultados")
+        outputs_layout = QVBoxLayout(outputs_box)
+        self.multi_output_check_box = QCheckBox("Gravar dados consolidados, tabela de resumo e duplicatas removidas em arquivos separados")
+        self.multi_output_check_box.setToolTip("Para CSV, Parquet e Arrow IPC. Os arquivos adicionais recebem os sufixos _resumo e _duplicatas. No XLSX os três já saem em abas do mesmo arquivo.")
+        self.multi_output_check_box.setChecked(existing_options.get("multi_output", False))
+        outputs_layout.addWidget(self.multi_output_check_box)
+        layout.addWidget(outputs_box)
+
+        # --- CSV ---
+        csv_box = QGroupBox("CSV")
+        csv_layout = QFormLayout(csv_box)
+        self.csv_separator_combo = self._create_choice_combo(self.CSV_SEPARATORS, csv_options.get("separator", "|"))
+        self.csv_quote_combo = self._create_choice_combo(self.CSV_QUOTE_STYLES, csv_options.get("quote_style", "necessary"))
+        self.csv_compression_combo = self._create_choice_combo(self.CSV_COMPRESSIONS, csv_options.get("compression", "uncompressed"))
+        self.csv_decimal_comma_check_box = QCheckBox("Usar vírgula como separador decimal (1234,56)")
+        self.csv_decimal_comma_check_box.setChecked(csv_options.get("decimal_comma", False))
+        self.csv_parts_spin_box = QSpinBox()
+        self.csv_parts_spin_box.setRange(1, 256)
+        self.csv_parts_spin_box.setValue(csv_options.get("parts", 1))
+        self.csv_parts_spin_box.setToolTip("Com mais de uma parte, as linhas são divididas em arquivos nome.part001.csv, nome.part002.csv... gravados em paralelo.")
+        csv_layout.addRow("Separador:", self.csv_separator_combo)
+        csv_layout.addRow("Aspas:", self.csv_quote_combo)
+        csv_layout.addRow("Compressão:", self.csv_compression_combo)
+        csv_layout.addRow("Número de arquivos:", self.csv_parts_spin_box)
+        csv_layout.addRow(self.csv_decimal_comma_check_box)
+        layout.addWidget(csv_box)
+
+        # --- Dataset Parquet particionado ---
+        dataset_box = QGroupBox("Parquet (Dataset) - Partições")
+        dataset_layout = QVBoxLayout(dataset_box)
+
+        date_layout = QFormLayout()
+        self.date_column_combo = QComboBox()
+        self.date_column_combo.addItems([self.NO_DATE_COLUMN] + list(final_headers))
+        self.date_column_combo.setToolTip("Gera as partições Ano=/Mes= a partir desta coluna de data.")
+        if dataset_options.get("date_column") in final_headers:
+            self.date_column_combo.setCurrentText(dataset_options["date_column"])
+        date_layout.addRow("Particionar por Ano/Mês da coluna:", self.date_column_combo)
+        dataset_layout.addLayout(date_layout)
+
+        dataset_layout.addWidget(QLabel("Particionar também pelas colunas (na ordem da lista):"))
+        self.partition_list = QListWidget()
+        selected_partitions = dataset_options.get("partition_columns", [])
+        for name in list(final_headers) + ["Origem"]:
+            item = QListWidgetItem(name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if name in selected_partitions else Qt.Unchecked)
+            self.partition_list.addItem(item)
+        dataset_layout.addWidget(self.partition_list)
+        layout.addWidget(dataset_box)
+
+        parquet_box = QGroupBox("Parquet (Dataset) - Arquivos")
+        parquet_layout = QFormLayout(parquet_box)
+        self.row_group_spin_box = QSpinBox()
+        self.row_group_spin_box.setRange(0, 10_000_000)
+        self.row_group_spin_box.setSingleStep(50_000)
+        self.row_group_spin_box.setSpecialValueText("Padrão")
+        self.row_group_spin_box.setValue(dataset_options.get("row_group_size") or 0)
+        self.compression_level_spin_box = QSpinBox()
+        self.compression_level_spin_box.setRange(0, 22)
+        self.compression_level_spin_box.setSpecialValueText("Padrão")
+        self.compression_level_spin_box.setValue(dataset_options.get("compression_level") or 0)
+        self.statistics_check_box = QCheckBox("Gravar estatísticas das colunas (mín./máx./nulos)")
+        self.statistics_check_box.setChecked(dataset_options.get("statistics", True))
+        parquet_layout.addRow("Linhas por grupo (row group):", self.row_group_spin_box)
+        parquet_layout.addRow("Nível de compressão (zstd):", self.compression_level_spin_box)
+        parquet_layout.addRow(self.statistics_check_box)
+        layout.addWidget(parquet_box)
+
+        # --- Arrow IPC ---
+        ipc_box = QGroupBox("Arrow IPC (Feather)")
+        ipc_layout = QFormLayout(ipc_box)
+        self.ipc_compression_combo = QComboBox()
+        self.ipc_compression_combo.addItems(self.IPC_COMPRESSIONS)
+        self.ipc_compression_combo.setCurrentText(ipc_options.get("compression", "uncompressed"))
+        self.ipc_compression_combo.setToolTip("Sem compressão o arquivo é lido mapeado em memória, sem cópia. lz4/zstd reduzem o tamanho, mas exigem descompressão.")
+        ipc_layout.addRow("Compressão dos buffers:", self.ipc_compression_combo)
+        layout.addWidget(ipc_box)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+    def _create_choice_combo(self, choices, current_value):
+        """Combo com rótulos amigáveis cujo valor interno fica em itemData."""
+        combo = QComboBox()
+        for label, value in choices.items():
+            combo.addItem(label, value)
+        index = combo.findData(current_value)
+        combo.setCurrentIndex(index if index >= 0 else 0)
+        return combo
+
+    def get_options(self):
+        """Retorna as opções no formato esperado pelo ConsolidationWorker (`output_options`)."""
+        date_column = self.date_column_combo.currentText()
+        partition_columns = []
+        for i in range(self.partition_list.count()):
+            item = self.partition_list.item(i)
+            if item.checkState() == Qt.Checked:
+                partition_columns.append(item.text())
+        return {
+            "multi_output": self.multi_output_check_box.isChecked(),
+            "csv": {
+                "separator": self.csv_separator_combo.currentData(),
+                "quote_style": self.csv_quote_combo.currentData(),
+                "decimal_comma": self.csv_decimal_comma_check_box.isChecked(),
+                "compression": self.csv_compression_combo.currentData(),
+                "parts": self.csv_parts_spin_box.value(),
+            },
+            "dataset": {
+                "date_column": None if date_column == self.NO_DATE_COLUMN else date_column,
+                "partition_columns": partition_columns,
+                "row_group_size": self.row_group_spin_box.value() or None,
+                "compression_level": self.compression_level_spin_box.value() or None,
+                "statistics": self.statistics_check_box.isChecked(),
+            },
+            "ipc": {
+                "compression": self.ipc_compression_combo.currentText(),
+            },
+        }
+
+
+class ScanOptionsDialog(QDialog):
+    """Diálogo com as regras de varredura da pasta de entrada (subpastas, padrões, tamanho e data)."""
+    def __init__(self, existing_options=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Opções de Varredura da Pasta")
+        self.setMinimumWidth(520)
+        existing_options = existing_options or {}
+
+        layout = QVBoxLayout(self)
+        form_layout = QFormLayout()
+
+        self.recursive_check_box = QCheckBox("Incluir subpastas")
+        self.recursive_check_box.setChecked(existing_options.get("recursive", True))
+        form_layout.addRow(self.recursive_check_box)
+
+        self.include_line_edit = QLineEdit("; ".join(existing_options.get("include", [])))
+        self.include_line_edit.setPlaceholderText("ex.: vendas_*.csv; 2024/*  (vazio = todos)")
+        self.exclude_line_edit = QLineEdit("; ".join(existing_options.get("exclude", [])))
+        self.exclude_line_edit.setPlaceholderText("ex.: backup; *_old.xlsx")
+        self.exclude_line_edit.setToolTip("Pastas que atendem a um padrão de exclusão não são percorridas.")
+        self.use_regex_check_box = QCheckBox("Padrões são expressões regulares (aplicadas ao caminho relativo)")
+        self.use_regex_check_box.setChecked(existing_options.get("use_regex", False))
+        form_layout.addRow("Incluir (separe com ;):", self.include_line_edit)
+        form_layout.addRow("Excluir (separe com ;):", self.exclude_line_edit)
+        form_layout.addRow(self.use_regex_check_box)
+
+        self.min_size_spin_box = QSpinBox()
+        self.min_size_spin_box.setRange(0, 10_485_760)
+        self.min_size_spin_box.setSuffix(" KB")
+        self.min_size_spin_box.setSpecialValueText("Sem limite")
+        self.min_size_spin_box.setValue(existing_options.get("min_size_kb", 0))
+        self.max_size_spin_box = QSpinBox()
+        self.max_size_spin_box.setRange(0, 1_048_576)
+        self.max_size_spin_box.setSuffix(" MB")
+        self.max_size_spin_box.setSpecialValueText("Sem limite")
+        self.max_size_spin_box.setValue(existing_options.get("max_size_mb", 0))
+        form_layout.addRow("Tamanho mínimo:", self.min_size_spin_box)
+        form_layout.addRow("Tamanho máximo:", self.max_size_spin_box)
+
+        self.modified_after_check_box, self.modified_after_edit = self._create_date_filter(existing_options.get("modified_after"))
+        self.modified_before_check_box, self.modified_before_edit = self._create_date_filter(existing_options.get("modified_before"))
+        form_layout.addRow("Modificados a partir de:", self._date_filter_row(self.modified_after_check_box, self.modified_after_edit))
+        form_layout.addRow("Modificados até:", self._date_filter_row(self.modified_before_check_box, self.modified_before_edit))
+        layout.addLayout(form_layout)
+
+        self.button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        self.button_box.accepted.connect(self.accept)
+        self.button_box.rejected.connect(self.reject)
+        layout.addWidget(self.button_box)
+
+    @staticmethod
+    def _create_date_filter(current_value):
+        check_box = QCheckBox()
+        date_edit = QDateEdit(QDate.fromString(current_value, Qt.ISODate) if current_value else QDate.currentDate())
+        date_edit.setCalendarPopup(True)
+        date_edit.setDisplayFormat("dd/MM/yyyy")
+        check_box.setChecked(bool(current_value))
+        date_edit.setEnabled(bool(current_value))
+        check_box.toggled.connect(date_edit.setEnabled)
+        return check_box, date_edit
+
+    @staticmethod
+    def _date_filter_row(check_box, date_edit):
+        row = QWidget()
+        row_layout = QHBoxLayout(row)
+        row_layout.setContentsMargins(0, 0, 0, 0)
+        row_layout.addWidget(check_box)
+        row_layout.addWidget(date_edit)
+        row_layout.addStretch()
+        return row
+
+    @staticmethod
+    def _split_patterns(text):
+        return [pattern.strip() for pattern in text.split(";") if pattern.strip()]
+
+    def get_options(self):
+        return {
+            "recursive": self.recursive_check_box.isChecked(),
+            "include": self._split_patterns(self.include_line_edit.text()),
+            "exclude": self._split_patterns(self.exclude_line_edit.text()),
+            "use_regex": self.use_regex_check_box.isChecked(),
+            "min_size_kb": self.min_size_spin_box.value(),
+            "max_size_mb": self.max_size_spin_box.value(),
+            "modified_after": self.modified_after_edit.date().toString(Qt.ISODate) if self.modified_after_check_box.isChecked() else None,
+            "modified_before": self.modified_before_edit.date().toString(Qt.ISODate) if self.modified_before_check_box.isChecked() else None,
+        }
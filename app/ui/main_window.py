@@ -1,13 +1,13 @@
 import sys
 import os
-import glob
 import json
 import polars as pl
 
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit,
     QLabel, QListWidget, QComboBox, QProgressBar, QTextEdit, QFileDialog,
-    QTabWidget, QTableView, QGroupBox, QStyle, QListWidgetItem, QDialog
+    QTabWidget, QTableView, QGroupBox, QStyle, QListWidgetItem, QDialog, QSpinBox,
+    QCheckBox
 )
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QIcon, QAction, QTextCursor
@@ -15,13 +15,18 @@ from PySide6.QtSvgWidgets import QSvgWidget
 
 # Importações da nova estrutura de projeto
 from .dialogs import (
-    PivotDialog, FilterDialog, HeaderMappingDialog, HelpDialog, SheetSelectionDialog
+    PivotDialog, FilterDialog, HeaderMappingDialog, HelpDialog, SheetSelectionDialog,
+    OutputOptionsDialog, ScanOptionsDialog, EnrichmentDialog
 )
 from .models import PolarsTableModel
 from ..logic.workers import (
-    ConsolidationWorker, SheetLoadingWorker, SheetAnalysisWorker, HeaderAnalysisWorker
+    ConsolidationWorker, SheetLoadingWorker, SheetAnalysisWorker, HeaderAnalysisWorker,
+    FolderScanWorker, FolderWatchWorker, _workbook_sheet_names
 )
-from ..utils import LogLevel, CONFIG_FILE_NAME, _find_header_row_index, _make_headers_unique
+from ..logic.recipes import HeaderRuleSet, build_recipe, save_recipe, load_recipe, RECIPE_FILE_EXTENSION, RECIPE_FILE_FILTER
+from ..logic.enrichment import enrichment_output_columns
+from ..logic.readers import IPC_EXTENSIONS, is_ipc_file, ipc_preview_raw, read_csv_raw, read_excel_raw
+from ..utils import LogLevel, CONFIG_FILE_NAME, FINGERPRINT_CACHE_FILE_NAME, HEADER_PROFILE_CACHE_FILE_NAME, UTF8_CACHE_DIR_NAME, REFERENCE_CACHE_DIR_NAME, _find_header_row_index, _make_headers_unique
 
 
 class MainWindow(QMainWindow):
@@ -31,10 +36,29 @@ class MainWindow(QMainWindow):
         self.header_mapping = {}
         self.filter_rules = []
         self.pivot_rules = {}
+        self.enrichment_rules = [] # Tabelas de referência juntadas aos dados consolidados
+        self.output_options = {}
         self.duplicate_key_columns = []
+        self.duplicates_config = {}
         self.sheet_selection_rules = {}
         self.all_sheets_cache = {}
+        self.source_catalog = {} # Perfis de cabeçalho da última análise, reaproveitados na consolidação
+        self.active_recipe = None # Receita carregada; reaplicada a cada nova listagem de pasta
+        self.recipe_mapping = {}  # Regras de cabeçalho por nome/padrão vindas da receita
         menu_bar = self.menuBar()
+
+        # Menu "Receitas"
+        recipes_menu = menu_bar.addMenu("&Receitas")
+        self.open_recipe_action = QAction("Abrir Receita...", self)
+        self.open_recipe_action.triggered.connect(self.open_recipe)
+        recipes_menu.addAction(self.open_recipe_action)
+        self.save_recipe_action = QAction("Salvar Receita...", self)
+        self.save_recipe_action.triggered.connect(self.save_recipe)
+        recipes_menu.addAction(self.save_recipe_action)
+        self.discard_recipe_action = QAction("Descartar Receita", self)
+        self.discard_recipe_action.triggered.connect(self.discard_recipe)
+        self.discard_recipe_action.setEnabled(False)
+        recipes_menu.addAction(self.discard_recipe_action)
         
         # Menu "Ajuda"
         help_menu = menu_bar.addMenu("&Ajuda") # O & cria um atalho (Alt+A)
@@ -45,7 +69,12 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("DataFlow")
         self.setGeometry(100, 100, 1000, 750) 
 
-        self.current_files_paths = {}
+        self.current_files_paths = {} # caminho completo -> caminho exibido (relativo à pasta selecionada)
+        self.scan_options = {}
+        self.folder_scan_worker = None
+        self.folder_watch_worker = None
+        self.watch_pending_files = [] # Arquivos prontos que chegaram durante uma consolidação em andamento
+        self.watch_run_files = []     # Arquivos que dispararam a consolidação incremental atual
         self.output_file_path = "" 
         self.consolidation_thread = None
         self.sheet_loader_thread = None
@@ -89,6 +118,11 @@ class MainWindow(QMainWindow):
         self.refresh_button.setEnabled(False)
         self.refresh_button.setToolTip("Atualiza a lista de arquivos da pasta selecionada.")
 
+        self.scan_options_button = QPushButton("Varredura...")
+        self.scan_options_button.setIcon(self.style().standardIcon(QStyle.SP_FileDialogDetailedView))
+        self.scan_options_button.clicked.connect(self.open_scan_options_dialog)
+        self.scan_options_button.setToolTip("Subpastas, padrões de inclusão/exclusão e filtros de tamanho e data para a listagem de arquivos.")
+
         # BOTÃO para mapear cabeçalhos
         self.map_headers_button = QPushButton("Analisar/Mapear Cabeçalhos")
         header_icon = self.style().standardIcon(QStyle.SP_FileDialogContentsView)
@@ -115,12 +149,19 @@ class MainWindow(QMainWindow):
         self.pivot_button.clicked.connect(self.open_pivot_dialog)
         self.pivot_button.setEnabled(False)
         self.pivot_button.setToolTip("Cria uma tabela resumo (dinâmica) a partir dos dados consolidados.")
+
+        self.enrichment_button = QPushButton("Enriquecer com Tabelas...")
+        self.enrichment_button.setIcon(self.style().standardIcon(QStyle.SP_FileLinkIcon))
+        self.enrichment_button.clicked.connect(self.open_enrichment_dialog)
+        self.enrichment_button.setEnabled(False)
+        self.enrichment_button.setToolTip("Traz colunas de tabelas de referência locais (ex.: razão social pelo CNPJ, descrição do CFOP).")
         
         folder_selection_layout.addWidget(logo_widget)
         folder_selection_layout.addWidget(self.folder_path_label)
         folder_selection_layout.addWidget(self.folder_path_line_edit)
         folder_selection_layout.addWidget(self.select_folder_button)
         folder_selection_layout.addWidget(self.refresh_button)
+        folder_selection_layout.addWidget(self.scan_options_button)
         main_layout.addLayout(folder_selection_layout)
 
         config_buttons_layout = QHBoxLayout()   
@@ -128,6 +169,7 @@ class MainWindow(QMainWindow):
         config_buttons_layout.addWidget(self.map_headers_button)
         config_buttons_layout.addWidget(self.sheet_selection_button)
         config_buttons_layout.addWidget(self.define_filters_button)
+        config_buttons_layout.addWidget(self.enrichment_button)
         config_buttons_layout.addWidget(self.pivot_button)
         config_buttons_layout.addStretch() # Empurra os botões para a esquerda
         main_layout.addLayout(config_buttons_layout)
@@ -151,6 +193,14 @@ class MainWindow(QMainWindow):
         options_layout.addWidget(delimiter_label)
         options_layout.addWidget(self.delimiter_combo)
         options_layout.addWidget(self.delimiter_custom_edit)
+        options_layout.addSpacing(20)
+        self.skip_identical_files_check_box = QCheckBox("Ignorar arquivos idênticos")
+        self.skip_identical_files_check_box.setToolTip("Arquivos com conteúdo byte a byte igual ao de outro arquivo da lista (ex.: 'relatorio (1).xlsx') não são processados.")
+        self.skip_identical_files_check_box.setChecked(True)
+        options_layout.addWidget(self.skip_identical_files_check_box)
+        self.utf8_cache_check_box = QCheckBox("Manter cópia UTF-8")
+        self.utf8_cache_check_box.setToolTip("CSV/TXT que não estão em UTF-8 são convertidos uma única vez para uma cópia em cache; as próximas leituras usam a cópia, com o leitor nativo (mais rápido e com menos memória).")
+        options_layout.addWidget(self.utf8_cache_check_box)
         options_layout.addStretch() # Empurra tudo para a esquerda
         self.options_group_box.setLayout(options_layout)
         main_layout.addWidget(self.options_group_box)
@@ -159,7 +209,7 @@ class MainWindow(QMainWindow):
         middle_section_layout = QHBoxLayout()
         left_panel_layout = QVBoxLayout()
         
-        self.files_label = QLabel("Arquivos Encontrados (.xlsx, .csv, .xls, .txt):")
+        self.files_label = QLabel("Arquivos Encontrados (.xlsx, .csv, .xls, .txt, .arrow), com o caminho relativo à pasta:")
         self.files_list_widget = QListWidget()
         self.files_list_widget.currentItemChanged.connect(self.on_file_selected_for_preview)
         
@@ -227,17 +277,31 @@ class MainWindow(QMainWindow):
         
         self.output_format_label = QLabel("Formato:")
         self.output_format_combo_box = QComboBox()
-        self.output_format_combo_box.addItems(["XLSX", "CSV", "Parquet"])
+        self.output_format_combo_box.addItems(["XLSX", "CSV", "Parquet", "Parquet (Dataset)", "Arrow IPC"])
         self.output_format_combo_box.currentTextChanged.connect(self.update_output_filename_extension)
         
         self.save_as_button = QPushButton("Salvar Como...")
         self.save_as_button.clicked.connect(self.open_save_file_dialog)
 
+        self.output_options_button = QPushButton("Opções de Saída...")
+        self.output_options_button.clicked.connect(self.open_output_options_dialog)
+        self.output_options_button.setToolTip("Separador, compressão e divisão do CSV, partições do dataset Parquet e compressão do Arrow IPC.")
+
+        self.memory_budget_label = QLabel("Limite de Memória (MB):")
+        self.memory_budget_spin_box = QSpinBox()
+        self.memory_budget_spin_box.setRange(0, 1_048_576)
+        self.memory_budget_spin_box.setSingleStep(512)
+        self.memory_budget_spin_box.setSpecialValueText("Sem limite") # Exibido quando o valor é 0
+        self.memory_budget_spin_box.setToolTip("Acima deste limite, os dados já processados de cada arquivo/aba são despejados em disco e as etapas finais rodam em streaming.")
+
         output_config_layout.addWidget(self.output_name_label)
         output_config_layout.addWidget(self.output_name_line_edit)
         output_config_layout.addWidget(self.output_format_label)
         output_config_layout.addWidget(self.output_format_combo_box)
         output_config_layout.addWidget(self.save_as_button)
+        output_config_layout.addWidget(self.output_options_button)
+        output_config_layout.addWidget(self.memory_budget_label)
+        output_config_layout.addWidget(self.memory_budget_spin_box)
         main_layout.addLayout(output_config_layout)
 
         # --- 4. Seção de Ação e Progresso ---
@@ -252,13 +316,20 @@ class MainWindow(QMainWindow):
 
         self.consolidate_button = QPushButton("Iniciar Consolidação")
         self.consolidate_button.setObjectName("consolidate_button")
-        self.consolidate_button.clicked.connect(self.start_consolidation) 
+        self.consolidate_button.clicked.connect(lambda: self.start_consolidation()) 
+
+        self.watch_button = QPushButton("Monitorar Pasta")
+        self.watch_button.setCheckable(True)
+        self.watch_button.setIcon(self.style().standardIcon(QStyle.SP_BrowserReload))
+        self.watch_button.setToolTip("Consolida automaticamente (de forma incremental, na saída atual) os arquivos novos ou alterados que chegarem à pasta, com o mapeamento, filtros e resumo já definidos.")
+        self.watch_button.toggled.connect(self.toggle_folder_watch)
 
         self.cancel_button = QPushButton("Cancelar")
         self.cancel_button.clicked.connect(self.cancel_consolidation)
         self.cancel_button.setVisible(False) 
 
         buttons_layout = QHBoxLayout() 
+        buttons_layout.addWidget(self.watch_button)
         buttons_layout.addWidget(self.consolidate_button)
         buttons_layout.addWidget(self.cancel_button)
         
@@ -274,19 +345,15 @@ class MainWindow(QMainWindow):
     
     def open_pivot_dialog(self):
         """Abre o diálogo de configuração da tabela de resumo."""
-        if not self.header_mapping:
-            self.log_message("Por favor, analise e mapeie os cabeçalhos primeiro.", LogLevel.WARNING)
+        if not self.header_mapping and not self.recipe_mapping:
+            self.log_message("Por favor, analise e mapeie os cabeçalhos (ou carregue uma receita) primeiro.", LogLevel.WARNING)
             return
 
         # Coleta os nomes e tipos das colunas finais
-        final_headers_info = {}
-        for map_info in self.header_mapping.values():
-            if map_info.get('include'):
-                final_name = map_info['final_name']
-                type_str = map_info['type_str']
-                final_headers_info[final_name] = type_str
+        final_headers_info = self._final_headers_info()
         
-        all_final_headers = sorted(list(final_headers_info.keys()))
+        # As colunas trazidas pelas tabelas de referência também podem agrupar o resumo
+        all_final_headers = sorted(set(final_headers_info) | self._enriched_headers())
         numeric_types = {"Inteiro", "Decimal (Float)"}
         numeric_headers = sorted([h for h, t in final_headers_info.items() if t in numeric_types])
 
@@ -301,13 +368,40 @@ class MainWindow(QMainWindow):
             else:
                 self.log_message("Regras da tabela de resumo foram limpas.", LogLevel.INFO)
 
+    def _enriched_headers(self):
+        return {name for rule in self.enrichment_rules for name in enrichment_output_columns(rule).values()}
+
+    def open_enrichment_dialog(self):
+        """Abre o diálogo das tabelas de referência usadas para enriquecer os dados consolidados."""
+        if not self.header_mapping and not self.recipe_mapping:
+            self.log_message("Por favor, analise e mapeie os cabeçalhos (ou carregue uma receita) primeiro.", LogLevel.WARNING)
+            return
+        final_headers = sorted(self._final_headers_info())
+        if not final_headers:
+            self.log_message("Nenhum cabeçalho final encontrado no mapeamento. Impossível escolher a coluna-chave.", LogLevel.WARNING)
+            return
+        dialog = EnrichmentDialog(final_headers, self.enrichment_rules, self)
+        if dialog.exec() == QDialog.Accepted:
+            self.enrichment_rules = dialog.get_rules()
+            self.log_message(f"Enriquecimento atualizado. {len(self.enrichment_rules)} tabela(s) de referência.", LogLevel.SUCCESS)
+
+    def open_output_options_dialog(self):
+        """Abre o diálogo de opções dos formatos de saída (partições do dataset Parquet)."""
+        final_headers = sorted(self._final_headers_info())
+        if not final_headers:
+            self.log_message("Nenhum cabeçalho mapeado: apenas a coluna 'Origem' estará disponível para particionar.", LogLevel.INFO)
+        dialog = OutputOptionsDialog(final_headers, self.output_options, self)
+        if dialog.exec() == QDialog.Accepted:
+            self.output_options = dialog.get_options()
+            self.log_message("Opções de saída atualizadas.", LogLevel.SUCCESS)
+
     def open_sheet_selection_dialog(self):
         """Inicia a análise de todas as abas em uma thread e abre o diálogo de seleção ao concluir."""
         if self.sheet_analysis_worker and self.sheet_analysis_worker.isRunning():
             self.log_message("A análise de abas já está em andamento.", LogLevel.INFO)
             return
 
-        excel_files = [path for path in self.current_files_paths.values() if path.lower().endswith((".xlsx", ".xls"))]
+        excel_files = [path for path in self.current_files_paths if path.lower().endswith((".xlsx", ".xls"))]
         if not excel_files:
             self.log_message("Nenhum arquivo Excel encontrado na pasta para analisar as abas.", LogLevel.WARNING)
             return
@@ -397,7 +491,7 @@ class MainWindow(QMainWindow):
             item.setCheckState(check_state)
             current_file_item = self.files_list_widget.currentItem()
             if current_file_item:
-                file_path = self.current_files_paths.get(current_file_item.text())
+                file_path = current_file_item.data(Qt.UserRole)
                 if file_path and file_path in self.sheet_selections:
                     self.sheet_selections[file_path][item.text()] = (check_state == Qt.Checked)
         self.sheets_list_widget.itemChanged.connect(self.on_sheet_selection_changed)
@@ -486,9 +580,10 @@ class MainWindow(QMainWindow):
             return
         self.define_filters_button.setEnabled(False)
         self.pivot_button.setEnabled(False)
+        self.enrichment_button.setEnabled(False)
 
         self.filter_rules.clear()
-        self.header_analyzer_thread = HeaderAnalysisWorker(files_and_sheets_config, selected_delimiter)
+        self.header_analyzer_thread = HeaderAnalysisWorker(files_and_sheets_config, selected_delimiter, profile_cache_path=os.path.join(os.path.dirname(self._get_config_path()), HEADER_PROFILE_CACHE_FILE_NAME))
         self.header_analyzer_thread.finished.connect(self.on_header_analysis_finished)
         self.header_analyzer_thread.progress_log.connect(self.log_message)
         self.header_analyzer_thread.start()
@@ -563,6 +658,8 @@ class MainWindow(QMainWindow):
         """Chamado quando a HeaderAnalysisWorker termina."""
         self.map_headers_button.setEnabled(True) # Reabilita o botão
         if self.header_analyzer_thread: # Garante que a thread exista antes de tentar limpá-la
+            if not error_object:
+                self.source_catalog = self.header_analyzer_thread.source_catalog
             self.header_analyzer_thread = None # Limpa a referência da thread
 
         if error_object:
@@ -579,7 +676,7 @@ class MainWindow(QMainWindow):
         self.log_message(f"Análise concluída. Cabeçalhos únicos encontrados: {len(suggested_groups)}", LogLevel.SUCCESS)
 
         # Passar o self.header_mapping existente para o diálogo
-        dialog = HeaderMappingDialog(suggested_groups, self, self.header_mapping, self.duplicate_key_columns)
+        dialog = HeaderMappingDialog(suggested_groups, self, self.header_mapping, self.duplicate_key_columns, self.duplicates_config)
         if dialog.exec() == QDialog.Accepted:
             self.header_mapping = dialog.get_mapping()
             # --- Salva as colunas para checagem de duplicatas ---
@@ -590,8 +687,11 @@ class MainWindow(QMainWindow):
             if key_columns:
                 report_msg = "e um relatório sera gerado" if self.duplicates_config.get("generate_report") else ""
                 self.log_message(f"Remoção de duplicatas ativada para as chaves: {', '.join(key_columns)} {report_msg}", LogLevel.INFO)
+                if self.duplicates_config.get("persistent_index"):
+                    self.log_message("Linhas com chaves já entregues em execuções anteriores também serão descartadas (índice persistente de chaves).", LogLevel.INFO)
             self.define_filters_button.setEnabled(True)
             self.pivot_button.setEnabled(True)
+            self.enrichment_button.setEnabled(True)
             # Opcional: Logar o mapeamento para depuração
             # for original, map_info in self.header_mapping.items():
             #     self.log_message(f"  '{original}' -> '{map_info['final_name']}' (Tipo: {map_info['type_str']}, Incluir: {map_info['include']})", LogLevel.INFO)
@@ -609,15 +709,14 @@ class MainWindow(QMainWindow):
             self.preview_table_model.clear_data()
             return
 
-        file_name = current_file_item.text()
-        file_path = self.current_files_paths.get(file_name)
+        file_path = current_file_item.data(Qt.UserRole)
 
         if not file_path:
             self.preview_table_model.clear_data()
             return
 
-        if file_path.lower().endswith((".csv", ".txt")):
-            self.update_preview(file_path) # Pré-visualiza CSV diretamente
+        if file_path.lower().endswith((".csv", ".txt")) or is_ipc_file(file_path):
+            self.update_preview(file_path) # Pré-visualiza CSV/IPC diretamente
         elif file_path.lower().endswith((".xlsx", ".xls")):
             # Para Excel, a pré-visualização da aba será acionada por:
             # a) on_sheet_loading_finished (que seleciona a primeira aba) -> on_sheet_list_item_selected_for_preview
@@ -639,8 +738,7 @@ class MainWindow(QMainWindow):
             self.preview_table_model.clear_data()
             return
 
-        file_name = current_file_item.text()
-        file_path = self.current_files_paths.get(file_name)
+        file_path = current_file_item.data(Qt.UserRole)
         sheet_name = current_sheet_item.text()
 
         if file_path and sheet_name:
@@ -664,12 +762,15 @@ class MainWindow(QMainWindow):
                 if not delimiter:
                     self.log_message("Pré-visualização falhou: Delimitador inválido.", LogLevel.ERROR)
                     return
-                pre_read_df = pl.read_csv(source=file_path, has_header=False, n_rows=n_preread_rows, separator=delimiter, encoding='latin-1', ignore_errors=True, infer_schema = False, quote_char = None, truncate_ragged_lines = True)
+                pre_read_df = read_csv_raw(file_path, delimiter, n_rows=n_preread_rows)
             elif file_path.lower().endswith((".xlsx", ".xls")) and sheet_name:
-                pre_read_df = pl.read_excel(source=file_path, sheet_name=sheet_name, has_header = False).head(n_preread_rows)
+                pre_read_df = read_excel_raw(file_path, sheet_name).head(n_preread_rows)
+            elif is_ipc_file(file_path):
+                pre_read_df = ipc_preview_raw(file_path, n_rows_to_preview)
 
             if pre_read_df is not None and not pre_read_df.is_empty():
-                header_row_index = _find_header_row_index(pre_read_df, n_preread_rows)
+                # Em arquivos IPC os nomes das colunas estão sempre na linha 0
+                header_row_index = 0 if is_ipc_file(file_path) else _find_header_row_index(pre_read_df, n_preread_rows)
 
                 # 2. Extrair cabeçalhos, dados e renomear (a lógica robusta)
                 header_names_raw = [str(h) if h is not None else f"column_{i}" for i, h in enumerate(pre_read_df.row(header_row_index))]
@@ -693,12 +794,10 @@ class MainWindow(QMainWindow):
             self.preview_table_model.clear_data()
     
     def open_filter_dialog(self):
-        if not self.header_mapping:
-            self.log_message("Por favor, analise e mapeie os cabeçalhos primeiro.", LogLevel.WARNING)
+        if not self.header_mapping and not self.recipe_mapping:
+            self.log_message("Por favor, analise e mapeie os cabeçalhos (ou carregue uma receita) primeiro.", LogLevel.WARNING)
             return
-        final_headers = {
-            map_info['final_name'] for map_info in self.header_mapping.values() if map_info.get('include')
-        }
+        final_headers = set(self._final_headers_info())
         if not final_headers:
             self.log_message("Nenhym cabeçalho final encontrado no mapeamento. Impossível definir filtros", LogLevel.WARNING)
             return
@@ -725,7 +824,7 @@ class MainWindow(QMainWindow):
             return
 
         selected_file_name = current_file_item.text()
-        file_path = self.current_files_paths.get(selected_file_name)
+        file_path = current_file_item.data(Qt.UserRole)
 
         if not file_path:
             self.log_message(f"Caminho não encontrado para o arquivo: {selected_file_name}", LogLevel.ERROR)
@@ -752,7 +851,7 @@ class MainWindow(QMainWindow):
         """Chamado quando a SheetLoadingWorker termina de carregar as abas."""
         # Verificar se o resultado ainda é para o arquivo atualmente selecionado
         current_selected_file_item = self.files_list_widget.currentItem()
-        if not current_selected_file_item or self.current_files_paths.get(current_selected_file_item.text()) != file_path_processed:
+        if not current_selected_file_item or current_selected_file_item.data(Qt.UserRole) != file_path_processed:
             self.log_message(f"Resultado do carregamento de abas para '{os.path.basename(file_path_processed)}' ignorado (seleção mudou).", LogLevel.INFO)
             if self.sheet_loader_thread and self.sheet_loader_thread.file_path == file_path_processed:
                 self.sheet_loader_thread = None # Limpa a referência da thread que acabou
@@ -847,8 +946,7 @@ class MainWindow(QMainWindow):
         if not current_file_item:
             return # Nenhum arquivo Excel selecionado na lista principal
 
-        selected_file_name = current_file_item.text()
-        file_path = self.current_files_paths.get(selected_file_name)
+        file_path = current_file_item.data(Qt.UserRole)
 
         if not file_path or not file_path.lower().endswith((".xlsx", ".xls")):
             return # Não é um arquivo Excel válido ou caminho não encontrado
@@ -871,7 +969,7 @@ class MainWindow(QMainWindow):
             self.log_message("Nenhuma pasta selecionada ou nenhum arquivo encontrado.", LogLevel.WARNING)
             return None
 
-        for file_name, file_path in self.current_files_paths.items():
+        for file_path, file_name in self.current_files_paths.items():
             is_excel = file_path.lower().endswith((".xlsx", ".xls"))
 
             if is_excel:
@@ -879,8 +977,15 @@ class MainWindow(QMainWindow):
                 
                 # --- NOVA LÓGICA DE DECISÃO ---
                 # Se existem regras globais, use-as.
-                if self.sheet_selection_rules and self.all_sheets_cache:
-                    file_sheets = self.all_sheets_cache.get(file_path, [])
+                if self.sheet_selection_rules:
+                    file_sheets = self.all_sheets_cache.get(file_path)
+                    if file_sheets is None:
+                        # Regras vindas de uma receita valem antes de qualquer análise de abas
+                        try:
+                            file_sheets = self.all_sheets_cache[file_path] = _workbook_sheet_names(file_path)
+                        except Exception as e:
+                            self.log_message(f"Não foi possível ler as abas de '{file_name}': {e}", LogLevel.WARNING)
+                            file_sheets = []
                     rule_mode = self.sheet_selection_rules.get("mode", "include")
                     rule_names = self.sheet_selection_rules.get("names", set())
 
@@ -902,7 +1007,7 @@ class MainWindow(QMainWindow):
                 
                 files_to_process_list.append((file_path, selected_sheets_for_file))
 
-            elif file_path.lower().endswith((".csv", ".txt")):
+            elif file_path.lower().endswith((".csv", ".txt")) or is_ipc_file(file_path):
                 files_to_process_list.append((file_path, None))
             else:
                 self.log_message(f"Arquivo '{file_name}' não é suportado. Pulando.", LogLevel.WARNING)
@@ -919,6 +1024,9 @@ class MainWindow(QMainWindow):
         self.log_console_text_edit.append(f"{level.value} {message}")
 
     def list_files_in_folder(self, folder_path):
+        if self.watch_button.isChecked():
+            # O mapeamento e as seleções são descartados abaixo; o monitoramento depende deles
+            self.watch_button.setChecked(False)
         self.files_list_widget.clear()
         self.sheet_selections.clear() 
         self.sheets_list_widget.clear()
@@ -931,44 +1039,79 @@ class MainWindow(QMainWindow):
         self.define_filters_button.setEnabled(False) 
         self.sheet_selection_button.setEnabled(False)
         self.pivot_button.setEnabled(False)
+        self.enrichment_button.setEnabled(False)
         self.header_mapping.clear()
+        self.source_catalog = {}
         self.filter_rules.clear()
         self.pivot_rules.clear()
+        self.enrichment_rules = []
         self.duplicate_key_columns.clear()
+        self.duplicates_config = {}
         self.sheet_selection_rules.clear()
         self.all_sheets_cache.clear()
+        if self.active_recipe:
+            self._apply_recipe_rules(self.active_recipe)
+
+        if self.folder_scan_worker and self.folder_scan_worker.isRunning():
+            # A varredura anterior para na próxima pasta; lotes já enviados por ela são ignorados por on_files_found
+            self.folder_scan_worker.stop()
+            self.folder_scan_worker.wait()
+        self.log_message(f"Listando arquivos em segundo plano{' (incluindo subpastas)' if self.scan_options.get('recursive', True) else ''}...", LogLevel.INFO)
+        self.folder_scan_worker = FolderScanWorker(folder_path, self.scan_options)
+        self.folder_scan_worker.files_found.connect(self.on_files_found)
+        self.folder_scan_worker.finished.connect(self.on_folder_scan_finished)
+        self.folder_scan_worker.start()
+
+    def on_files_found(self, batch):
+        """Acrescenta à lista um lote de arquivos enviado pela varredura em andamento."""
+        if self.sender() is not self.folder_scan_worker:
+            return
+        for full_path, relative_path in batch:
+            if full_path in self.current_files_paths:
+                continue
+            item = QListWidgetItem(relative_path)
+            item.setData(Qt.UserRole, full_path)
+            item.setToolTip(full_path)
+            self.files_list_widget.addItem(item)
+            self.current_files_paths[full_path] = relative_path
+        self.update_progress_text(f"Listando arquivos... {len(self.current_files_paths):,} encontrado(s)")
+
+    def on_folder_scan_finished(self, total_files, error_message):
+        if self.sender() is not self.folder_scan_worker:
+            return
+        self.folder_scan_worker = None
+        if error_message:
+            self.log_message(error_message, LogLevel.ERROR if not error_message.startswith("Varredura cancelada") else LogLevel.WARNING)
+        if self.current_files_paths:
+            self.log_message(f"Encontrados {len(self.current_files_paths)} arquivos na pasta.", LogLevel.SUCCESS)
+            self.map_headers_button.setEnabled(True) # HABILITAR AQUI se arquivos forem encontrados
+            self.refresh_button.setEnabled(True) # E então ele é habilitado
+            excel_files_found = any(f.lower().endswith(('.xlsx', '.xls')) for f in self.current_files_paths)
+            self.sheet_selection_button.setEnabled(excel_files_found)
+            if self.recipe_mapping:
+                self.define_filters_button.setEnabled(True)
+                self.pivot_button.setEnabled(True)
+                self.enrichment_button.setEnabled(True)
+                self.log_message("Receita ativa: a consolidação pode começar sem a análise de cabeçalhos.", LogLevel.INFO)
+        elif not error_message:
+            self.log_message("Nenhum arquivo suportado (.xlsx, .csv, .xls, .txt, .arrow, .feather, .ipc, também dentro de .zip/.gz/.zst) encontrado na pasta.", LogLevel.WARNING)
+            self.refresh_button.setEnabled(True)
+
+    def open_scan_options_dialog(self):
+        dialog = ScanOptionsDialog(self.scan_options, self)
+        if dialog.exec() == QDialog.Accepted:
+            self.scan_options = dialog.get_options()
+            self.log_message("Opções de varredura atualizadas.", LogLevel.SUCCESS)
+            if os.path.isdir(self.folder_path_line_edit.text()):
+                self.list_files_in_folder(self.folder_path_line_edit.text())
 
-
-        supported_extensions = ("*.xlsx", "*.csv", "*.xls", "*.txt")
-        found_files_paths = []
-        try:
-            for ext in supported_extensions:
-                pattern = os.path.join(folder_path, ext)
-                found_files_paths.extend(glob.glob(pattern))
-            
-            if found_files_paths:
-                for full_path in found_files_paths:
-                    file_name = os.path.basename(full_path)
-                    self.files_list_widget.addItem(file_name)
-                    self.current_files_paths[file_name] = full_path
-                self.log_message(f"Encontrados {len(found_files_paths)} arquivos na pasta.", LogLevel.SUCCESS)
-                self.map_headers_button.setEnabled(True) # HABILITAR AQUI se arquivos forem encontrados
-                self.refresh_button.setEnabled(True) # E então ele é habilitado
-                excel_files_found = any(f.lower().endswith(('.xlsx', '.xls')) for f in found_files_paths)
-                self.sheet_selection_button.setEnabled(excel_files_found)
-            else:
-                self.log_message("Nenhum arquivo suportado (.xlsx, .csv, .xls, .txt) encontrado na pasta.", LogLevel.WARNING)
-                # self.map_headers_button.setEnabled(False) # Já está desabilitado pelo início da função
-
-        except Exception as e:
-            self.log_message(f"Erro ao listar arquivos: {e}", LogLevel.ERROR)
-            self.current_files_paths.clear()
-            # self.map_headers_button.setEnabled(False) # Já está desabilitado
-    
     def update_output_filename_extension(self, selected_format):
         current_name = self.output_name_line_edit.text()
         name_part, _ = os.path.splitext(current_name)
-        new_extension = ".parquet" if selected_format == "Parquet" else "." + selected_format.lower()
+        if selected_format == "Parquet (Dataset)":
+            new_extension = "" # Dataset é gravado como uma pasta
+        else:
+            new_extension = {"Parquet": ".parquet", "Arrow IPC": ".arrow"}.get(selected_format, "." + selected_format.lower())
         # new_extension = "." + selected_format.lower()
         self.output_name_line_edit.setText(name_part + new_extension)
 
@@ -983,10 +1126,16 @@ class MainWindow(QMainWindow):
             filter_str = "Arquivos CSV (*.csv)"
         elif selected_format == "Parquet":
             filter_str = "Arquivos Parquet (*.parquet)"
+        elif selected_format == "Parquet (Dataset)":
+            filter_str = "Pasta do Dataset (*)"
+        elif selected_format == "Arrow IPC":
+            filter_str = "Arquivos Arrow IPC (*.arrow *.feather *.ipc)"
         else:
             filter_str = "Todos os Arquivos (*)"
         file_path, _ = QFileDialog.getSaveFileName(self, "Salvar Arquivo Consolidado Como...", initial_path, filter_str)
         if file_path:
+            if selected_format == "Parquet (Dataset)":
+                file_path = os.path.splitext(file_path)[0] # O dataset é uma pasta, sem extensão
             self.output_file_path = file_path
             base_name = os.path.basename(file_path)
             self.output_name_line_edit.setText(base_name)
@@ -997,6 +1146,8 @@ class MainWindow(QMainWindow):
                 self.output_format_combo_box.setCurrentText("CSV")
             elif ext_part.lower() == ".parquet" and self.output_format_combo_box.currentText != "Parquet":
                 self.output_format_combo_box.setCurrentText("Parquet")
+            elif ext_part.lower() in IPC_EXTENSIONS and self.output_format_combo_box.currentText() != "Arrow IPC":
+                self.output_format_combo_box.setCurrentText("Arrow IPC")
             self.log_message(f"Arquivo de saída definido como: {file_path}", LogLevel.SUCCESS)
         else:
             self.log_message("Seleção de local para salvar cancelada.", LogLevel.INFO)
@@ -1016,7 +1167,7 @@ class MainWindow(QMainWindow):
         self.log_console_text_edit.ensureCursorVisible()
         self.is_last_log_progress = True
 
-    def start_consolidation(self):
+    def start_consolidation(self, incremental=False):
         if not self.folder_path_line_edit.text():
             self.log_message("Por favor, selecione uma pasta de projeto primeiro.", LogLevel.WARNING)
             return
@@ -1039,7 +1190,7 @@ class MainWindow(QMainWindow):
             return
         
         
-        self.consolidation_thread = ConsolidationWorker(files_to_process, self.output_file_path, output_format, self.header_mapping, self.filter_rules, selected_delimiter, self.pivot_rules, self.duplicates_config)
+        self.consolidation_thread = ConsolidationWorker(files_to_process, self.output_file_path, output_format, self.header_mapping, self.filter_rules, selected_delimiter, self.pivot_rules, self.duplicates_config, memory_budget_mb=self.memory_budget_spin_box.value(), output_options=self.output_options, skip_identical_files=self.skip_identical_files_check_box.isChecked(), fingerprint_cache_path=os.path.join(os.path.dirname(self._get_config_path()), FINGERPRINT_CACHE_FILE_NAME), incremental=incremental, recipe_mapping=self.recipe_mapping, source_catalog=self.source_catalog, utf8_cache_dir=os.path.join(os.path.dirname(self._get_config_path()), UTF8_CACHE_DIR_NAME) if self.utf8_cache_check_box.isChecked() else None, enrichment_rules=self.enrichment_rules, reference_cache_dir=os.path.join(os.path.dirname(self._get_config_path()), REFERENCE_CACHE_DIR_NAME))
         self.consolidation_thread.log_message.connect(self.log_message) 
         self.consolidation_thread.progress_updated.connect(self.update_progress_bar)
         self.consolidation_thread.finished.connect(self.on_consolidation_finished)
@@ -1059,9 +1210,160 @@ class MainWindow(QMainWindow):
         self.set_ui_for_processing(False)
         self.consolidation_thread = None 
 
+        if self.folder_watch_worker is not None:
+            if not success and self.watch_run_files:
+                # Serão tentados de novo na próxima varredura
+                self.folder_watch_worker.release(self.watch_run_files)
+            self.watch_run_files = []
+            if self.watch_pending_files:
+                self._run_watch_consolidation()
+
+    # --- Receitas ---
+    def _final_headers_info(self):
+        """{nome_final: tipo} das colunas incluídas pelo mapeamento atual e pela receita carregada."""
+        return HeaderRuleSet.from_mapping(self.header_mapping, self.recipe_mapping).final_types()
+
+    def _recipe_start_dir(self):
+        return self.folder_path_line_edit.text() or self.last_used_input_folder or os.path.expanduser("~")
+
+    def save_recipe(self):
+        header_rules = HeaderRuleSet.from_mapping(self.header_mapping, self.recipe_mapping)
+        if not header_rules:
+            self.log_message("Nada para salvar: analise e mapeie os cabeçalhos primeiro.", LogLevel.WARNING)
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "Salvar Receita", os.path.join(self._recipe_start_dir(), "consolidacao" + RECIPE_FILE_EXTENSION), RECIPE_FILE_FILTER)
+        if not file_path:
+            return
+        if not file_path.lower().endswith(".json"):
+            file_path += RECIPE_FILE_EXTENSION
+        recipe = build_recipe(
+            header_rules, self.filter_rules, self.pivot_rules, self.duplicates_config, self.sheet_selection_rules,
+            self.get_selected_delimiter(), self.output_format_combo_box.currentText(), self.output_options, self.scan_options,
+            self.enrichment_rules,
+        )
+        try:
+            save_recipe(file_path, recipe)
+        except OSError as e:
+            self.log_message(f"Erro ao salvar a receita: {e}", LogLevel.ERROR)
+            return
+        self.log_message(f"Receita salva em {file_path} ({len(header_rules.name_rules)} cabeçalho(s), {len(header_rules.pattern_rules)} padrão(ões)).", LogLevel.SUCCESS)
+
+    def open_recipe(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Abrir Receita", self._recipe_start_dir(), RECIPE_FILE_FILTER)
+        if not file_path:
+            return
+        try:
+            recipe = load_recipe(file_path)
+        except (OSError, ValueError) as e:
+            self.log_message(f"Não foi possível carregar a receita: {e}", LogLevel.ERROR)
+            return
+        self.active_recipe = recipe
+        self.discard_recipe_action.setEnabled(True)
+        self.scan_options = dict(recipe["scan"])
+        self._set_delimiter(recipe.get("delimiter"))
+        output_format = recipe["output"].get("format")
+        if output_format and self.output_format_combo_box.findText(output_format) >= 0:
+            self.output_format_combo_box.setCurrentText(output_format)
+        self.output_options = dict(recipe["output"].get("options") or {})
+        mapping = recipe["mapping"]
+        self.log_message(f"Receita carregada: {os.path.basename(file_path)} ({len(mapping['by_name'])} cabeçalho(s), {len(mapping['patterns'])} padrão(ões), {len(recipe['filters'])} filtro(s)).", LogLevel.SUCCESS)
+        # A nova listagem descarta o mapeamento por arquivo e reaplica as regras da receita
+        if os.path.isdir(self.folder_path_line_edit.text()):
+            self.list_files_in_folder(self.folder_path_line_edit.text())
+        else:
+            self._apply_recipe_rules(recipe)
+
+    def _apply_recipe_rules(self, recipe):
+        self.recipe_mapping = recipe["mapping"]
+        self.filter_rules = list(recipe["filters"])
+        self.pivot_rules = dict(recipe["pivot"])
+        self.enrichment_rules = [dict(rule) for rule in recipe["enrichment"]]
+        self.duplicates_config = dict(recipe["duplicates"])
+        self.sheet_selection_rules = dict(recipe["sheets"])
+
+    def discard_recipe(self):
+        self.active_recipe = None
+        self.recipe_mapping = {}
+        self.discard_recipe_action.setEnabled(False)
+        self.log_message("Receita descartada. As regras já aplicadas permanecem até a próxima listagem da pasta.", LogLevel.INFO)
+
+    def _set_delimiter(self, delimiter):
+        if not delimiter:
+            return
+        for index in range(self.delimiter_combo.count()):
+            text = self.delimiter_combo.itemText(index)
+            if (delimiter == "\t" and text == "Tabulação (Tab)") or text.endswith(f"({delimiter})"):
+                self.delimiter_combo.setCurrentIndex(index)
+                return
+        self.delimiter_combo.setCurrentText("Outro...")
+        self.delimiter_custom_edit.setText(delimiter)
+
+    # --- Monitoramento da pasta ---
+    def toggle_folder_watch(self, checked):
+        if not checked:
+            if self.folder_watch_worker is not None:
+                self.folder_watch_worker.stop()
+                self.folder_watch_worker.wait()
+                self.folder_watch_worker = None
+                self.watch_pending_files = []
+                self.log_message("Monitoramento da pasta encerrado.", LogLevel.INFO)
+            return
+
+        folder_path = self.folder_path_line_edit.text()
+        missing = None
+        if not os.path.isdir(folder_path):
+            missing = "selecione uma pasta válida"
+        elif not self.header_mapping and not self.recipe_mapping:
+            missing = "faça o mapeamento de cabeçalhos (ou carregue uma receita)"
+        elif not self.output_file_path:
+            missing = "defina o arquivo de saída com 'Salvar Como...'"
+        if missing:
+            self.log_message(f"Para monitorar a pasta, {missing} primeiro.", LogLevel.WARNING)
+            self.watch_button.blockSignals(True)
+            self.watch_button.setChecked(False)
+            self.watch_button.blockSignals(False)
+            return
+
+        self.folder_watch_worker = FolderWatchWorker(folder_path, self.scan_options, output_path=self.output_file_path)
+        self.folder_watch_worker.log_message.connect(self.log_message)
+        self.folder_watch_worker.files_ready.connect(self.on_watched_files_ready)
+        self.folder_watch_worker.start()
+
+    def on_watched_files_ready(self, files, sheets_by_file):
+        """Inclui na lista os arquivos novos/alterados e dispara (ou enfileira) a consolidação incremental."""
+        if self.sender() is not self.folder_watch_worker:
+            return
+        # Nas pastas de trabalho novas, sem regra global de abas, valem as abas marcadas em algum outro arquivo
+        selected_sheet_names = {sheet for selections in self.sheet_selections.values() for sheet, checked in selections.items() if checked}
+        for full_path, relative_path in files:
+            if full_path not in self.current_files_paths:
+                item = QListWidgetItem(relative_path)
+                item.setData(Qt.UserRole, full_path)
+                item.setToolTip(full_path)
+                self.files_list_widget.addItem(item)
+                self.current_files_paths[full_path] = relative_path
+            if full_path in sheets_by_file:
+                if self.all_sheets_cache:
+                    self.all_sheets_cache[full_path] = sheets_by_file[full_path]
+                if full_path not in self.sheet_selections:
+                    self.sheet_selections[full_path] = {sheet: sheet in selected_sheet_names for sheet in sheets_by_file[full_path]}
+        self.log_message(f"Monitoramento: {len(files)} arquivo(s) novo(s) ou alterado(s): {', '.join(relative for _, relative in files)}", LogLevel.INFO)
+        self.watch_pending_files.extend(full_path for full_path, _ in files)
+        if self.consolidation_thread is None:
+            self._run_watch_consolidation()
+
+    def _run_watch_consolidation(self):
+        self.watch_run_files, self.watch_pending_files = self.watch_pending_files, []
+        self.start_consolidation(incremental=True)
+        if self.consolidation_thread is None:
+            # A consolidação não chegou a iniciar (ex.: nada selecionado); o motivo já foi registrado
+            self.folder_watch_worker.release(self.watch_run_files)
+            self.watch_run_files = []
+
     def set_ui_for_processing(self, processing):
         not_proc = not processing
         self.select_folder_button.setEnabled(not_proc)
+        self.scan_options_button.setEnabled(not_proc)
         self.files_list_widget.setEnabled(not_proc)
         
         # Habilitar o botão de mapear apenas se não estiver processando E houver arquivos listados
@@ -1070,8 +1372,7 @@ class MainWindow(QMainWindow):
         has_sel_excel_sheets = False
         current_file_item = self.files_list_widget.currentItem()
         if not_proc and current_file_item: # Só verifica se não estiver processando e houver item
-            fn = current_file_item.text()
-            fp = self.current_files_paths.get(fn)
+            fp = current_file_item.data(Qt.UserRole)
             if fp and (fp.lower().endswith((".xlsx",".xls"))) and self.sheets_list_widget.count() > 0:
                 has_sel_excel_sheets = True
         self.sheets_list_widget.setEnabled(not_proc and has_sel_excel_sheets)
@@ -1081,6 +1382,13 @@ class MainWindow(QMainWindow):
         self.output_name_line_edit.setEnabled(not_proc)
         self.output_format_combo_box.setEnabled(not_proc)
         self.save_as_button.setEnabled(not_proc)
+        self.output_options_button.setEnabled(not_proc)
+        self.memory_budget_spin_box.setEnabled(not_proc)
+        self.skip_identical_files_check_box.setEnabled(not_proc)
+        self.utf8_cache_check_box.setEnabled(not_proc)
+        self.open_recipe_action.setEnabled(not_proc)
+        self.save_recipe_action.setEnabled(not_proc)
+        self.discard_recipe_action.setEnabled(not_proc and self.active_recipe is not None)
         self.consolidate_button.setVisible(not_proc) 
         self.cancel_button.setVisible(processing)
         # self.progress_bar.setVisible(processing)
@@ -1123,4 +1431,12 @@ class MainWindow(QMainWindow):
             self.header_analyzer_thread.stop()
             self.header_analyzer_thread.wait()
 
+        if self.folder_scan_worker and self.folder_scan_worker.isRunning():
+            self.folder_scan_worker.stop()
+            self.folder_scan_worker.wait()
+
+        if self.folder_watch_worker and self.folder_watch_worker.isRunning():
+            self.folder_watch_worker.stop()
+            self.folder_watch_worker.wait()
+
         event.accept()
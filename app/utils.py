@@ -25,13 +25,30 @@ OPERATOR_OPTIONS = [
     "Maior que",
     "Menor que",
     "Entre",
+    "Está na lista",
+    "Contém algum de",
     "Está em branco",
     "Não está em branco",
 ]
 # Operadores que não precisam de um campo de valor
 OPERATORS_NO_VALUE = {"Está em branco", "Não está em branco"}
+# Operadores cujo valor é uma lista (colada ou carregada de um arquivo), avaliada de uma só vez
+OPERATORS_LIST_VALUE = {"Está na lista", "Contém algum de"}
 
 CONFIG_FILE_NAME = "config_consolidador.json" # Nome do arquivo de configuração
+FINGERPRINT_CACHE_FILE_NAME = "cache_impressoes_arquivos.json" # Cache dos hashes de conteúdo dos arquivos de entrada
+HEADER_PROFILE_CACHE_FILE_NAME = "cache_perfis_cabecalhos.json" # Cache dos perfis de cabeçalho de cada arquivo/aba
+UTF8_CACHE_DIR_NAME = "cache_utf8" # Cópias em UTF-8 dos arquivos de texto em outras codificações
+REFERENCE_CACHE_DIR_NAME = "cache_referencias" # Cópias em Parquet das tabelas de referência do enriquecimento
+
+def split_value_list(text: str) -> list:
+    """
+    Valores de uma lista colada ou lida de arquivo: um por linha (ou separados por
+    tabulação/ponto e vírgula, como ao copiar células de uma planilha). Espaços nas
+    pontas e repetições são removidos, mantendo a ordem.
+    """
+    values = (value.strip() for value in re.split(r"[\r\n\t;]+", text or ""))
+    return list(dict.fromkeys(value for value in values if value))
 
 def _normalize_header_name(header_name: str) -> str:
     if not isinstance(header_name, str):
@@ -0,0 +1,48 @@
+import os
+
+import polars as pl
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+def write_csv(path, header, rows, delimiter=";"):
+    """Grava um CSV simples em latin-1, como as planilhas exportadas que o DataFlow recebe."""
+    lines = [delimiter.join(header)] + [delimiter.join(str(value) for value in row) for row in rows]
+    path.write_text("\n".join(lines) + "\n", encoding="latin-1")
+    return str(path)
+
+
+@pytest.fixture
+def consolidate():
+    """
+    Executa uma consolidação de forma síncrona (sem iniciar a thread) sobre arquivos CSV
+    separados por ';' ou planilhas .xlsx. `types` é {coluna: tipo}; colunas omitidas ficam como texto.
+    Retorna (sucesso, mensagem final, mensagens de log).
+    """
+    from app.logic.workers import ConsolidationWorker
+
+    def run(files, output_path, output_format="CSV", types=None, filter_rules=None, pivot_rules=None, duplicates_config=None, **kwargs):
+        types = types or {}
+        header_mapping = {}
+        for file_path in files:
+            if file_path.lower().endswith(".xlsx"):
+                header = pl.read_excel(file_path).columns
+            else:
+                with open(file_path, encoding="latin-1") as f:
+                    header = f.readline().rstrip("\n").split(";")
+            for column in header:
+                header_mapping[(column, os.path.abspath(file_path), None)] = {
+                    "final_name": column, "type_str": types.get(column, "Automático/String"), "include": True,
+                }
+        worker = ConsolidationWorker(
+            [(os.path.abspath(file_path), None) for file_path in files], str(output_path), output_format, header_mapping,
+            filter_rules or [], ";", pivot_rules or {}, duplicates_config, **kwargs,
+        )
+        result, logs = {}, []
+        worker.log_message.connect(lambda message, level: logs.append(message))
+        worker.finished.connect(lambda ok, message: result.update(ok=ok, message=message))
+        worker.run()
+        return result.get("ok"), result.get("message"), logs
+
+    return run
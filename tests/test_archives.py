@@ -0,0 +1,62 @@
+import gzip
+import zipfile
+
+import polars as pl
+import pytest
+
+from app.logic.archives import container_members, is_container_file, open_source_binary, source_display_name, source_for_reader
+from app.logic.scanner import scan_folder
+
+CSV_CONTENT = "CNPJ;Valor\n111;10,5\n222;20,0\n".encode("latin-1")
+
+
+def _zip(path, members):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return str(path)
+
+
+def test_zip_lists_only_supported_visible_members(tmp_path):
+    container = _zip(tmp_path / "lote.zip", {
+        "vendas/Jan.csv": CSV_CONTENT, "vendas/fev.xlsx": b"", "leia-me.pdf": b"", "__MACOSX/vendas/._Jan.csv": b"",
+        ".oculta/a.csv": b"", "vendas/~$fev.xlsx": b"",
+    })
+    assert container_members(container) == [f"{container}::vendas/fev.xlsx", f"{container}::vendas/Jan.csv"]
+    assert source_display_name(f"{container}::vendas/Jan.csv") == "lote.zip::vendas/Jan.csv"
+
+
+def test_compressed_file_is_a_container_only_for_supported_content():
+    assert is_container_file("vendas.CSV.GZ")
+    assert is_container_file("vendas.txt.zst")
+    assert not is_container_file("backup.tar.gz")
+
+
+def test_zip_member_is_read_as_a_stream(tmp_path):
+    container = _zip(tmp_path / "lote.zip", {"vendas/jan.csv": CSV_CONTENT})
+    with open_source_binary(f"{container}::vendas/jan.csv") as stream:
+        assert stream.read() == CSV_CONTENT
+    assert source_for_reader(f"{container}::vendas/jan.csv").getvalue() == CSV_CONTENT
+
+
+def _read_virtual_sources(folder):
+    frames = {}
+    for path, relative in scan_folder(str(folder)):
+        with open_source_binary(path) as stream:
+            frames[relative] = pl.read_csv(stream, separator=";", decimal_comma=True)
+    return frames
+
+
+def test_gzip_file_becomes_a_virtual_source(tmp_path):
+    (tmp_path / "jan.csv.gz").write_bytes(gzip.compress(CSV_CONTENT))
+    frames = _read_virtual_sources(tmp_path)
+    assert list(frames) == ["jan.csv.gz::jan.csv"]
+    assert frames["jan.csv.gz::jan.csv"]["Valor"].to_list() == [10.5, 20.0]
+
+
+def test_zstd_file_becomes_a_virtual_source(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    (tmp_path / "fev.csv.zst").write_bytes(zstandard.ZstdCompressor().compress(CSV_CONTENT))
+    frames = _read_virtual_sources(tmp_path)
+    assert list(frames) == ["fev.csv.zst::fev.csv"]
+    assert frames["fev.csv.zst::fev.csv"]["Valor"].to_list() == [10.5, 20.0]
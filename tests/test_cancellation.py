@@ -0,0 +1,59 @@
+import os
+
+import polars as pl
+import pytest
+
+from app.logic.cancellation import AtomicOutputDir, AtomicOutputPath, CancellationToken, InterruptedError
+from app.logic.writers import write_csv_export
+
+
+def test_token_raises_only_after_cancel():
+    token = CancellationToken()
+    token.raise_if_cancelled()
+    assert not token.wait(0)
+    token.cancel()
+    assert token.is_cancelled and token.wait(0)
+    with pytest.raises(InterruptedError):
+        token.raise_if_cancelled()
+
+
+def test_atomic_path_replaces_the_target_only_on_success(tmp_path):
+    target = tmp_path / "saida.csv"
+    target.write_text("anterior")
+    with pytest.raises(ValueError):
+        with AtomicOutputPath(str(target)) as temp_path:
+            with open(temp_path, "w") as f:
+                f.write("pela metade")
+            raise ValueError("falha na escrita")
+    assert target.read_text() == "anterior"
+    assert os.listdir(tmp_path) == ["saida.csv"]
+
+    with AtomicOutputPath(str(target)) as temp_path:
+        with open(temp_path, "w") as f:
+            f.write("nova")
+    assert target.read_text() == "nova"
+    assert os.listdir(tmp_path) == ["saida.csv"]
+
+
+def test_atomic_dir_swaps_the_whole_folder(tmp_path):
+    target = tmp_path / "dataset"
+    target.mkdir()
+    (target / "antigo.parquet").write_text("x")
+    with pytest.raises(InterruptedError):
+        with AtomicOutputDir(str(target)) as temp_dir:
+            open(os.path.join(temp_dir, "novo.parquet"), "w").close()
+            raise InterruptedError()
+    assert os.listdir(target) == ["antigo.parquet"]
+
+    with AtomicOutputDir(str(target)) as temp_dir:
+        open(os.path.join(temp_dir, "novo.parquet"), "w").close()
+    assert os.listdir(target) == ["novo.parquet"]
+    assert os.listdir(tmp_path) == ["dataset"]
+
+
+def test_cancelled_csv_export_leaves_no_output(tmp_path):
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(InterruptedError):
+        write_csv_export(pl.DataFrame({"a": [1, 2]}), str(tmp_path / "saida.csv"), {"parts": 2}, token)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,22 @@
+import polars as pl
+
+from app.logic.enrichment import JOIN_KEY_COLUMN, join_lookup
+
+
+def _enrich(keys, digits_only=False):
+    lookup = pl.DataFrame({JOIN_KEY_COLUMN: ["5102", "6101"], "Descricao": ["Venda", "Venda interestadual"]})
+    lf = pl.LazyFrame({"CFOP": keys})
+    return join_lookup(lf, "CFOP", lookup, digits_only).collect()["Descricao"].to_list()
+
+
+def test_float_keys_match_without_decimal_suffix():
+    assert _enrich([5102.0, 6101.0, 5102.5]) == ["Venda", "Venda interestadual", None]
+
+
+def test_float_keys_match_with_digits_only():
+    assert _enrich([5102.0, 6101.0, None], digits_only=True) == ["Venda", "Venda interestadual", None]
+
+
+def test_integer_and_text_keys_still_match():
+    assert _enrich([5102, 6101]) == ["Venda", "Venda interestadual"]
+    assert _enrich([" 5.102 ", "06101"], digits_only=True) == ["Venda", "Venda interestadual"]
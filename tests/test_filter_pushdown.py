@@ -0,0 +1,72 @@
+import os
+
+import polars as pl
+import pytest
+
+from app.logic.header_profiles import HeaderProfileCache
+from conftest import write_csv
+
+HEADER = ["Cliente", "UF", "Valor", "Obs"]
+ROWS = [
+    ["Souza", "RJ", "20,0", ""],
+    ["Silva Ltda", "SP", "10,5", "urgente"],
+    ["Pereira", "MG", "5,25", ""],
+    ["Silva", "SP", "30,0", "revisar"],
+    ["Costa Ltda", "RJ", "1,0", "urgente"],
+    ["Souza Ltda", "BA", "12,0", ""],
+]
+TYPES = {"Valor": "Decimal (Float)"}
+
+# (regras de filtro, filtro equivalente aplicado à saída sem filtros)
+CASES = {
+    "contem": ([{"column": "Cliente", "operator": "Contém", "value": "Silva"}], pl.col("Cliente").str.contains("Silva")),
+    "igual_ou_e_nao_contem": (
+        [{"column": "UF", "operator": "Igual a", "value": "SP"}, {"column": "UF", "operator": "Igual a", "value": "RJ"},
+         {"column": "Cliente", "operator": "Não contém", "value": "Ltda"}],
+        pl.col("UF").is_in(["SP", "RJ"]) & ~pl.col("Cliente").str.contains("Ltda"),
+    ),
+    "esta_na_lista": ([{"column": "UF", "operator": "Está na lista", "value": ["SP", "MG"]}], pl.col("UF").is_in(["SP", "MG"])),
+    "contem_algum_de": (
+        [{"column": "Cliente", "operator": "Contém algum de", "value": ["Pereira", "Costa"]}],
+        pl.col("Cliente").str.contains("Pereira|Costa"),
+    ),
+    "em_branco": ([{"column": "Obs", "operator": "Está em branco", "value": ""}], pl.col("Obs").is_null()),
+    "texto_e_coluna_tipada": (
+        [{"column": "UF", "operator": "Diferente de", "value": "BA"}, {"column": "Valor", "operator": "Maior que", "value": "10"}],
+        (pl.col("UF") != "BA") & (pl.col("Valor").str.replace(",", ".").cast(pl.Float64) > 10),
+    ),
+}
+
+
+def _source(tmp_path, kind):
+    """Fonte e catálogo da análise de cabeçalhos para cada caminho do filtro antecipado."""
+    if kind == "xlsx":
+        path = str(tmp_path / "clientes.xlsx")
+        pl.DataFrame([[value or None for value in row] for row in ROWS], schema=HEADER, orient="row").write_excel(path)
+        return path, None
+    path = os.path.abspath(write_csv(tmp_path / "clientes.csv", HEADER, ROWS))
+    if kind == "csv":
+        return path, None
+    entry = HeaderProfileCache.make_entry(path, os.stat(path), ";", 0, [{"name": column} for column in HEADER])
+    return path, {(path, None): entry}
+
+
+# CSV/TXT são filtrados durante a leitura (cabeçalho da análise ou das primeiras linhas);
+# planilhas, sobre as colunas de origem antes da tipagem
+@pytest.mark.parametrize("kind, where", [("csv_catalogo", "durante a leitura"), ("csv", "durante a leitura"), ("xlsx", "antes da tipagem")])
+@pytest.mark.parametrize("case", list(CASES))
+def test_pushed_down_filter_matches_filtering_the_full_output(tmp_path, consolidate, case, kind, where):
+    rules, expected_filter = CASES[case]
+    source, catalog = _source(tmp_path, kind)
+
+    assert consolidate([source], tmp_path / "completo.csv", types=TYPES)[0]
+    full = pl.read_csv(tmp_path / "completo.csv", separator="|", infer_schema=False)
+
+    ok, _, logs = consolidate([source], tmp_path / "filtrado.csv", types=TYPES, filter_rules=rules, source_catalog=catalog)
+    assert ok
+    filtered = pl.read_csv(tmp_path / "filtrado.csv", separator="|", infer_schema=False)
+
+    expected = full.filter(expected_filter)
+    assert 0 < expected.height < full.height
+    assert filtered.equals(expected)
+    assert any(f"Filtro antecipado ({where})" in message for message in logs)
@@ -0,0 +1,39 @@
+import json
+import time
+
+from app.logic.fingerprints import FileFingerprintCache, FINGERPRINT_LAST_SEEN_REFRESH_SECONDS, find_duplicate_files
+
+
+def _write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_duplicates_keep_the_shortest_name(tmp_path):
+    original = _write(tmp_path / "relatorio.csv", b"a;b\n1;2\n")
+    copy = _write(tmp_path / "relatorio (1).csv", b"a;b\n1;2\n")
+    other = _write(tmp_path / "outro.csv", b"a;b\n3;4\n")
+    assert find_duplicate_files([copy, original, other]) == {copy: original}
+
+
+def test_cache_hits_do_not_rewrite_the_cache(tmp_path):
+    files = [_write(tmp_path / "a.csv", b"x;y\n"), _write(tmp_path / "b.csv", b"x;y\n")]
+    cache_path = str(tmp_path / "cache.json")
+    cache = FileFingerprintCache(cache_path)
+    find_duplicate_files(files, cache)
+    cache.save()
+
+    cache = FileFingerprintCache(cache_path)
+    assert len(find_duplicate_files(files, cache)) == 1
+    assert not cache.changed
+
+    # Uma data de uso antiga é atualizada, no máximo uma vez por dia
+    with open(cache_path, encoding="utf-8") as f:
+        entries = json.load(f)["files"]
+    for entry in entries.values():
+        entry["last_seen"] = time.time() - FINGERPRINT_LAST_SEEN_REFRESH_SECONDS - 60
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump({"files": entries}, f)
+    cache = FileFingerprintCache(cache_path)
+    find_duplicate_files(files, cache)
+    assert cache.changed
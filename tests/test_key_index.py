@@ -0,0 +1,89 @@
+from datetime import datetime
+
+import polars as pl
+import pytest
+
+from app.logic.key_index import KEY_HASH_COLUMN, PersistentKeyIndex, key_hash_expression
+from conftest import write_csv
+
+SALES_HEADER = ["CNPJ", "UF", "Valor"]
+SALES_ROWS = [["11111111000111", "SP", "10,5"], ["22222222000122", "RJ", "20,0"], ["33333333000133", "MG", "30,25"]]
+
+
+def _index_config(tmp_path):
+    return {"key_columns": ["CNPJ"], "persistent_index": True, "index_dir": str(tmp_path / "indice")}
+
+
+def test_summary_only_run_does_not_mark_keys_as_delivered(tmp_path, consolidate):
+    source = write_csv(tmp_path / "vendas.csv", SALES_HEADER, SALES_ROWS)
+    output = tmp_path / "saida.csv"
+    pivot = {"group_by": ["UF"], "aggregations": [{"column": "Valor", "operation": "Soma"}], "only_pivot": False}
+
+    ok, _, logs = consolidate([source], output, types={"Valor": "Decimal (Float)"}, pivot_rules=pivot, duplicates_config=_index_config(tmp_path))
+    assert ok
+    assert pl.read_csv(output, separator="|").columns == ["UF", "Valor_Soma"]
+    assert any("não foram gravadas" in message for message in logs)
+
+    ok, _, logs = consolidate([source], output, types={"Valor": "Decimal (Float)"}, duplicates_config=_index_config(tmp_path))
+    assert ok
+    assert pl.read_csv(output, separator="|", infer_schema=False).height == 3
+
+
+def test_delivered_keys_are_discarded_on_the_next_run(tmp_path, consolidate):
+    source = write_csv(tmp_path / "vendas.csv", SALES_HEADER, SALES_ROWS)
+    output = tmp_path / "saida.parquet"
+
+    assert consolidate([source], output, "Parquet", duplicates_config=_index_config(tmp_path))[0]
+    assert pl.read_parquet(output).height == 3
+    assert consolidate([source], output, "Parquet", duplicates_config=_index_config(tmp_path))[0]
+    assert pl.read_parquet(output).height == 0
+
+
+def test_key_typed_as_integer_then_decimal_hashes_the_same(tmp_path, consolidate):
+    source = write_csv(tmp_path / "pedidos.csv", ["Pedido", "UF"], [["1", "SP"], ["2", "RJ"]])
+    config = {"key_columns": ["Pedido"], "persistent_index": True, "index_dir": str(tmp_path / "indice")}
+
+    assert consolidate([source], tmp_path / "a.parquet", "Parquet", types={"Pedido": "Inteiro"}, duplicates_config=config)[0]
+    assert consolidate([source], tmp_path / "b.parquet", "Parquet", types={"Pedido": "Decimal (Float)"}, duplicates_config=config)[0]
+    assert pl.read_parquet(tmp_path / "b.parquet").height == 0
+
+
+def test_datetime_keys_hash_the_same_in_any_time_unit():
+    moment = pl.DataFrame({"Quando": [datetime(2024, 1, 31, 10, 5, 3, 120000)]})
+    hashes = [
+        moment.with_columns(pl.col("Quando").cast(pl.Datetime(unit))).select(key_hash_expression(["Quando"], {"Quando": pl.Datetime(unit)})).item()
+        for unit in ("ms", "us", "ns")
+    ]
+    assert len(set(hashes)) == 1
+
+
+def _hashes(values):
+    return pl.DataFrame({"CNPJ": values}).select(key_hash_expression(["CNPJ"])).to_series()
+
+
+@pytest.mark.parametrize("use_bloom", [True, False])
+def test_known_keys_returns_only_committed_hashes(tmp_path, use_bloom):
+    index = PersistentKeyIndex(str(tmp_path / "indice"), ["CNPJ"], use_bloom=use_bloom)
+    assert index.known_keys(_hashes(["a"]).to_frame().lazy()) is None
+
+    delivered = [f"cnpj-{i}" for i in range(500)]
+    assert index.commit(_hashes(delivered)) == 500
+    reopened = PersistentKeyIndex(str(tmp_path / "indice"), ["CNPJ"], use_bloom=use_bloom)
+    assert reopened.total_keys == 500
+    assert reopened.compatibility_error() is None
+
+    run_keys = _hashes(delivered[:10] + [f"novo-{i}" for i in range(200)])
+    known = reopened.known_keys(run_keys.to_frame().lazy()).collect()[KEY_HASH_COLUMN]
+    assert sorted(known.to_list()) == sorted(_hashes(delivered[:10]).to_list())
+
+
+def test_commit_merges_with_existing_keys(tmp_path):
+    index = PersistentKeyIndex(str(tmp_path / "indice"), ["CNPJ"])
+    index.commit(_hashes(["a", "b"]))
+    index.commit(_hashes(["b", "c"]))
+    assert PersistentKeyIndex(str(tmp_path / "indice"), ["CNPJ"]).total_keys == 3
+
+
+def test_index_for_other_key_columns_is_incompatible(tmp_path):
+    PersistentKeyIndex(str(tmp_path / "indice"), ["CNPJ"]).commit(_hashes(["a"]))
+    assert "CNPJ" in PersistentKeyIndex(str(tmp_path / "indice"), ["CNPJ", "UF"]).compatibility_error()
@@ -0,0 +1,51 @@
+import polars as pl
+
+from app.logic.parsing import TypedColumnParser, infer_decimal_comma
+
+TYPES = {"Valor": "Decimal (Float)"}
+
+
+def _parse(parser, values):
+    parsed, failures = parser.parse(pl.DataFrame({"Valor": values}), TYPES)
+    return parsed["Valor"].to_list(), failures
+
+
+def test_pt_br_source_then_dot_decimal_source():
+    parser = TypedColumnParser()
+    assert _parse(parser, ["1.234,56", "0,5", "10,25"])[0] == [1234.56, 0.5, 10.25]
+    values, failures = _parse(parser, ["1234.56", "0.5", "10.25"])
+    assert values == [1234.56, 0.5, 10.25]
+    assert failures == {}
+
+
+def test_dot_decimal_source_then_pt_br_source():
+    parser = TypedColumnParser()
+    assert _parse(parser, ["1234.56", "0.5", "10.25"])[0] == [1234.56, 0.5, 10.25]
+    assert _parse(parser, ["1.234,56", "0,5", "10,25"])[0] == [1234.56, 0.5, 10.25]
+    assert parser.changed_separators == {"Valor": True}
+
+
+def test_integer_only_source_does_not_fix_the_separator():
+    parser = TypedColumnParser()
+    assert _parse(parser, ["10", "20"])[0] == [10.0, 20.0]
+    assert _parse(parser, ["10.25", "0.5"])[0] == [10.25, 0.5]
+
+
+def test_source_without_votes_reuses_previous_separator():
+    parser = TypedColumnParser()
+    _parse(parser, ["10.25", "0.5"])
+    # "1.234" sozinho é ambíguo: vale o separador da fonte anterior (ponto)
+    assert _parse(parser, ["1.234", "7"])[0] == [1.234, 7.0]
+
+
+def test_infer_decimal_comma_without_votes():
+    assert infer_decimal_comma(pl.Series(["10", "20"])) is None
+    assert infer_decimal_comma(pl.Series(["1.234,56"])) is True
+    assert infer_decimal_comma(pl.Series(["0.50"])) is False
+
+
+def test_failures_count_filled_values_only_and_keep_samples():
+    parser = TypedColumnParser()
+    values, failures = _parse(parser, ["1,5", "abc", "  ", None, "12,3,4", "abc"])
+    assert values == [1.5, None, None, None, None, None]
+    assert failures == {"Valor": {"count": 3, "inputs": 4, "samples": ["abc", "12,3,4"]}}
@@ -0,0 +1,42 @@
+import polars as pl
+import pytest
+
+from app.logic.pivot import PARTIALS_BY_OPERATION, merge_partial_pivots, partial_pivot, pivot_output_name
+
+GROUP_BY = ["UF"]
+AGGREGATIONS = [{"column": "Valor", "operation": operation} for operation in PARTIALS_BY_OPERATION] + [
+    {"column": "Cliente", "operation": "Contagem Única"},
+]
+# Mesmas expressões do resumo calculado sobre todas as linhas consolidadas
+FULL_EXPRESSIONS = {
+    "Soma": lambda c: pl.col(c).sum(), "Média": lambda c: pl.col(c).mean(), "Contagem": lambda c: pl.col(c).count(),
+    "Mínimo": lambda c: pl.col(c).min(), "Máximo": lambda c: pl.col(c).max(), "Contagem Única": lambda c: pl.col(c).n_unique(),
+}
+
+SOURCES = [
+    pl.DataFrame({"UF": ["SP", "SP", "RJ", None], "Valor": [10.0, None, 2.5, 4.0], "Cliente": ["a", "b", "a", None]}),
+    pl.DataFrame({"UF": ["SP", "MG", "RJ"], "Valor": [1.5, 7.0, None], "Cliente": ["b", "c", "d"]}),
+    # Fonte sem a coluna "Cliente": entra como nula, como na concatenação diagonal
+    pl.DataFrame({"UF": ["MG", "MG", "BA"], "Valor": [3.0, 3.0, None]}),
+]
+
+
+def _full_pivot(frame):
+    return frame.group_by(GROUP_BY).agg(
+        [FULL_EXPRESSIONS[rule["operation"]](rule["column"]).alias(pivot_output_name(rule["column"], rule["operation"])) for rule in AGGREGATIONS]
+    )
+
+
+@pytest.mark.parametrize("sources", [SOURCES, [pl.concat(SOURCES, how="diagonal")]], ids=["por_fonte", "fonte_unica"])
+def test_merged_partials_equal_the_full_pivot(sources):
+    partials = pl.concat([partial_pivot(source, GROUP_BY, AGGREGATIONS) for source in sources], how="diagonal")
+    merged = merge_partial_pivots(partials, GROUP_BY, AGGREGATIONS).collect().sort(GROUP_BY)
+    expected = _full_pivot(pl.concat(SOURCES, how="diagonal")).sort(GROUP_BY)
+
+    assert merged.columns == expected.columns
+    assert merged.to_dicts() == expected.to_dicts()
+
+
+def test_group_with_only_nulls_has_null_mean():
+    partial = partial_pivot(pl.DataFrame({"UF": ["BA"], "Valor": [None]}, schema={"UF": pl.String, "Valor": pl.Float64}), GROUP_BY, [{"column": "Valor", "operation": "Média"}])
+    assert merge_partial_pivots(partial, GROUP_BY, [{"column": "Valor", "operation": "Média"}]).collect()["Valor_Média"].to_list() == [None]
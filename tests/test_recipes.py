@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from app.logic.recipes import HeaderRuleSet, RECIPE_FORMAT, build_recipe, load_recipe, save_recipe
+
+
+def _write(tmp_path, recipe):
+    path = tmp_path / "vendas.receita.json"
+    path.write_text(json.dumps(recipe) if isinstance(recipe, dict) else recipe, encoding="utf-8")
+    return str(path)
+
+
+def test_saved_recipe_loads_back_with_the_same_rules(tmp_path):
+    header_rules = HeaderRuleSet(
+        {"valoricms": {"final_name": "Valor ICMS", "type_str": "Decimal (Float)", "include": True}},
+        [{"pattern": "Data_*", "regex": False, "final_name": "Data", "type_str": "Data", "include": True}],
+    )
+    recipe = build_recipe(header_rules, [], {}, {}, {"mode": "exclude", "names": ["Resumo", "Capa"]}, ";", "CSV", {"separator": "|"}, {"recursive": True})
+    path = str(tmp_path / "vendas.receita.json")
+    save_recipe(path, recipe)
+
+    loaded = load_recipe(path)
+    assert loaded["sheets"] == {"mode": "exclude", "names": {"Resumo", "Capa"}}
+    assert loaded["output"] == {"format": "CSV", "options": {"separator": "|"}}
+    rules = HeaderRuleSet(loaded["mapping"]["by_name"], loaded["mapping"]["patterns"])
+    assert rules.match("Valor ICMS")["final_name"] == "Valor ICMS"
+    assert rules.match("DATA EMISSAO")["type_str"] == "Data"
+    assert rules.match("CNPJ") is None
+
+
+def test_header_names_are_normalized_on_load(tmp_path):
+    loaded = load_recipe(_write(tmp_path, {"format": RECIPE_FORMAT, "version": 1, "mapping": {"by_name": {"Valor ICMS": {"final_name": "ICMS"}}}}))
+    assert loaded["mapping"]["by_name"] == {"valoricms": {"final_name": "ICMS", "type_str": "Automático/String", "include": True}}
+
+
+@pytest.mark.parametrize("content, message", [
+    ("{não é json", "não é um JSON válido"),
+    ({"format": "outro"}, "não é uma receita do DataFlow"),
+    ({"format": RECIPE_FORMAT, "version": 99}, "versão mais nova"),
+    ({"format": RECIPE_FORMAT, "mapping": {"by_name": {"cnpj": {"type_str": "Inteiro"}}}}, "regra de mapeamento inválida"),
+    ({"format": RECIPE_FORMAT, "mapping": {"by_name": {"cnpj": {"final_name": "CNPJ", "type_str": "Texto"}}}}, "tipo desconhecido 'Texto'"),
+    ({"format": RECIPE_FORMAT, "mapping": {"patterns": [{"pattern": "(", "regex": True, "final_name": "X"}]}}, "expressão regular inválida"),
+    ({"format": RECIPE_FORMAT, "enrichment": [{"path": "cfop.csv", "key": "CFOP"}]}, "regra de enriquecimento inválida"),
+])
+def test_invalid_recipes_are_rejected(tmp_path, content, message):
+    with pytest.raises(ValueError, match=message):
+        load_recipe(_write(tmp_path, content))
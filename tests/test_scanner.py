@@ -0,0 +1,53 @@
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.logic.scanner import ScanRules, scan_folder
+
+
+def _stat(size_kb=1, modified="2024-06-15 12:00"):
+    return SimpleNamespace(st_size=size_kb * 1024, st_mtime=datetime.fromisoformat(modified).timestamp())
+
+
+def test_glob_without_slash_matches_the_name_at_any_level():
+    rules = ScanRules({"include": ["vendas_*.csv"], "exclude": ["*backup*"]})
+    assert rules.accepts_file("vendas_01.csv", _stat())
+    assert rules.accepts_file("2024/junho/VENDAS_02.CSV", _stat())
+    assert not rules.accepts_file("2024/compras_01.csv", _stat())
+    assert not rules.accepts_file("2024/vendas_backup.csv", _stat())
+    assert rules.excludes("2024/backup_antigo")
+
+
+def test_glob_with_slash_matches_the_relative_path():
+    rules = ScanRules({"include": ["2024/*.csv"]})
+    assert rules.accepts_file("2024/vendas.csv", _stat())
+    assert not rules.accepts_file("2023/vendas.csv", _stat())
+
+
+def test_regex_searches_the_relative_path():
+    rules = ScanRules({"include": [r"^filial_\d+/"], "exclude": [r"\.tmp\.csv$"], "use_regex": True})
+    assert rules.accepts_file("filial_12/vendas.csv", _stat())
+    assert not rules.accepts_file("matriz/vendas.csv", _stat())
+    assert not rules.accepts_file("filial_12/vendas.tmp.csv", _stat())
+
+
+def test_size_and_modification_limits_are_inclusive():
+    rules = ScanRules({"min_size_kb": 2, "max_size_mb": 1, "modified_after": "2024-06-01", "modified_before": "2024-06-30"})
+    assert rules.accepts_file("a.csv", _stat(size_kb=2, modified="2024-06-01 00:00"))
+    assert rules.accepts_file("a.csv", _stat(size_kb=1024, modified="2024-06-30 23:59"))
+    assert not rules.accepts_file("a.csv", _stat(size_kb=1))
+    assert not rules.accepts_file("a.csv", _stat(size_kb=1025))
+    assert not rules.accepts_file("a.csv", _stat(modified="2024-05-31 23:59"))
+    assert not rules.accepts_file("a.csv", _stat(modified="2024-07-01 00:00"))
+
+
+def test_scan_folder_skips_excluded_folders_hidden_and_unsupported_files(tmp_path):
+    for relative in ["b.csv", "a.xlsx", "notas.pdf", ".oculto.csv", "~$a.xlsx", "sub/c.txt", "sub/antigo/d.csv", ".git/e.csv"]:
+        path = tmp_path / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x")
+
+    found = [relative for _, relative in scan_folder(str(tmp_path), {"exclude": ["antigo"]})]
+    assert found == ["a.xlsx", "b.csv", "sub/c.txt"]
+    assert [relative for _, relative in scan_folder(str(tmp_path), {"recursive": False})] == ["a.xlsx", "b.csv"]
+    assert all(os.path.isfile(path) for path, _ in scan_folder(str(tmp_path)))
@@ -0,0 +1,18 @@
+import polars as pl
+
+from conftest import write_csv
+
+
+def test_only_incremental_runs_keep_processed_sources(tmp_path, consolidate):
+    source = write_csv(tmp_path / "vendas.csv", ["CNPJ", "UF"], [["1", "SP"], ["2", "RJ"]])
+    output = tmp_path / "saida.parquet"
+    store_dir = tmp_path / "saida.fontes_processadas"
+
+    assert consolidate([source], output, "Parquet")[0]
+    assert not store_dir.exists()
+
+    assert consolidate([source], output, "Parquet", incremental=True)[0]
+    assert store_dir.is_dir()
+    ok, _, logs = consolidate([source], output, "Parquet", incremental=True)
+    assert ok and any("reaproveitado" in message for message in logs)
+    assert pl.read_parquet(output).height == 2
@@ -0,0 +1,44 @@
+import os
+
+import polars as pl
+
+from app.logic.spill import SpillManager
+
+
+def _frame(start, rows=1_000):
+    return pl.DataFrame({"id": range(start, start + rows), "texto": [f"linha {i}" for i in range(start, start + rows)]})
+
+
+def test_fragments_over_budget_are_spilled_and_read_back():
+    frames = [_frame(0), _frame(1_000), _frame(2_000)]
+    spill = SpillManager(budget_bytes=frames[0].estimated_size() + 1)
+    for frame in frames:
+        spill.add(frame)
+    try:
+        assert spill.has_spilled and spill.spill_count == 2
+        assert spill.total_rows == 3_000
+        assert spill.held_bytes <= spill.budget_bytes
+        assert [schema == frames[0].schema for schema in spill.schemas()] == [True] * 3
+        assert pl.concat(spill.lazy_frames()).collect().equals(pl.concat(frames))
+    finally:
+        spill_dir = spill._spill_dir
+        spill.cleanup()
+    assert not os.path.exists(spill_dir)
+
+
+def test_without_budget_nothing_is_spilled():
+    spill = SpillManager()
+    spill.add(_frame(0, rows=100_000))
+    assert not spill.has_spilled and len(spill) == 1
+
+
+def test_materialize_sinks_and_collects_in_one_execution():
+    spill = SpillManager()
+    try:
+        lf = _frame(0).lazy().filter(pl.col("id") % 2 == 0)
+        (materialized,), (count,) = spill.materialize([(lf, "pares")], [lf.select(pl.len())])
+        assert materialized.collect().equals(lf.collect())
+        assert count.item() == 500
+        assert spill.spill_disk_bytes > 0
+    finally:
+        spill.cleanup()
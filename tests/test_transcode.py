@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from app.logic import transcode
+from app.logic.transcode import Utf8CopyCache, is_valid_utf8, transcode_to_utf8
+
+TEXT = "Município;Descrição\nSão Paulo;Operação à vista\n" * 20
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # Blocos de poucos bytes: caracteres multibyte ficam divididos entre dois blocos
+    monkeypatch.setattr(transcode, "TRANSCODE_BLOCK_SIZE", 5)
+
+
+def test_utf8_split_across_blocks_is_still_valid(tmp_path):
+    utf8 = tmp_path / "utf8.csv"
+    utf8.write_text(TEXT, encoding="utf-8")
+    latin1 = tmp_path / "latin1.csv"
+    latin1.write_text(TEXT, encoding="latin-1")
+
+    assert is_valid_utf8(str(utf8))
+    assert not is_valid_utf8(str(latin1))
+    # Só a amostra inicial (ASCII) é verificada
+    assert is_valid_utf8(str(latin1), max_bytes=4)
+
+
+@pytest.mark.parametrize("encoding", ["latin-1", "cp1252", "utf-16"])
+def test_chunked_transcoding_matches_the_original_text(tmp_path, encoding):
+    source = tmp_path / "fonte.csv"
+    source.write_text(TEXT, encoding=encoding)
+    transcode_to_utf8(str(source), encoding, str(tmp_path / "utf8.csv"))
+    assert (tmp_path / "utf8.csv").read_text(encoding="utf-8-sig") == TEXT
+
+
+def test_copy_is_reused_until_the_source_changes(tmp_path):
+    source = tmp_path / "fonte.csv"
+    source.write_text(TEXT, encoding="latin-1")
+    cache = Utf8CopyCache(str(tmp_path / "cache"))
+    copy_path = cache.utf8_copy(str(source), "latin-1")
+
+    reopened = Utf8CopyCache(str(tmp_path / "cache"))
+    assert reopened.utf8_copy(str(source), "latin-1") == copy_path
+    assert (reopened.converted, reopened.reused) == (0, 1)
+
+    source.write_text(TEXT + "Belém;Nota\n", encoding="latin-1")
+    os.utime(source, ns=(0, os.stat(source).st_mtime_ns + 1_000_000_000))
+    assert reopened.utf8_copy(str(source), "latin-1") == copy_path
+    assert reopened.converted == 1
+    assert open(copy_path, encoding="utf-8").read().endswith("Belém;Nota\n")
@@ -0,0 +1,33 @@
+from app.logic.watch import StableFileTracker
+
+
+def test_new_file_is_ready_only_after_it_stops_changing():
+    tracker = StableFileTracker(debounce_seconds=5)
+    tracker.set_baseline({"antigo.csv": (10, 1)})
+
+    assert tracker.update({"antigo.csv": (10, 1), "novo.csv": (100, 1)}, now=0) == []
+    # Ainda sendo copiado: o tamanho muda e o prazo recomeça
+    assert tracker.update({"antigo.csv": (10, 1), "novo.csv": (200, 2)}, now=4) == []
+    assert tracker.update({"antigo.csv": (10, 1), "novo.csv": (200, 2)}, now=8) == []
+    assert tracker.update({"antigo.csv": (10, 1), "novo.csv": (200, 2)}, now=9) == ["novo.csv"]
+
+
+def test_processed_files_are_not_reported_again_until_they_change():
+    tracker = StableFileTracker(debounce_seconds=1)
+    tracker.update({"a.csv": (1, 1)}, now=0)
+    assert tracker.update({"a.csv": (1, 1)}, now=1) == ["a.csv"]
+
+    tracker.mark_processed(["a.csv"])
+    assert tracker.update({"a.csv": (1, 1)}, now=5) == []
+
+    tracker.update({"a.csv": (2, 2)}, now=6)
+    assert tracker.update({"a.csv": (2, 2)}, now=7) == ["a.csv"]
+
+
+def test_removed_file_is_forgotten_and_reported_when_it_returns():
+    tracker = StableFileTracker(debounce_seconds=1)
+    tracker.set_baseline({"a.csv": (1, 1)})
+    assert tracker.update({}, now=0) == []
+
+    tracker.update({"a.csv": (1, 1)}, now=1)
+    assert tracker.update({"a.csv": (1, 1)}, now=2) == ["a.csv"]
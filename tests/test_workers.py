@@ -0,0 +1,45 @@
+import polars as pl
+import pytest
+
+from app.logic.workers import ConsolidationWorker
+from conftest import write_csv
+
+BIG = 2**63 + 5
+
+
+def _worker(memory_budget_mb=0):
+    return ConsolidationWorker([], "saida.parquet", "Parquet", {}, [], ";", {}, memory_budget_mb=memory_budget_mb)
+
+
+@pytest.mark.parametrize("spilled", [False, True])
+def test_harmonization_losses_are_counted_in_the_final_execution(spilled):
+    worker = _worker(memory_budget_mb=0.000001 if spilled else 0)
+    worker.spill.add(pl.DataFrame({"Codigo": [1, 2], "Origem": ["a.csv", "a.csv"]}))
+    worker.spill.add(pl.DataFrame({"Codigo": pl.Series([3, BIG], dtype=pl.UInt64), "Origem": ["b.csv", "b.csv"]}))
+    assert worker.spill.has_spilled == spilled
+
+    frames, checks = worker._harmonize_types(worker.spill.lazy_frames(), worker.spill.schemas())
+    assert len(checks) == 1
+    consolidated, _, _, results = worker._execute_plans(pl.concat(frames), None, None, [plan for _, plan in checks])
+    worker._report_harmonization_losses(checks, results)
+
+    assert consolidated.lazy().collect()["Codigo"].to_list() == [1, 2, 3, None]
+    (row,) = worker.quality_report
+    assert (row["Origem"], row["Coluna"], row["Etapa"], row["Valores perdidos"], row["Exemplos"]) == ("b.csv", "Codigo", "Harmonização", 1, str(BIG))
+
+
+def test_multi_output_reports_every_file_and_splits_only_the_data(tmp_path, consolidate):
+    rows = [[f"{i:014d}", uf, "1,0"] for i, uf in enumerate(["SP", "RJ", "MG"] * 4)]
+    source = write_csv(tmp_path / "vendas.csv", ["CNPJ", "UF", "Valor"], rows + rows[:2])
+    output = tmp_path / "saida.csv"
+    ok, message, _ = consolidate(
+        [source], output, types={"Valor": "Decimal (Float)"},
+        pivot_rules={"group_by": ["UF"], "aggregations": [{"column": "Valor", "operation": "Soma"}], "only_pivot": False},
+        duplicates_config={"key_columns": ["CNPJ"], "generate_report": True},
+        output_options={"multi_output": True, "csv": {"compression": "gzip", "parts": 2}},
+    )
+    expected = [tmp_path / "saida.part001.csv.gz", tmp_path / "saida.part002.csv.gz", tmp_path / "saida_resumo.csv.gz", tmp_path / "saida_duplicatas.csv.gz"]
+    assert ok
+    assert message == f"Salvo em: {', '.join(str(path) for path in expected)}"
+    assert all(path.exists() for path in expected)
+    assert pl.read_csv(expected[2], separator="|").height == 3
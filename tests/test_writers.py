@@ -0,0 +1,59 @@
+import json
+import os
+from datetime import date
+
+import polars as pl
+import pytest
+
+from app.logic import writers
+from app.logic.writers import DATASET_MANIFEST_FILE, DATASET_SCHEMA_FILE, csv_output_paths, write_csv_export, write_parquet_dataset
+
+SALES = pl.DataFrame({
+    "UF": ["SP", "RJ", "SP", "MG"],
+    "Valor": [10.5, 20.0, 30.25, 1.0],
+    "Data": [date(2024, 1, 31), date(2024, 2, 1), date(2024, 2, 15), None],
+})
+
+
+def test_dataset_round_trip_with_the_documented_read_pattern(tmp_path):
+    dataset_dir = tmp_path / "vendas"
+    manifest = write_parquet_dataset(SALES, str(dataset_dir), {"date_column": "Data", "partition_columns": ["UF"]})
+
+    read_back = pl.read_parquet(f"{dataset_dir}/**/*.parquet", hive_partitioning=True)
+    declared = pl.read_ipc(dataset_dir / DATASET_SCHEMA_FILE).schema
+    assert read_back.schema == {name: declared[name] for name in read_back.columns}
+    assert read_back.select(SALES.columns).sort("Valor").equals(SALES.sort("Valor"))
+    assert read_back.filter(pl.col("Data").is_not_null()).select((pl.col("Ano") == pl.col("Data").dt.year()).all()).item()
+
+    assert manifest["total_rows"] == SALES.height
+    assert {entry["partition"]["Ano"] for entry in manifest["files"]} == {2024, None}
+    with open(dataset_dir / DATASET_MANIFEST_FILE, encoding="utf-8") as f:
+        written = json.load(f)["files"]
+    assert [(e["path"], e["partition"], e["rows"]) for e in written] == [(e["path"], e["partition"], e["rows"]) for e in manifest["files"]]
+    assert all(os.path.exists(dataset_dir / entry["path"]) for entry in manifest["files"])
+
+
+def test_csv_output_paths_follow_compression_and_parts():
+    assert csv_output_paths("saida.csv", {}) == ["saida.csv"]
+    assert csv_output_paths("saida.csv", {"compression": "zstd"}) == ["saida.csv.zst"]
+    assert csv_output_paths("saida.csv", {"compression": "gzip", "parts": 2}) == ["saida.part001.csv.gz", "saida.part002.csv.gz"]
+
+
+@pytest.mark.parametrize("compression", ["uncompressed", "gzip", "zstd"])
+@pytest.mark.parametrize("lazy", [False, True])
+def test_csv_parts_round_trip(tmp_path, monkeypatch, compression, lazy):
+    # Blocos pequenos: cada parte comprimida é formada por vários membros/quadros concatenados
+    monkeypatch.setattr(writers, "CSV_WRITE_CHUNK_ROWS", 7)
+    frame = pl.DataFrame({"id": range(50), "valor": [i / 4 for i in range(50)], "texto": [f"a;b {i}" for i in range(50)]})
+    options = {"separator": ";", "decimal_comma": True, "compression": compression, "parts": 3}
+    paths = write_csv_export(frame.lazy() if lazy else frame, str(tmp_path / "saida.csv"), options)
+
+    assert paths == csv_output_paths(str(tmp_path / "saida.csv"), options)
+    parts = [pl.read_csv(path, separator=";", decimal_comma=True) for path in paths]
+    assert [part.height for part in parts] == [17, 17, 16]
+    assert pl.concat(parts).equals(frame)
+
+
+def test_empty_csv_export_keeps_the_header(tmp_path):
+    path, = write_csv_export(pl.DataFrame({"a": [], "b": []}, schema={"a": pl.Int64, "b": pl.String}), str(tmp_path / "vazio.csv"), {})
+    assert open(path).read() == "a|b\n"